@@ -25,8 +25,33 @@ import time
 import requests
 import re
 import threading
+import queue
+import logging
+import logging.handlers
+import http.client
+import http.server
+import urllib.parse
+import mmap
+import struct
+import shlex
+import shutil
+import signal
+import select
+import tempfile
+import errno
+import zlib
+import zipfile
+import fnmatch
+import gzip
+import html
+import sqlite3
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from bisect import bisect_left, bisect_right
+from itertools import compress
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, date
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -66,19 +91,4471 @@ class EmbeddedLogo:
         return QIcon(EmbeddedLogo.get_logo_pixmap())
 
 
+# ==============================================
+# ПУТИ И КОНФИГУРАЦИЯ ПРИЛОЖЕНИЯ
+# ==============================================
+
+APP_DIR = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).resolve().parent
+CONFIG_DIR = APP_DIR / "config"
+DATA_DIR = APP_DIR / "data"
+LOGS_DIR = APP_DIR / "logs"
+
+
+SETTINGS_FILE = Path.home() / ".optimized_console_settings.json"
+
+
+def deep_merge(base, override):
+    """Рекурсивное слияние словарей: значения override имеют приоритет"""
+    result = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = deep_merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def atomic_write_json(path, data):
+    """Запись JSON через временный файл и os.replace — файл никогда не бывает наполовину записан"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ==============================================
+# ЛОГИРОВАНИЕ
+# ==============================================
+
+logger = logging.getLogger("optimized_console")
+logger.propagate = False
+logger.addHandler(logging.NullHandler())
+
+
+class DailyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Файл logs/<prefix>_YYYYMMDD.log с ротацией по дате и по размеру.
+
+    При превышении max_bytes файл дня сдвигается в .1, .2 ...;
+    файлы старше keep_days удаляются при смене дня.
+    """
+
+    def __init__(self, directory, prefix="console", max_bytes=1024 * 1024, backup_count=5, keep_days=30):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.keep_days = keep_days
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._day = date.today()
+        super().__init__(self._path_for(self._day), maxBytes=max_bytes, backupCount=backup_count,
+                         encoding='utf-8', delay=True)
+
+    def _path_for(self, day):
+        return str(self.directory / f"{self.prefix}_{day.strftime('%Y%m%d')}.log")
+
+    def shouldRollover(self, record):
+        if date.fromtimestamp(record.created) != self._day:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        today = date.today()
+        if today == self._day:
+            super().doRollover()
+            return
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self._day = today
+        self.baseFilename = os.path.abspath(self._path_for(today))
+        self._purge_old_files()
+
+    def _purge_old_files(self):
+        if not self.keep_days:
+            return
+        border = time.time() - self.keep_days * 86400
+        for log_file in self.directory.glob(f"{self.prefix}_*.log*"):
+            try:
+                if log_file.stat().st_mtime < border:
+                    log_file.unlink()
+            except OSError:
+                pass
+
+
+class LevelFilter(logging.Filter):
+    """Пропускает только перечисленные уровни (например, без DEBUG, но с ERROR)"""
+
+    def __init__(self, levels):
+        super().__init__()
+        self.levels = {logging.getLevelName(level.upper()) if isinstance(level, str) else level
+                       for level in levels}
+
+    def filter(self, record):
+        return record.levelno in self.levels
+
+
+class AppLogging:
+    """Асинхронное логирование: QueueHandler в GUI-потоке, запись в файл в QueueListener.
+
+    GUI-поток только кладёт запись в очередь и никогда не ждёт диска.
+    Включается флагом features.logging, параметры берутся из секции "logging".
+    """
+
+    FORMAT = "[%(asctime)s] [%(levelname)s] %(message)s"
+    DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+    def __init__(self):
+        self.listener = None
+        self.queue_handler = None
+        self.enabled = False
+
+    def configure(self, config):
+        """(Пере)настройка по словарю конфигурации"""
+        self.shutdown()
+        features = config.get('features', {})
+        if not features.get('logging', False):
+            return
+
+        options = config.get('logging', {})
+        try:
+            file_handler = DailyRotatingFileHandler(
+                LOGS_DIR,
+                prefix=options.get('prefix', 'console'),
+                max_bytes=int(options.get('max_bytes', 1024 * 1024)),
+                backup_count=int(options.get('backup_count', 5)),
+                keep_days=int(options.get('keep_days', 30)))
+        except OSError:
+            return
+        file_handler.setFormatter(logging.Formatter(self.FORMAT, self.DATE_FORMAT))
+        debug = config.get('app', {}).get('debug', False)
+        file_handler.setLevel('DEBUG' if debug else options.get('level', 'INFO').upper())
+        if options.get('levels'):
+            file_handler.addFilter(LevelFilter(options['levels']))
+
+        log_queue = queue.SimpleQueue()
+        self.queue_handler = logging.handlers.QueueHandler(log_queue)
+        self.listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        self.listener.start()
+        logger.addHandler(self.queue_handler)
+        logger.setLevel(logging.DEBUG)
+        self.enabled = True
+
+    def shutdown(self):
+        """Остановка слушателя с дозаписью очереди"""
+        if self.queue_handler is not None:
+            logger.removeHandler(self.queue_handler)
+            self.queue_handler = None
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+        self.enabled = False
+
+
+# ==============================================
+# МНОГОУРОВНЕВАЯ КОНФИГУРАЦИЯ
+# ==============================================
+
+class ConfigManager(QObject):
+    """Слои default_config.json → user_config.json → ~/.optimized_console_settings.json.
+
+    Результат слияния кэшируется по (mtime, size) файлов: пока файлы не
+    менялись, повторный load() ничего не читает с диска. QFileSystemWatcher
+    следит за файлами и папкой config/, изменения применяются без перезапуска.
+    """
+
+    config_changed = pyqtSignal(dict)
+
+    def __init__(self, layers=None, parent=None):
+        super().__init__(parent)
+        self.layers = [Path(p) for p in (layers or (CONFIG_DIR / "default_config.json",
+                                                    CONFIG_DIR / "user_config.json",
+                                                    SETTINGS_FILE))]
+        self._file_cache = {}
+        self._signature = None
+        self.config = {}
+
+        self._reload_timer = QTimer(self)
+        self._reload_timer.setSingleShot(True)
+        self._reload_timer.setInterval(250)
+        self._reload_timer.timeout.connect(self.reload)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._on_fs_event)
+        self.watcher.directoryChanged.connect(self._on_fs_event)
+        self.load()
+        self._rewatch()
+
+    @staticmethod
+    def _stat_key(path):
+        try:
+            st = path.stat()
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _read_layer(self, path, key):
+        """Разбор одного файла с кэшем по его mtime"""
+        cached = self._file_cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        data = {}
+        if key is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Не удалось прочитать конфигурацию {path}: {e}")
+                # Файл могут сохранять прямо сейчас — оставляем прошлую версию слоя
+                return cached[1] if cached else {}
+        if not isinstance(data, dict):
+            data = {}
+        self._file_cache[path] = (key, data)
+        return data
+
+    def load(self):
+        """Слитая конфигурация (из кэша, если файлы не менялись)"""
+        keys = tuple(self._stat_key(path) for path in self.layers)
+        if keys == self._signature:
+            return self.config
+        merged = {}
+        for path, key in zip(self.layers, keys):
+            merged = deep_merge(merged, self._read_layer(path, key))
+        self._signature = keys
+        self.config = merged
+        return merged
+
+    def get(self, section, key, default=None):
+        value = self.config.get(section, {})
+        return value.get(key, default) if isinstance(value, dict) else default
+
+    def reload(self):
+        """Перечитать слои и сообщить об изменениях"""
+        previous = self.config
+        config = self.load()
+        self._rewatch()
+        if config != previous:
+            self.config_changed.emit(config)
+
+    def _on_fs_event(self, _path):
+        self._reload_timer.start()
+
+    def _rewatch(self):
+        # Редакторы часто сохраняют через замену файла — слежение за ним
+        # при этом теряется, поэтому список обновляется после каждой перезагрузки
+        wanted = {str(path) for path in self.layers if path.exists()}
+        if CONFIG_DIR.exists():
+            wanted.add(str(CONFIG_DIR))
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        missing = sorted(wanted - watched)
+        if missing:
+            self.watcher.addPaths(missing)
+
+
+# ==============================================
+# СТАТИСТИКА ИСПОЛЬЗОВАНИЯ
+# ==============================================
+
+class UsageStatistics:
+    """Счётчики использования с пакетной записью.
+
+    Счётчики живут в памяти и сбрасываются в data/gui_app_data.json
+    периодически и при выходе (атомарной заменой файла). Сессии дописываются
+    в data/sessions.jsonl, а сессии старше keep_days сворачиваются в дневные
+    агрегаты statistics.daily, поэтому при запуске не разбирается вся история.
+    """
+
+    def __init__(self, data_file=None, sessions_file=None, keep_days=7):
+        self.data_file = Path(data_file or DATA_DIR / "gui_app_data.json")
+        self.sessions_file = Path(sessions_file or DATA_DIR / "sessions.jsonl")
+        self.keep_days = keep_days
+        self.session_start = datetime.now()
+        self.session_commands = 0
+        self.dirty = False
+        self.data = self._load()
+
+        stats = self.data.setdefault('statistics', {})
+        stats.setdefault('launches', 0)
+        stats.setdefault('commands_executed', 0)
+        stats.setdefault('daily', {})
+        # data/ может быть только для чтения или переполнен — запуск не должен от этого зависеть
+        try:
+            self._migrate_sessions(stats)
+            self.compact()
+        except OSError as e:
+            logger.warning(f"Журнал сессий недоступен: {e}")
+
+        stats['launches'] += 1
+        stats['last_launch'] = self.session_start.isoformat()
+        self.dirty = True
+
+    @property
+    def statistics(self):
+        return self.data['statistics']
+
+    def _load(self):
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _migrate_sessions(self, stats):
+        """Перенос старого списка statistics.sessions в JSONL"""
+        sessions = stats.get('sessions')
+        if sessions:
+            self._append_sessions(sessions)
+            del stats['sessions']
+            self.dirty = True
+
+    def _append_sessions(self, records):
+        self.sessions_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.sessions_file, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def record_command(self):
+        self.statistics['commands_executed'] += 1
+        self.session_commands += 1
+        self.dirty = True
+
+    def flush(self):
+        """Атомарная запись счётчиков, если они менялись"""
+        if not self.dirty:
+            return
+        try:
+            atomic_write_json(self.data_file, self.data)
+            self.dirty = False
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить статистику: {e}")
+
+    def close_session(self):
+        """Запись сессии в журнал и финальный сброс счётчиков"""
+        record = {
+            'start': self.session_start.isoformat(),
+            'end': datetime.now().isoformat(),
+            'commands': self.session_commands,
+        }
+        try:
+            self._append_sessions([record])
+        except OSError as e:
+            logger.warning(f"Не удалось записать сессию: {e}")
+        self.flush()
+
+    def compact(self):
+        """Свёртка сессий старше keep_days в statistics.daily.
+
+        Журнал дописывается по порядку, поэтому достаточно прочитать первую
+        строку: если она свежая, файл целиком не читается.
+        """
+        try:
+            with open(self.sessions_file, 'r', encoding='utf-8') as f:
+                first_line = f.readline()
+        except OSError:
+            return
+        border = self.session_start.date().toordinal() - self.keep_days
+        try:
+            oldest = datetime.fromisoformat(json.loads(first_line)['start'])
+            if oldest.date().toordinal() >= border:
+                return
+        except (ValueError, KeyError, TypeError):
+            pass
+
+        # Агрегаты копятся в копии и подменяются только после записи журнала
+        daily = {day: dict(values) for day, values in self.statistics['daily'].items()}
+        tmp_path = self.sessions_file.with_name(f".{self.sessions_file.name}.tmp")
+        try:
+            self._write_compacted(tmp_path, border, daily)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        previous, self.statistics['daily'] = self.statistics['daily'], daily
+        # Сначала сохраняем агрегаты, затем подменяем журнал: при сбое сессия
+        # может попасть в агрегаты дважды, но не потеряется
+        self.dirty = True
+        self.flush()
+        if self.dirty:
+            # Агрегаты не записались — журнал остаётся полным, свёртка в другой раз
+            self.statistics['daily'] = previous
+            tmp_path.unlink(missing_ok=True)
+            raise OSError(f"не удалось сохранить {self.data_file}")
+        os.replace(tmp_path, self.sessions_file)
+
+    def _write_compacted(self, tmp_path, border, daily):
+        with open(self.sessions_file, 'r', encoding='utf-8') as src, \
+                open(tmp_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                try:
+                    record = json.loads(line)
+                    start = datetime.fromisoformat(record['start'])
+                    end = datetime.fromisoformat(record.get('end') or record['start'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if start.date().toordinal() >= border:
+                    dst.write(line if line.endswith("\n") else line + "\n")
+                    continue
+                day = daily.setdefault(start.date().isoformat(), {'sessions': 0, 'seconds': 0, 'commands': 0})
+                day['sessions'] += 1
+                day['seconds'] += max(0, int((end - start).total_seconds()))
+                day['commands'] += int(record.get('commands', 0))
+
+
+# ==============================================
+# ФОНОВЫЙ СБОР МЕТРИК
+# ==============================================
+
+def run_in_daemon_thread(fn, *args, name="probe"):
+    """Запуск fn в daemon-потоке с результатом в Future.
+
+    В отличие от ThreadPoolExecutor такой поток не держит выход из
+    программы, даже если навсегда завис на мёртвом сетевом диске.
+    """
+    future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name=name, daemon=True).start()
+    return future
+
+
+class CpuMemoryCollector:
+    """Загрузка CPU и использование памяти"""
+
+    def __init__(self):
+        psutil.cpu_percent(interval=None)  # первый вызов всегда возвращает 0
+
+    def sample(self):
+        memory = psutil.virtual_memory()
+        return {
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_total': memory.total,
+            'memory_used': memory.used,
+            'memory_free': memory.free,
+            'memory_available': memory.available,
+            'memory_percent': memory.percent,
+        }
+
+
+class DiskStatsCollector:
+    """Скорость ввода-вывода по устройствам и заполненность разделов.
+
+    Скорости считаются по разнице disk_io_counters(perdisk=True) между
+    выборками. disk_usage для каждого раздела выполняется в отдельном
+    потоке: результат забирается на следующих тиках, а раздел, который не
+    ответил за probe_timeout, помечается как зависший и не опрашивается
+    повторно, пока не вернётся прошлый запрос. Так мёртвый NFS/SMB не
+    блокирует ни сэмплер, ни диалог.
+    """
+
+    def __init__(self, probe_timeout=2.0, refresh_interval=10.0):
+        self.probe_timeout = probe_timeout
+        self.refresh_interval = refresh_interval
+        self._prev_counters = None
+        self._prev_time = None
+        self._partitions = []
+        self._partitions_probe = None
+        self._partitions_time = 0
+        self._usage = {}
+        self._inflight = {}
+
+    def sample(self):
+        now = time.monotonic()
+        return {
+            'devices': self._sample_io(now),
+            'partitions': self._sample_partitions(now),
+        }
+
+    def _sample_io(self, now):
+        try:
+            counters = psutil.disk_io_counters(perdisk=True) or {}
+        except Exception:
+            counters = {}
+        devices = {}
+        if self._prev_counters is not None and now > self._prev_time:
+            elapsed = now - self._prev_time
+            for name, current in counters.items():
+                previous = self._prev_counters.get(name)
+                if previous is None:
+                    continue
+                devices[name] = {
+                    'read_bps': max(0, current.read_bytes - previous.read_bytes) / elapsed,
+                    'write_bps': max(0, current.write_bytes - previous.write_bytes) / elapsed,
+                    'read_iops': max(0, current.read_count - previous.read_count) / elapsed,
+                    'write_iops': max(0, current.write_count - previous.write_count) / elapsed,
+                }
+        self._prev_counters = counters
+        self._prev_time = now
+        return devices
+
+    def _sample_partitions(self, now):
+        # Список разделов на Windows тоже может зависнуть на сетевом диске
+        probe = self._partitions_probe
+        if probe is not None and probe.done():
+            self._partitions_probe = None
+            try:
+                self._partitions = [(p.device, p.mountpoint, p.fstype) for p in probe.result()]
+            except Exception:
+                pass
+        if self._partitions_probe is None and now - self._partitions_time >= self.refresh_interval:
+            self._partitions_time = now
+            self._partitions_probe = run_in_daemon_thread(psutil.disk_partitions, False, name="disk-partitions")
+
+        for mountpoint, (future, started) in list(self._inflight.items()):
+            if future.done():
+                del self._inflight[mountpoint]
+                try:
+                    usage = future.result()
+                    self._usage[mountpoint] = {'state': 'ok', 'time': now, 'total': usage.total,
+                                               'used': usage.used, 'free': usage.free, 'percent': usage.percent}
+                except Exception as e:
+                    self._usage[mountpoint] = {'state': 'error', 'time': now, 'error': str(e)}
+            elif now - started > self.probe_timeout:
+                self._usage[mountpoint] = {'state': 'timeout', 'time': now, 'waiting': now - started}
+
+        result = []
+        for device, mountpoint, fstype in self._partitions:
+            last = self._usage.get(mountpoint)
+            stale = last is None or now - last['time'] >= self.refresh_interval
+            if mountpoint not in self._inflight and stale:
+                future = run_in_daemon_thread(psutil.disk_usage, mountpoint, name="disk-usage")
+                self._inflight[mountpoint] = (future, now)
+            entry = {'device': device, 'mountpoint': mountpoint, 'fstype': fstype}
+            entry.update(self._usage.get(mountpoint) or {'state': 'pending'})
+            result.append(entry)
+        return result
+
+
+class NetworkStatsCollector:
+    """Скорость приёма/передачи по интерфейсам и таблица сокетов.
+
+    Скорости — разница net_io_counters(pernic=True) между выборками.
+    net_connections дорогой на серверах с десятками тысяч сокетов, поэтому
+    он вызывается только пока открыта таблица (want_connections) и не чаще,
+    чем раз в 10 длительностей прошлого вызова. Строки для уже известных
+    сокетов переиспользуются, имена процессов берутся из кэша PID→имя.
+    """
+
+    def __init__(self, connections_interval=2.0):
+        self.connections_interval = connections_interval
+        self.want_connections = False
+        self.connections = {}
+        self.connections_error = None
+        self.connections_time = None
+        self._next_connections = 0
+        self._pid_names = {}
+        self._prev_counters = None
+        self._prev_time = None
+
+    def sample(self):
+        now = time.monotonic()
+        result = {'nics': self._sample_nics(now)}
+        if self.want_connections and now >= self._next_connections:
+            self._sample_connections()
+        result['connections'] = len(self.connections)
+        return result
+
+    def _sample_nics(self, now):
+        try:
+            counters = psutil.net_io_counters(pernic=True) or {}
+        except Exception:
+            counters = {}
+        nics = {}
+        if self._prev_counters is not None and now > self._prev_time:
+            elapsed = now - self._prev_time
+            for name, current in counters.items():
+                previous = self._prev_counters.get(name)
+                if previous is None:
+                    continue
+                nics[name] = {
+                    'rx_bps': max(0, current.bytes_recv - previous.bytes_recv) / elapsed,
+                    'tx_bps': max(0, current.bytes_sent - previous.bytes_sent) / elapsed,
+                    'rx_total': current.bytes_recv,
+                    'tx_total': current.bytes_sent,
+                }
+        self._prev_counters = counters
+        self._prev_time = now
+        return nics
+
+    def _sample_connections(self):
+        started = time.monotonic()
+        try:
+            raw = psutil.net_connections(kind='inet')
+        except psutil.AccessDenied:
+            self.connections_error = "Нет прав на список сокетов (запустите от администратора)"
+            self._next_connections = started + 30
+            return
+        except Exception as e:
+            self.connections_error = str(e)
+            self._next_connections = started + 30
+            return
+
+        previous = self.connections
+        current = {}
+        pids = set()
+        for conn in raw:
+            key = (conn.family, conn.type, conn.laddr, conn.raddr, conn.status, conn.pid)
+            row = previous.get(key)
+            if row is None:
+                row = self._make_row(conn)
+            current[key] = row
+            pids.add(conn.pid)
+
+        # Кэш имён чистится от завершившихся PID, чтобы не путать переиспользованные
+        for pid in self._pid_names.keys() - pids:
+            del self._pid_names[pid]
+
+        self.connections = current
+        self.connections_error = None
+        self.connections_time = time.time()
+        elapsed = time.monotonic() - started
+        self._next_connections = started + max(self.connections_interval, elapsed * 10)
+
+    def _make_row(self, conn):
+        proto = "TCP" if conn.type == socket.SOCK_STREAM else "UDP"
+        if conn.family == socket.AF_INET6:
+            proto += "6"
+        local = f"{conn.laddr.ip}:{conn.laddr.port}" if conn.laddr else ""
+        remote = f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else ""
+        status = "" if conn.status == psutil.CONN_NONE else conn.status
+        return (proto, local, remote, status, str(conn.pid or ""), self._process_name(conn.pid))
+
+    def _process_name(self, pid):
+        if not pid:
+            return ""
+        name = self._pid_names.get(pid)
+        if name is None:
+            try:
+                name = psutil.Process(pid).name()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                name = "?"
+            self._pid_names[pid] = name
+        return name
+
+
+class ConnectionTableModel(QAbstractTableModel):
+    """Модель таблицы сокетов, обновляемая по разнице с прошлым снимком.
+
+    Вью запрашивает только видимые ячейки, а при обновлении модель удаляет
+    исчезнувшие строки диапазонами и дописывает новые в конец, не трогая
+    остальные — выделение и прокрутка сохраняются.
+    """
+
+    HEADERS = ("Протокол", "Локальный адрес", "Удалённый адрес", "Состояние", "PID", "Процесс")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.keys = []
+        self.rows = []
+        self.index_of = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.rows[index.row()][index.column()]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def update(self, connections):
+        """Применить новый снимок. Возвращает (добавлено, удалено)"""
+        removed = sorted((self.index_of[key] for key in self.index_of.keys() - connections.keys()), reverse=True)
+        added = [key for key in connections.keys() - self.index_of.keys()]
+
+        if removed:
+            # Удаляем непрерывными диапазонами с конца, чтобы индексы не съезжали
+            first = last = removed[0]
+            for row in removed[1:] + [None]:
+                if row is not None and row == first - 1:
+                    first = row
+                    continue
+                self.beginRemoveRows(QModelIndex(), first, last)
+                del self.rows[first:last + 1]
+                del self.keys[first:last + 1]
+                self.endRemoveRows()
+                if row is not None:
+                    first = last = row
+            self.index_of = {key: i for i, key in enumerate(self.keys)}
+
+        if added:
+            start = len(self.rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(added) - 1)
+            for i, key in enumerate(added, start):
+                self.keys.append(key)
+                self.rows.append(connections[key])
+                self.index_of[key] = i
+            self.endInsertRows()
+        return len(added), len(removed)
+
+
+class MonitorSampler:
+    """Единый фоновый сэмплер: один поток опрашивает все коллекторы.
+
+    Последний снимок лежит в latest (словарь заменяется целиком, читать его
+    можно из любого потока); слушатели вызываются в потоке сэмплера.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.collectors = {}
+        self.listeners = []
+        self.latest = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def add_collector(self, name, collector):
+        self.collectors[name] = collector
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="monitor-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def sample_once(self):
+        snapshot = {'time': time.time()}
+        for name, collector in list(self.collectors.items()):
+            try:
+                snapshot[name] = collector.sample()
+            except Exception as e:
+                logger.warning(f"Сбой коллектора {name}: {e}")
+        self.latest = snapshot
+        for callback in list(self.listeners):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.warning(f"Сбой обработчика метрик: {e}")
+        return snapshot
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.sample_once()
+            self._stop_event.wait(self.interval)
+
+
+# ==============================================
+# ПАМЯТЬ ПРОЦЕССОВ
+# ==============================================
+
+class ProcessMemoryReport:
+    """Топ процессов по USS/PSS.
+
+    memory_full_info() читает smaps процесса и стоит миллисекунды, поэтому
+    он вызывается только для кандидатов с наибольшим RSS, параллельно в
+    пуле потоков, а результат кэшируется на ttl секунд по (pid, create_time).
+    """
+
+    def __init__(self, executor, ttl=5.0, candidate_factor=3):
+        self.executor = executor
+        self.ttl = ttl
+        self.candidate_factor = candidate_factor
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _full_info(proc):
+        try:
+            info = proc.memory_full_info()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess, OSError):
+            return None
+        return {'uss': getattr(info, 'uss', None), 'pss': getattr(info, 'pss', None),
+                'swap': getattr(info, 'swap', None)}
+
+    def collect(self, limit=15):
+        now = time.monotonic()
+        processes = []
+        for proc in psutil.process_iter(['pid', 'name', 'memory_info', 'create_time']):
+            memory_info = proc.info['memory_info']
+            if memory_info is not None:
+                processes.append((memory_info.rss, proc))
+        processes.sort(key=lambda item: item[0], reverse=True)
+        candidates = processes[:limit * self.candidate_factor]
+
+        rows = []
+        pending = []
+        with self._lock:
+            self._cache = {key: value for key, value in self._cache.items() if now - value[0] < self.ttl}
+            for rss, proc in candidates:
+                key = (proc.info['pid'], proc.info['create_time'])
+                cached = self._cache.get(key)
+                row = {'pid': proc.info['pid'], 'name': proc.info['name'] or '?', 'rss': rss}
+                if cached is not None:
+                    row.update(cached[1])
+                else:
+                    pending.append((key, row, self.executor.submit(self._full_info, proc)))
+                rows.append(row)
+
+        for key, row, future in pending:
+            details = future.result()
+            if details is None:
+                # Нет доступа к smaps — остаётся только RSS
+                details = {'uss': None, 'pss': None, 'swap': None}
+            row.update(details)
+            with self._lock:
+                self._cache[key] = (now, details)
+
+        rows.sort(key=lambda row: row['uss'] if row['uss'] is not None else row['rss'], reverse=True)
+        return rows[:limit], len(processes)
+
+
+class ProcessTools:
+    """Дерево процессов и пакетная отправка сигналов.
+
+    Таблица процессов снимается одним проходом process_iter, сигналы
+    рассылаются всем целям подряд, а завершения ожидаются одним
+    psutil.wait_procs — без цикла "сигнал, ждать, следующий".
+    """
+
+    KILL = getattr(signal, 'SIGKILL', signal.SIGTERM)
+    TERMINATING = {signal.SIGTERM, signal.SIGINT, KILL}
+    STOPPING = {getattr(signal, name) for name in ('SIGSTOP', 'SIGTSTP') if hasattr(signal, name)}
+
+    @staticmethod
+    def parse_signal(text):
+        """'-9' / '-KILL' / '-SIGKILL' -> номер сигнала"""
+        name = text.lstrip('-').upper()
+        if name.isdigit():
+            return signal.Signals(int(name))
+        if not name.startswith('SIG'):
+            name = 'SIG' + name
+        try:
+            return signal.Signals[name]
+        except KeyError:
+            raise ValueError(f"неизвестный сигнал: {text}")
+
+    @staticmethod
+    def snapshot():
+        """pid -> info и pid -> [дочерние pid] за один проход"""
+        processes = {}
+        children = {}
+        for proc in psutil.process_iter(['pid', 'ppid', 'name', 'username']):
+            processes[proc.info['pid']] = proc
+            children.setdefault(proc.info['ppid'], []).append(proc.info['pid'])
+        return processes, children
+
+    @classmethod
+    def format_tree(cls, roots=None):
+        processes, children = cls.snapshot()
+        if roots is None:
+            roots = [pid for pid, proc in processes.items()
+                     if proc.info['ppid'] not in processes or proc.info['ppid'] == pid]
+        lines = []
+        # Обход без рекурсии: глубина дерева не ограничена стеком Python
+        stack = [(pid, "", "", True) for pid in sorted(roots, reverse=True)]
+        while stack:
+            pid, prefix, branch, is_root = stack.pop()
+            proc = processes.get(pid)
+            if proc is None:
+                continue
+            lines.append(f"{prefix}{branch}{proc.info['name'] or '?'} ({pid})")
+            kids = sorted(child for child in children.get(pid, []) if child != pid)
+            if is_root:
+                child_prefix = prefix
+            else:
+                child_prefix = prefix + ("   " if branch.startswith("└") else "│  ")
+            for index, child in reversed(list(enumerate(kids))):
+                last = index == len(kids) - 1
+                stack.append((child, child_prefix, "└─ " if last else "├─ ", False))
+        return lines
+
+    @staticmethod
+    def name_matches(name, target):
+        """Точное имя или шаблон (*, ?, [..]); без учёта регистра, .exe необязателен"""
+        name = name.lower()
+        target = target.lower()
+        if any(char in target for char in '*?['):
+            return fnmatch.fnmatchcase(name, target)
+        return name == target or (name.endswith('.exe') and name[:-4] == target)
+
+    @classmethod
+    def find(cls, targets):
+        """PID или имя процесса (точно или по шаблону); свой процесс исключается"""
+        processes, _ = cls.snapshot()
+        own = os.getpid()
+        found = {}
+        for target in targets:
+            if target.isdigit():
+                proc = processes.get(int(target))
+                if proc is not None and proc.pid != own:
+                    found[proc.pid] = proc
+                continue
+            for pid, proc in processes.items():
+                if pid != own and cls.name_matches(proc.info['name'] or '', target):
+                    found[pid] = proc
+        return list(found.values())
+
+    @classmethod
+    def tree_of(cls, pid):
+        """Процесс и все его потомки (потомки первыми); сама консоль исключается"""
+        if pid in (1, os.getpid(), os.getppid()):
+            raise PermissionError(f"PID {pid} — системный процесс или сама консоль, дерево не трогаем")
+        processes, children = cls.snapshot()
+        if pid not in processes:
+            raise psutil.NoSuchProcess(pid)
+        own = os.getpid()
+        ordered = []
+        queue_pids = [pid]
+        while queue_pids:
+            current = queue_pids.pop()
+            if current != own:
+                ordered.append(processes[current])
+            queue_pids.extend(child for child in children.get(current, [])
+                              if child != current and child in processes)
+        ordered.reverse()
+        return ordered
+
+    @staticmethod
+    def _signal_all(procs, sig):
+        targets = []
+        errors = []
+        windows = platform.system() == "Windows"
+        for proc in procs:
+            try:
+                if windows:
+                    # На Windows доступны только terminate/kill
+                    proc.terminate() if sig == signal.SIGTERM else proc.kill()
+                else:
+                    proc.send_signal(sig)
+                targets.append(proc)
+            except psutil.NoSuchProcess:
+                continue
+            except (psutil.AccessDenied, OSError) as e:
+                errors.append((proc, e))
+        return targets, errors
+
+    @classmethod
+    def send_batch(cls, procs, sig, timeout=3.0):
+        """Сигнал всем процессам, затем общее ожидание. -> (завершились, живы, ошибки)"""
+        targets, errors = cls._signal_all(procs, sig)
+        if sig not in cls.TERMINATING:
+            # STOP, HUP, USR1 и т.п. не обязаны завершать процесс — не ждём
+            return targets, [], errors
+        gone, alive = psutil.wait_procs(targets, timeout=timeout)
+        return gone, alive, errors
+
+    @classmethod
+    def kill_tree(cls, pid, sig=signal.SIGTERM, timeout=3.0):
+        """Завершение дерева: sig всем сразу, выжившим после timeout — SIGKILL.
+
+        Незавершающие сигналы (STOP, HUP, USR1...) просто рассылаются всем:
+        без ожидания, без SIGKILL и без заморозки — иначе SIGCONT отменил бы
+        запрошенный SIGSTOP.
+        """
+        procs = cls.tree_of(pid)
+        if sig not in cls.TERMINATING:
+            return cls.send_batch(procs, sig, timeout)
+        if platform.system() == "Windows":
+            gone, alive, errors = cls.send_batch(procs, sig, timeout)
+        else:
+            # Замороженные процессы не успеют породить новых потомков между
+            # снимком и сигналом; sig доставится после SIGCONT
+            stopped, stop_errors = cls._signal_all(procs, signal.SIGSTOP)
+            # Незамороженным (нет доступа, гонка с завершением) sig всё равно
+            # отправляется; исчезнувшие к этому моменту уже не в списках
+            targets, errors = cls._signal_all(stopped + [proc for proc, _ in stop_errors], sig)
+            cls._signal_all(stopped, signal.SIGCONT)
+            reported = {id(proc) for proc in targets} | {id(proc) for proc, _ in errors}
+            errors += [(proc, e) for proc, e in stop_errors if id(proc) not in reported and proc.is_running()]
+            gone, alive = psutil.wait_procs(targets, timeout=timeout)
+        if alive:
+            more_gone, alive, more_errors = cls.send_batch(alive, cls.KILL, timeout)
+            gone += more_gone
+            errors += more_errors
+        return gone, alive, errors
+
+
+# ==============================================
+# ИСТОРИЯ МЕТРИК
+# ==============================================
+
+class MetricRing:
+    """Кольцевой файл фиксированного размера с записями struct, через mmap.
+
+    Заголовок: сигнатура, размер записи, ёмкость, индекс следующей записи,
+    число записей. Размер файла не растёт: новая запись затирает самую старую.
+    """
+
+    MAGIC = b"OCRING1\0"
+    HEADER = struct.Struct("<8sIIQQ")
+
+    def __init__(self, path, record_struct, capacity):
+        self.path = Path(path)
+        self.record = record_struct
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        size = self.HEADER.size + self.record.size * self.capacity
+        old_records = []
+        valid = False
+        try:
+            with open(self.path, 'rb') as f:
+                magic, record_size, capacity, head, count = self.HEADER.unpack(f.read(self.HEADER.size))
+                if magic == self.MAGIC and record_size == self.record.size:
+                    if capacity == self.capacity:
+                        # Файл, обрезанный сбоем или нехваткой места, создаётся заново
+                        valid = (os.fstat(f.fileno()).st_size == size
+                                 and head < capacity and count <= capacity)
+                    else:
+                        # Ёмкость поменяли в настройках — переносим последние записи
+                        body = f.read(record_size * capacity)
+                        start = (head - count) % capacity
+                        order = [(start + i) % capacity for i in range(count)][-self.capacity:]
+                        old_records = [self.record.unpack_from(body, i * record_size) for i in order]
+        except (OSError, struct.error):
+            pass
+        if not valid:
+            self._create(size)
+        self._file = open(self.path, 'r+b')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), size)
+        except (ValueError, OSError):
+            self._file.close()
+            self._create(size)
+            self._file = open(self.path, 'r+b')
+            self._mm = mmap.mmap(self._file.fileno(), size)
+        _magic, _size, _capacity, self.head, self.count = self.HEADER.unpack_from(self._mm, 0)
+        for values in old_records:
+            self.append(*values)
+
+    def _create(self, size):
+        self.path.unlink(missing_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.record.size, self.capacity, 0, 0))
+            f.truncate(size)
+
+    def append(self, *values):
+        with self._lock:
+            self.record.pack_into(self._mm, self.HEADER.size + self.head * self.record.size, *values)
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.HEADER.pack_into(self._mm, 0, self.MAGIC, self.record.size, self.capacity, self.head, self.count)
+
+    def read(self, since=None):
+        """Записи по порядку времени (первое поле записи — время)"""
+        with self._lock:
+            start = (self.head - self.count) % self.capacity
+            base, size = self.HEADER.size, self.record.size
+            first = self._mm[base + start * size:base + min(self.capacity, start + self.count) * size]
+            wrapped = start + self.count - self.capacity
+            second = self._mm[base:base + wrapped * size] if wrapped > 0 else b""
+        records = list(self.record.iter_unpack(first)) + list(self.record.iter_unpack(second))
+        if since is not None:
+            # Время растёт монотонно — ищем границу двоичным поиском
+            lo, hi = 0, len(records)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if records[mid][0] < since:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            records = records[lo:]
+        return records
+
+    def close(self):
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+            self._file.close()
+
+
+class MetricHistory:
+    """История метрик с автоматическим прореживанием 1 с → 1 мин → 1 ч.
+
+    Каждая выборка сэмплера пишется в кольцо секунд; средние за минуту и за
+    час дописываются в свои кольца при смене минуты/часа. Ёмкости колец
+    задаются в секции monitor.history, место на диске ограничено ими.
+    """
+
+    RECORD = struct.Struct("<d6f")
+    FIELDS = ('cpu', 'memory', 'disk_read', 'disk_write', 'net_rx', 'net_tx')
+
+    def __init__(self, directory=None, raw_seconds=3600, minute_days=7, hour_days=365):
+        directory = Path(directory or DATA_DIR)
+        self.rings = {
+            'second': MetricRing(directory / "metrics_1s.ring", self.RECORD, raw_seconds),
+            'minute': MetricRing(directory / "metrics_1m.ring", self.RECORD, minute_days * 24 * 60),
+            'hour': MetricRing(directory / "metrics_1h.ring", self.RECORD, hour_days * 24),
+        }
+        self._minute = (None, [])
+        self._hour = (None, [])
+
+    @staticmethod
+    def _values(snapshot):
+        system = snapshot.get('system', {})
+        devices = snapshot.get('disk', {}).get('devices', {}).values()
+        nics = [nic for name, nic in snapshot.get('network', {}).get('nics', {}).items()
+                if name != 'lo' and not name.lower().startswith('loopback')]
+        return (system.get('cpu_percent', 0.0), system.get('memory_percent', 0.0),
+                sum(d['read_bps'] for d in devices), sum(d['write_bps'] for d in devices),
+                sum(n['rx_bps'] for n in nics), sum(n['tx_bps'] for n in nics))
+
+    def on_sample(self, snapshot):
+        if 'system' not in snapshot:
+            return
+        timestamp = snapshot['time']
+        values = self._values(snapshot)
+        self.rings['second'].append(timestamp, *values)
+        self._minute = self._rollup(self._minute, int(timestamp // 60), timestamp, values, 'minute', 60)
+
+    def _rollup(self, state, bucket, timestamp, values, ring_name, period):
+        current, collected = state
+        if current is not None and bucket != current and collected:
+            averages = tuple(sum(column) / len(collected) for column in zip(*collected))
+            self.rings[ring_name].append(current * period, *averages)
+            if ring_name == 'minute':
+                self._hour = self._rollup(self._hour, int(current * period // 3600),
+                                          current * period, averages, 'hour', 3600)
+            collected = []
+        collected.append(values)
+        return bucket, collected
+
+    def series(self, seconds, points=60):
+        """Средние значения за последние seconds, прорежённые до points точек"""
+        now = time.time()
+        if seconds <= self.rings['second'].capacity:
+            ring = self.rings['second']
+        elif seconds <= self.rings['minute'].capacity * 60:
+            ring = self.rings['minute']
+        else:
+            ring = self.rings['hour']
+        since = now - seconds
+        records = ring.read(since)
+        buckets = [[] for _ in range(points)]
+        step = seconds / points
+        for record in records:
+            index = min(points - 1, int((record[0] - since) / step))
+            buckets[index].append(record)
+        return [tuple(sum(column) / len(bucket) for column in zip(*bucket))[1:] if bucket else None
+                for bucket in buckets]
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+
+
+# ==============================================
+# ОПОВЕЩЕНИЯ ПО ПОРОГАМ
+# ==============================================
+
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2,
+              'G': 1024 ** 3, 'GB': 1024 ** 3, 'T': 1024 ** 4, 'TB': 1024 ** 4}
+
+
+def parse_size(value):
+    """'5GB' / '512M' / 100 -> байты (float)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B?)\s*', str(value).upper())
+    if not match:
+        raise ValueError(f"не удалось разобрать размер: {value}")
+    return float(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def parse_duration(value):
+    """'2m' / '90s' / '1h' / '7d' / 120 -> секунды"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([smhd]?)\s*', str(value).lower())
+    if not match:
+        raise ValueError(f"не удалось разобрать длительность: {value}")
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+
+class AlertRule:
+    """Правило: metric op threshold в течение duration, снятие с гистерезисом"""
+
+    OPERATORS = {'>': lambda v, t: v > t, '>=': lambda v, t: v >= t,
+                 '<': lambda v, t: v < t, '<=': lambda v, t: v <= t}
+
+    def __init__(self, metric, op, threshold, duration=0, hysteresis=0, name=None):
+        if op not in self.OPERATORS:
+            raise ValueError(f"неизвестный оператор: {op}")
+        self.metric = metric
+        self.op = op
+        byte_metric = metric.startswith('disk_free') or metric in AlertEngine.RATE_METRICS
+        self.threshold = parse_size(threshold) if byte_metric else float(threshold)
+        self.hysteresis = parse_size(hysteresis) if byte_metric else float(hysteresis)
+        self.duration = parse_duration(duration)
+        self.name = name or f"{metric} {op} {threshold}"
+        self.breached = self.OPERATORS[op]
+        # Порог снятия: для '>' значение должно опуститься ниже threshold - hysteresis
+        if op.startswith('>'):
+            self.recovered = lambda v, level=self.threshold - self.hysteresis: v < level
+        else:
+            self.recovered = lambda v, level=self.threshold + self.hysteresis: v > level
+        self.pending_since = None
+        self.firing = False
+        self.value = None
+
+    @classmethod
+    def from_config(cls, entry):
+        return cls(entry['metric'], entry.get('op', '>'), entry['threshold'],
+                   entry.get('duration', 0), entry.get('hysteresis', 0), entry.get('name'))
+
+
+class AlertEngine:
+    """Инкрементальная проверка правил на каждой выборке сэмплера.
+
+    Правила сгруппированы по метрике: значение каждой метрики извлекается из
+    снимка один раз, а правило хранит своё состояние (с какого момента
+    порог нарушен, сработало ли), поэтому тик стоит пару сравнений на правило.
+    """
+
+    RATE_METRICS = ('disk_read', 'disk_write', 'net_rx', 'net_tx')
+
+    def __init__(self, on_event=None):
+        self.rules = []
+        self._by_metric = {}
+        self.on_event = on_event or (lambda kind, rule, value: None)
+
+    def set_rules(self, rules):
+        self.rules = list(rules)
+        self._by_metric = {}
+        for rule in self.rules:
+            self._by_metric.setdefault(rule.metric, []).append(rule)
+
+    def add_rule(self, rule):
+        self.set_rules(self.rules + [rule])
+
+    def remove_rule(self, index):
+        rules = list(self.rules)
+        if index < 0:
+            raise IndexError(index)
+        rule = rules.pop(index)
+        self.set_rules(rules)
+        return rule
+
+    @staticmethod
+    def metric_value(snapshot, metric):
+        system = snapshot.get('system')
+        if metric == 'cpu':
+            return system and system['cpu_percent']
+        if metric == 'memory':
+            return system and system['memory_percent']
+        if metric.startswith(('disk_free:', 'disk_percent:')):
+            kind, mountpoint = metric.split(':', 1)
+            for part in snapshot.get('disk', {}).get('partitions', []):
+                if part['mountpoint'] == mountpoint and part['state'] == 'ok':
+                    return part['free'] if kind == 'disk_free' else part['percent']
+            return None
+        if metric in ('disk_read', 'disk_write'):
+            devices = snapshot.get('disk', {}).get('devices')
+            key = 'read_bps' if metric == 'disk_read' else 'write_bps'
+            return sum(d[key] for d in devices.values()) if devices else None
+        if metric in ('net_rx', 'net_tx'):
+            nics = snapshot.get('network', {}).get('nics')
+            key = 'rx_bps' if metric == 'net_rx' else 'tx_bps'
+            return sum(n[key] for n in nics.values()) if nics else None
+        return None
+
+    def evaluate(self, snapshot):
+        now = snapshot.get('time', time.time())
+        for metric, rules in self._by_metric.items():
+            value = self.metric_value(snapshot, metric)
+            if value is None:
+                continue
+            for rule in rules:
+                rule.value = value
+                if rule.firing:
+                    if rule.recovered(value):
+                        rule.firing = False
+                        rule.pending_since = None
+                        self.on_event('resolved', rule, value)
+                elif rule.breached(value, rule.threshold):
+                    if rule.pending_since is None:
+                        rule.pending_since = now
+                    if now - rule.pending_since >= rule.duration:
+                        rule.firing = True
+                        self.on_event('firing', rule, value)
+                else:
+                    rule.pending_since = None
+
+    def firing_count(self):
+        return sum(1 for rule in self.rules if rule.firing)
+
+
+# ==============================================
+# ЭКСПОРТ МЕТРИК (PROMETHEUS)
+# ==============================================
+
+class CommandStats:
+    """Гистограмма длительности команд консоли (по первому слову команды)"""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    MAX_COMMANDS = 200  # ограничение числа меток: остальные команды идут в "other"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, command, seconds, failed=False):
+        name = command.split()[0].lower() if command.strip() else ""
+        with self._lock:
+            if name not in self._stats and len(self._stats) >= self.MAX_COMMANDS:
+                name = "other"
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = [[0] * len(self.BUCKETS), 0, 0.0, 0]
+            buckets = stats[0]
+            i = bisect_left(self.BUCKETS, seconds)
+            if i < len(buckets):
+                buckets[i] += 1
+            stats[1] += 1
+            stats[2] += seconds
+            if failed:
+                stats[3] += 1
+
+    def snapshot(self):
+        """{команда: (накопительные бакеты, count, sum, errors)}"""
+        with self._lock:
+            items = [(name, list(stats[0]), stats[1], stats[2], stats[3]) for name, stats in self._stats.items()]
+        result = {}
+        for name, buckets, count, total, errors in items:
+            cumulative = []
+            running = 0
+            for value in buckets:
+                running += value
+                cumulative.append(running)
+            result[name] = (cumulative, count, total, errors)
+        return result
+
+
+def _prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsExporter:
+    """Текст в формате Prometheus, собранный заранее на каждом тике сэмплера.
+
+    Запрос /metrics отдаёт готовые байты и никогда не вызывает psutil.
+    """
+
+    def __init__(self, command_stats):
+        self.command_stats = command_stats
+        self.payload = b"# no samples yet\n"
+
+    def on_sample(self, snapshot):
+        self.payload = self.render(snapshot).encode('utf-8')
+
+    def render(self, snapshot):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if labels:
+                    label_text = ",".join(f'{k}="{_prometheus_label(v)}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+
+        metric("oc_sample_timestamp_seconds", "gauge", "Unix time of the last monitor sample",
+               [((), snapshot.get('time', 0))])
+
+        system = snapshot.get('system')
+        if system:
+            metric("oc_cpu_percent", "gauge", "CPU utilisation in percent", [((), system['cpu_percent'])])
+            metric("oc_memory_total_bytes", "gauge", "Total physical memory", [((), system['memory_total'])])
+            metric("oc_memory_used_bytes", "gauge", "Used physical memory", [((), system['memory_used'])])
+            metric("oc_memory_available_bytes", "gauge", "Available physical memory",
+                   [((), system['memory_available'])])
+
+        disk = snapshot.get('disk', {})
+        devices = sorted(disk.get('devices', {}).items())
+        if devices:
+            for key, name, help_text in (('read_bps', 'oc_disk_read_bytes_per_second', 'Disk read rate'),
+                                         ('write_bps', 'oc_disk_write_bytes_per_second', 'Disk write rate'),
+                                         ('read_iops', 'oc_disk_read_iops', 'Disk read operations per second'),
+                                         ('write_iops', 'oc_disk_write_iops', 'Disk write operations per second')):
+                metric(name, "gauge", help_text, [((('device', dev),), round(io[key], 3)) for dev, io in devices])
+        partitions = disk.get('partitions', [])
+        if partitions:
+            def labels(part):
+                return ('mountpoint', part['mountpoint']), ('fstype', part['fstype'])
+
+            metric("oc_filesystem_up", "gauge", "1 if the last disk_usage probe answered in time",
+                   [(labels(p), 1 if p['state'] == 'ok' else 0) for p in partitions])
+            ok = [p for p in partitions if p['state'] == 'ok']
+            metric("oc_filesystem_size_bytes", "gauge", "Filesystem size", [(labels(p), p['total']) for p in ok])
+            metric("oc_filesystem_free_bytes", "gauge", "Filesystem free space", [(labels(p), p['free']) for p in ok])
+
+        nics = sorted(snapshot.get('network', {}).get('nics', {}).items())
+        if nics:
+            metric("oc_network_receive_bytes_per_second", "gauge", "Receive rate",
+                   [((('interface', n),), round(v['rx_bps'], 3)) for n, v in nics])
+            metric("oc_network_transmit_bytes_per_second", "gauge", "Transmit rate",
+                   [((('interface', n),), round(v['tx_bps'], 3)) for n, v in nics])
+            metric("oc_network_receive_bytes_total", "counter", "Bytes received",
+                   [((('interface', n),), v['rx_total']) for n, v in nics])
+            metric("oc_network_transmit_bytes_total", "counter", "Bytes sent",
+                   [((('interface', n),), v['tx_total']) for n, v in nics])
+
+        commands = sorted(self.command_stats.snapshot().items())
+        if commands:
+            name = "oc_command_duration_seconds"
+            lines.append(f"# HELP {name} Console command dispatch latency")
+            lines.append(f"# TYPE {name} histogram")
+            for command, (cumulative, count, total, _errors) in commands:
+                label = f'command="{_prometheus_label(command)}"'
+                for bound, value in zip(CommandStats.BUCKETS, cumulative):
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {value}')
+                lines.append(f'{name}_bucket{{{label},le="+Inf"}} {count}')
+                lines.append(f"{name}_sum{{{label}}} {total:.6f}")
+                lines.append(f"{name}_count{{{label}}} {count}")
+            metric("oc_command_errors_total", "counter", "Console commands that reported an error",
+                   [((('command', c),), v[3]) for c, v in commands])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """GET /metrics — отдаёт заранее собранный текст"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = self.server.exporter.payload
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    """Локальный HTTP-эндпоинт /metrics (включается явно)"""
+
+    daemon_threads = True
+
+    def __init__(self, exporter, port=9464, host="127.0.0.1"):
+        self.exporter = exporter
+        super().__init__((host, port), MetricsHandler)
+        self.thread = threading.Thread(target=self.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# ==============================================
+# ТЕСТ СКОРОСТИ
+# ==============================================
+
+class SpeedTester:
+    """Тест пропускной способности по HTTP в несколько параллельных потоков.
+
+    Протокол совместим со speed.cloudflare.com и встроенным SpeedTestServer:
+    GET <url>/__down?bytes=N отдаёт N байт, POST <url>/__up принимает тело.
+    Сначала меряются задержка и джиттер, затем скачивание и загрузка;
+    первые warmup секунд (разгон TCP) в итоговую скорость не входят.
+    """
+
+    CHUNK = 64 * 1024
+
+    def __init__(self, url, streams=4, duration=8.0, warmup=2.0, latency_samples=10,
+                 request_bytes=25 * 1024 * 1024, timeout=10.0, progress=None):
+        parsed = urllib.parse.urlsplit(url if "://" in url else "http://" + url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip('/')
+        self.streams = max(1, int(streams))
+        self.duration = float(duration)
+        self.warmup = min(float(warmup), self.duration / 2)
+        self.latency_samples = latency_samples
+        self.request_bytes = request_bytes
+        self.timeout = timeout
+        self.progress = progress or (lambda text: None)
+        self._payload = os.urandom(self.CHUNK)
+
+    def _connection(self):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def measure_latency(self):
+        """(мин, среднее, джиттер) в мс по запросам пустого ответа на одном соединении"""
+        conn = self._connection()
+        samples = []
+        try:
+            for i in range(self.latency_samples + 1):
+                started = time.perf_counter()
+                conn.request("GET", f"{self.base_path}/__down?bytes=0")
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise OSError(f"HTTP {response.status}")
+                if i:  # первый запрос включает установку соединения
+                    samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            conn.close()
+        jitter = sum(abs(a - b) for a, b in zip(samples, samples[1:])) / max(1, len(samples) - 1)
+        return min(samples), sum(samples) / len(samples), jitter
+
+    def _download_stream(self, counters, index, deadline):
+        conn = self._connection()
+        try:
+            while time.perf_counter() < deadline:
+                conn.request("GET", f"{self.base_path}/__down?bytes={self.request_bytes}")
+                response = conn.getresponse()
+                if response.status != 200:
+                    raise OSError(f"HTTP {response.status}")
+                while time.perf_counter() < deadline:
+                    data = response.read(self.CHUNK)
+                    if not data:
+                        break
+                    counters[index] += len(data)
+                else:
+                    return  # дедлайн посреди ответа: соединение просто закрывается
+        finally:
+            conn.close()
+
+    def _upload_stream(self, counters, index, deadline):
+        conn = self._connection()
+        try:
+            while time.perf_counter() < deadline:
+                conn.putrequest("POST", f"{self.base_path}/__up")
+                conn.putheader("Content-Type", "application/octet-stream")
+                conn.putheader("Content-Length", str(self.request_bytes))
+                conn.endheaders()
+                sent = 0
+                while sent < self.request_bytes:
+                    if time.perf_counter() >= deadline:
+                        return
+                    chunk = self._payload[:self.request_bytes - sent]
+                    conn.send(chunk)
+                    sent += len(chunk)
+                    counters[index] += len(chunk)
+                response = conn.getresponse()
+                response.read()
+        finally:
+            conn.close()
+
+    def _run_phase(self, worker, label):
+        """Параллельные потоки + выборка суммарного счётчика раз в 100 мс"""
+        counters = [0] * self.streams
+        started = time.perf_counter()
+        deadline = started + self.duration
+        with ThreadPoolExecutor(max_workers=self.streams, thread_name_prefix="speedtest") as pool:
+            futures = [pool.submit(worker, counters, i, deadline) for i in range(self.streams)]
+            series = []
+            next_report = started + 1
+            while not all(f.done() for f in futures):
+                time.sleep(0.1)
+                now = time.perf_counter()
+                series.append((now - started, sum(counters)))
+                if now >= next_report:
+                    next_report += 1
+                    self.progress(f"  {label}: {self._mbps(series, max(0.0, now - started - 1), now - started):.1f} Mbps\n")
+            errors = [f.exception() for f in futures if f.exception()]
+        if errors and not sum(counters):
+            raise errors[0]
+        series.append((time.perf_counter() - started, sum(counters)))
+        return self._mbps(series, self.warmup, series[-1][0]), sum(counters)
+
+    @staticmethod
+    def _mbps(series, t_from, t_to):
+        """Скорость на интервале [t_from, t_to] по ряду (время, байты)"""
+        if not series or t_to <= t_from:
+            return 0.0
+        bytes_from = 0
+        for t, total in series:
+            if t > t_from:
+                break
+            bytes_from = total
+        bytes_to = series[-1][1]
+        for t, total in series:
+            if t <= t_to:
+                bytes_to = total
+        elapsed = t_to - max(t_from, 0.0)
+        return (bytes_to - bytes_from) * 8 / elapsed / 1e6 if elapsed > 0 else 0.0
+
+    def run(self):
+        """Полный тест. Возвращает словарь результатов"""
+        result = {}
+        result['latency_min'], result['latency_avg'], result['jitter'] = self.measure_latency()
+        self.progress(f"  Задержка: {result['latency_avg']:.1f} мс (мин {result['latency_min']:.1f}, "
+                      f"джиттер {result['jitter']:.1f})\n")
+        result['download_mbps'], result['download_bytes'] = self._run_phase(self._download_stream, "⬇ скачивание")
+        result['upload_mbps'], result['upload_bytes'] = self._run_phase(self._upload_stream, "⬆ загрузка")
+        return result
+
+
+class SpeedTestHandler(http.server.BaseHTTPRequestHandler):
+    """Обработчик локального сервера для проверки speedtest без интернета"""
+
+    protocol_version = "HTTP/1.1"
+    payload = b"\0" * (1024 * 1024)
+
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        if not parsed.path.endswith("/__down"):
+            self.send_error(404)
+            return
+        try:
+            size = int(urllib.parse.parse_qs(parsed.query).get('bytes', ['0'])[0])
+        except ValueError:
+            size = 0
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        try:
+            while size > 0:
+                chunk = self.payload[:size]
+                self.wfile.write(chunk)
+                size -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_POST(self):
+        if not self.path.split('?')[0].endswith("/__up"):
+            self.send_error(404)
+            return
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            data = self.rfile.read(min(remaining, 1024 * 1024))
+            if not data:
+                self.close_connection = True
+                return
+            remaining -= len(data)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SpeedTestServer(http.server.ThreadingHTTPServer):
+    """Локальный сервер speedtest (команда: speedtest serve [порт])"""
+
+    daemon_threads = True
+
+    def __init__(self, port=8765, host="127.0.0.1"):
+        super().__init__((host, port), SpeedTestHandler)
+        self.thread = threading.Thread(target=self.serve_forever, name="speedtest-server", daemon=True)
+        self.thread.start()
+
+    def handle_error(self, request, client_address):
+        # Клиент обрывает соединения по дедлайну фазы — это не ошибка
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+# ==============================================
+# DNS
+# ==============================================
+
+class DnsError(Exception):
+    pass
+
+
+class DnsResolver:
+    """Небольшой DNS-клиент с кэшем по TTL.
+
+    Запросы идут по UDP на серверы из /etc/resolv.conf (при усечении ответа —
+    повтор по TCP), поэтому TTL берётся из ответа. Если серверы неизвестны
+    (Windows) или имя не находится в DNS (hosts, mDNS), адреса берутся из
+    getaddrinfo и кэшируются на default_ttl. Кэш общий для dig/nslookup и ping.
+    """
+
+    TYPES = {'A': 1, 'NS': 2, 'CNAME': 5, 'SOA': 6, 'PTR': 12, 'MX': 15, 'TXT': 16, 'AAAA': 28, 'SRV': 33}
+    TYPE_NAMES = {number: name for name, number in TYPES.items()}
+    RCODES = {1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+    def __init__(self, executor, timeout=2.0, default_ttl=60, negative_ttl=30, max_entries=1024):
+        self.executor = executor
+        self.timeout = timeout
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.nameservers = self._system_nameservers()
+
+    @staticmethod
+    def _system_nameservers():
+        servers = []
+        try:
+            with open("/etc/resolv.conf", 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 2 and parts[0] == 'nameserver':
+                        servers.append(parts[1].split('%')[0])
+        except OSError:
+            pass
+        return servers
+
+    # ---------- кэш ----------
+
+    def _cache_get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def _cache_put(self, key, result, ttl):
+        with self._lock:
+            if len(self._cache) >= self.max_entries:
+                now = time.monotonic()
+                self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+                if len(self._cache) >= self.max_entries:
+                    self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = (time.monotonic() + ttl, result)
+
+    def cache_entries(self):
+        now = time.monotonic()
+        with self._lock:
+            return [(key, int(expires - now)) for key, (expires, _) in self._cache.items() if expires > now]
+
+    def flush(self):
+        with self._lock:
+            self._cache.clear()
+
+    # ---------- протокол ----------
+
+    @classmethod
+    def _build_query(cls, name, qtype):
+        query_id = secrets.randbits(16)
+        header = struct.pack(">HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+        qname = b"".join(bytes([len(label)]) + label
+                         for label in (part.encode('idna') for part in name.rstrip('.').split('.')) if label)
+        return query_id, header + qname + b"\0" + struct.pack(">HH", cls.TYPES[qtype], 1)
+
+    @staticmethod
+    def _read_name(data, offset):
+        labels = []
+        jumped = False
+        end = offset
+        for _ in range(128):
+            length = data[offset]
+            if length & 0xC0 == 0xC0:
+                if not jumped:
+                    end = offset + 2
+                offset = ((length & 0x3F) << 8) | data[offset + 1]
+                jumped = True
+            elif length == 0:
+                if not jumped:
+                    end = offset + 1
+                return '.'.join(labels) or '.', end
+            else:
+                labels.append(data[offset + 1:offset + 1 + length].decode('ascii', 'replace'))
+                offset += length + 1
+        raise DnsError("петля сжатия имён в ответе")
+
+    @classmethod
+    def _parse_rdata(cls, data, rtype, offset, length):
+        rdata = data[offset:offset + length]
+        if rtype == 1 and length == 4:
+            return socket.inet_ntop(socket.AF_INET, rdata)
+        if rtype == 28 and length == 16:
+            return socket.inet_ntop(socket.AF_INET6, rdata)
+        if rtype in (2, 5, 12):
+            return cls._read_name(data, offset)[0]
+        if rtype == 15:
+            return f"{struct.unpack('>H', rdata[:2])[0]} {cls._read_name(data, offset + 2)[0]}"
+        if rtype == 33:
+            priority, weight, port = struct.unpack('>HHH', rdata[:6])
+            return f"{priority} {weight} {port} {cls._read_name(data, offset + 6)[0]}"
+        if rtype == 16:
+            texts = []
+            position = 0
+            while position < length:
+                size = rdata[position]
+                texts.append(rdata[position + 1:position + 1 + size].decode('utf-8', 'replace'))
+                position += size + 1
+            return ' '.join(f'"{text}"' for text in texts)
+        if rtype == 6:
+            mname, position = cls._read_name(data, offset)
+            rname, position = cls._read_name(data, position)
+            serial = struct.unpack('>I', data[position:position + 4])[0]
+            return f"{mname} {rname} {serial}"
+        return rdata.hex()
+
+    @classmethod
+    def _parse_response(cls, data, query_id):
+        response_id, flags, qdcount, ancount, _, _ = struct.unpack(">HHHHHH", data[:12])
+        if response_id != query_id:
+            raise DnsError("ответ не на наш запрос")
+        offset = 12
+        for _ in range(qdcount):
+            offset = cls._read_name(data, offset)[1] + 4
+        records = []
+        for _ in range(ancount):
+            name, offset = cls._read_name(data, offset)
+            rtype, _, ttl, length = struct.unpack(">HHIH", data[offset:offset + 10])
+            offset += 10
+            records.append({'name': name, 'type': cls.TYPE_NAMES.get(rtype, str(rtype)), 'ttl': ttl,
+                            'value': cls._parse_rdata(data, rtype, offset, length)})
+            offset += length
+        return flags & 0x0F, bool(flags & 0x0200), records
+
+    def _exchange(self, server, packet, query_id):
+        family = socket.AF_INET6 if ':' in server else socket.AF_INET
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect((server, 53))
+            sock.send(packet)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                data = sock.recv(4096)
+                if len(data) >= 12 and struct.unpack(">H", data[:2])[0] == query_id:
+                    break
+                if time.monotonic() > deadline:
+                    raise socket.timeout("timed out")
+        rcode, truncated, records = self._parse_response(data, query_id)
+        if truncated:
+            with socket.create_connection((server, 53), timeout=self.timeout) as sock:
+                sock.sendall(struct.pack(">H", len(packet)) + packet)
+                size = struct.unpack(">H", self._recv_exact(sock, 2))[0]
+                rcode, _, records = self._parse_response(self._recv_exact(sock, size), query_id)
+        return rcode, records
+
+    @staticmethod
+    def _recv_exact(sock, size):
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise DnsError("сервер закрыл соединение")
+            data += chunk
+        return data
+
+    # ---------- запросы ----------
+
+    def query(self, name, qtype='A', server=None):
+        """-> {'name', 'type', 'records', 'status', 'server', 'ms', 'cached'}"""
+        qtype = qtype.upper()
+        if qtype not in self.TYPES:
+            raise DnsError(f"неподдерживаемый тип записи: {qtype}")
+        if qtype == 'PTR' and not name.endswith('.arpa'):
+            name = ipaddress.ip_address(name).reverse_pointer
+        key = (name.lower().rstrip('.'), qtype, server)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        servers = [server] if server else self.nameservers
+        if not servers:
+            return self._query_system(name, qtype, key)
+        query_id, packet = self._build_query(name, qtype)
+        started = time.perf_counter()
+        last_error = None
+        for candidate in servers:
+            try:
+                rcode, records = self._exchange(candidate, packet, query_id)
+            except (OSError, DnsError, struct.error, IndexError) as e:
+                last_error = e
+                continue
+            result = {'name': name, 'type': qtype, 'records': records,
+                      'status': self.RCODES.get(rcode, 'NOERROR' if rcode == 0 else str(rcode)),
+                      'server': candidate, 'ms': (time.perf_counter() - started) * 1000, 'cached': False}
+            ttl = min((record['ttl'] for record in records), default=self.negative_ttl)
+            if rcode in (0, 3):
+                self._cache_put(key, result, max(1, ttl))
+            return result
+        raise DnsError(f"нет ответа от DNS-серверов ({last_error})")
+
+    def _query_system(self, name, qtype, key):
+        """Запрос через getaddrinfo: только A/AAAA, TTL неизвестен"""
+        if qtype not in ('A', 'AAAA'):
+            raise DnsError("DNS-серверы системы неизвестны: доступны только запросы A/AAAA")
+        family = socket.AF_INET if qtype == 'A' else socket.AF_INET6
+        started = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(name, None, family, socket.SOCK_STREAM)
+            status = 'NOERROR'
+        except socket.gaierror:
+            infos = []
+            status = 'NXDOMAIN'
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        result = {'name': name, 'type': qtype, 'status': status, 'server': 'system',
+                  'records': [{'name': name, 'type': qtype, 'ttl': self.default_ttl, 'value': address}
+                              for address in addresses],
+                  'ms': (time.perf_counter() - started) * 1000, 'cached': False}
+        self._cache_put(key, result, self.default_ttl if addresses else self.negative_ttl)
+        return result
+
+    def resolve(self, host):
+        """Адреса хоста для сетевых команд (IP-литерал возвращается как есть).
+
+        Сначала системный резолвер (hosts, nsswitch, mDNS — как у ping);
+        собственные DNS-запросы — только если он имени не знает.
+        """
+        try:
+            return [str(ipaddress.ip_address(host))]
+        except ValueError:
+            pass
+        name = host.lower().rstrip('.')
+        for qtype in ('A', 'AAAA'):
+            key = (name, qtype, 'system')
+            cached = self._cache_get(key)
+            if cached is None:
+                cached = self._query_system(host, qtype, key)
+            addresses = [record['value'] for record in cached['records']]
+            if addresses:
+                return addresses
+        # Имена без точки и localhost живут в hosts/mDNS, а не в DNS
+        if '.' in name and name != 'localhost':
+            for qtype in ('A', 'AAAA'):
+                try:
+                    result = self.query(host, qtype)
+                except DnsError:
+                    break
+                addresses = [record['value'] for record in result['records'] if record['type'] == qtype]
+                if addresses:
+                    return addresses
+        return []
+
+    def query_many(self, names, qtype='A', server=None):
+        """Параллельные запросы; -> [(имя, результат или исключение)]"""
+        def run(name):
+            try:
+                return name, self.query(name, qtype, server)
+            except (DnsError, ValueError) as e:
+                return name, e
+        return list(self.executor.map(run, names))
+
+
+# ==============================================
+# ТРАССИРОВКА
+# ==============================================
+
+class Traceroute:
+    """Трассировка с одновременной отправкой проб для всех TTL.
+
+    Linux: по сокету на пробу (UDP, или ICMP echo через ping-сокеты при
+    use_icmp) с IP_RECVERR — ответы маршрутизаторов приходят в очередь
+    ошибок сокета, root не нужен. Другие системы: raw ICMP (нужны права
+    администратора). Хоп передаётся в on_hop, как только он и все
+    предыдущие получены, поэтому вывод идёт по мере ответов.
+    """
+
+    IP_RECVERR = getattr(socket, 'IP_RECVERR', 11)
+    IPV6_RECVERR = getattr(socket, 'IPV6_RECVERR', 25)
+    IPV6_UNICAST_HOPS = getattr(socket, 'IPV6_UNICAST_HOPS', 16)
+    MSG_ERRQUEUE = getattr(socket, 'MSG_ERRQUEUE', 0x2000)
+    # ICMP "недостижимо" с кодом, отличным от port unreachable
+    UNREACHABLE_NOTES = {0: '!N', 1: '!H', 2: '!P', 9: '!X', 10: '!X', 13: '!X'}
+
+    def __init__(self, address, max_hops=30, probes=3, timeout=2.0, use_icmp=False,
+                 port_base=33434, on_hop=None):
+        self.address = address
+        self.family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        self.max_hops = max_hops
+        self.probes = probes
+        self.timeout = timeout
+        self.use_icmp = use_icmp
+        self.port_base = port_base
+        self.on_hop = on_hop or (lambda hop: None)
+        self.hops = [{'ttl': ttl, 'address': None, 'rtts': [None] * probes, 'answered': 0, 'note': ''}
+                     for ttl in range(1, max_hops + 1)]
+        self.destination_ttl = None
+        self._emitted = 0
+
+    def run(self):
+        if platform.system() == "Linux":
+            self._run_errqueue()
+        else:
+            self._run_raw()
+        self._emit(final=True)
+        last = self.destination_ttl or self.max_hops
+        return self.hops[:last]
+
+    # ---------- общая часть ----------
+
+    def _record(self, ttl, probe, address, rtt, reached=False, note=''):
+        hop = self.hops[ttl - 1]
+        if hop['rtts'][probe] is not None:
+            return
+        hop['rtts'][probe] = rtt
+        hop['answered'] += 1
+        hop['address'] = hop['address'] or address
+        if note:
+            hop['note'] = note
+        if reached and (self.destination_ttl is None or ttl < self.destination_ttl):
+            self.destination_ttl = ttl
+
+    def _done(self):
+        last = self.destination_ttl
+        return last is not None and all(hop['answered'] == self.probes for hop in self.hops[:last])
+
+    def _emit(self, final=False):
+        last = self.destination_ttl or self.max_hops
+        while self._emitted < last:
+            hop = self.hops[self._emitted]
+            if hop['answered'] < self.probes and not final:
+                break
+            self.on_hop(hop)
+            self._emitted += 1
+
+    # ---------- Linux: IP_RECVERR ----------
+
+    def _open_probe(self, ttl, index):
+        if self.use_icmp:
+            sock = socket.socket(self.family, socket.SOCK_DGRAM,
+                                 socket.IPPROTO_ICMPV6 if self.family == socket.AF_INET6 else socket.IPPROTO_ICMP)
+            payload = struct.pack('!BBHHH', 128 if self.family == socket.AF_INET6 else 8, 0, 0, 0, index) + bytes(24)
+            port = 0
+        else:
+            sock = socket.socket(self.family, socket.SOCK_DGRAM)
+            payload = bytes(32)
+            port = self.port_base + index
+        if self.family == socket.AF_INET6:
+            sock.setsockopt(socket.IPPROTO_IPV6, self.IPV6_RECVERR, 1)
+            sock.setsockopt(socket.IPPROTO_IPV6, self.IPV6_UNICAST_HOPS, ttl)
+        else:
+            sock.setsockopt(socket.IPPROTO_IP, self.IP_RECVERR, 1)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+        sock.setblocking(False)
+        sock.connect((self.address, port))
+        return sock, payload
+
+    def _parse_error(self, ancdata):
+        """-> (адрес отправителя ICMP, достигнута ли цель, пометка) или None"""
+        for level, kind, data in ancdata:
+            if (level, kind) not in ((socket.IPPROTO_IP, self.IP_RECVERR),
+                                     (socket.IPPROTO_IPV6, self.IPV6_RECVERR)):
+                continue
+            _, origin, icmp_type, code = struct.unpack_from('=IBBB', data)
+            family = struct.unpack_from('=H', data, 16)[0]
+            if family == socket.AF_INET:
+                address = socket.inet_ntop(socket.AF_INET, data[20:24])
+            elif family == socket.AF_INET6:
+                address = socket.inet_ntop(socket.AF_INET6, data[24:40])
+            else:
+                return None
+            if origin == 2:  # ICMP
+                if icmp_type == 11:
+                    return address, False, ''
+                if icmp_type == 3:
+                    return address, True, '' if code == 3 else self.UNREACHABLE_NOTES.get(code, f'!{code}')
+            elif origin == 3:  # ICMPv6
+                if icmp_type == 3:
+                    return address, False, ''
+                if icmp_type == 1:
+                    return address, True, '' if code == 4 else f'!{code}'
+        return None
+
+    def _run_errqueue(self):
+        poller = select.poll()
+        probes = {}
+        try:
+            for ttl in range(1, self.max_hops + 1):
+                for probe in range(self.probes):
+                    index = (ttl - 1) * self.probes + probe
+                    sock, payload = self._open_probe(ttl, index)
+                    probes[sock.fileno()] = (sock, ttl, probe, time.perf_counter())
+                    sock.send(payload)
+                    poller.register(sock, select.POLLIN | select.POLLERR)
+            deadline = time.perf_counter() + self.timeout
+            while probes and not self._done():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                for fd, _ in poller.poll(remaining * 1000):
+                    received = time.perf_counter()
+                    sock, ttl, probe, sent = probes[fd]
+                    result = None
+                    try:
+                        _, ancdata, _, _ = sock.recvmsg(512, 512, self.MSG_ERRQUEUE)
+                        result = self._parse_error(ancdata)
+                    except BlockingIOError:
+                        # Эхо-ответ ICMP пришёл обычными данными — цель достигнута
+                        try:
+                            sock.recv(512)
+                            result = (self.address, True, '')
+                        except OSError:
+                            pass
+                    except OSError:
+                        pass
+                    if result is None:
+                        continue
+                    address, reached, note = result
+                    self._record(ttl, probe, address, (received - sent) * 1000, reached, note)
+                    poller.unregister(fd)
+                    probes.pop(fd)[0].close()
+                self._emit()
+        finally:
+            for sock, *_ in probes.values():
+                sock.close()
+
+    # ---------- прочие системы: raw ICMP ----------
+
+    @staticmethod
+    def _checksum(data):
+        if len(data) % 2:
+            data += b'\0'
+        total = sum(array('H', data))
+        total = (total >> 16) + (total & 0xFFFF)
+        total += total >> 16
+        return socket.htons(~total & 0xFFFF)
+
+    def _run_raw(self):
+        if self.family != socket.AF_INET:
+            raise OSError("трассировка IPv6 на этой системе не поддерживается")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        try:
+            if platform.system() == "Windows":
+                # На Windows raw-сокет получает ICMP только будучи привязанным к адресу
+                with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                    probe.connect((self.address, 9))
+                    sock.bind((probe.getsockname()[0], 0))
+            identifier = os.getpid() & 0xFFFF
+            sent = {}
+            for ttl in range(1, self.max_hops + 1):
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+                for probe in range(self.probes):
+                    sequence = (ttl - 1) * self.probes + probe
+                    header = struct.pack('!BBHHH', 8, 0, 0, identifier, sequence)
+                    payload = bytes(24)
+                    checksum = self._checksum(header + payload)
+                    packet = struct.pack('!BBHHH', 8, 0, checksum, identifier, sequence) + payload
+                    sent[sequence] = (ttl, probe, time.perf_counter())
+                    sock.sendto(packet, (self.address, 0))
+            deadline = time.perf_counter() + self.timeout
+            while not self._done():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, (address, _) = sock.recvfrom(1024)
+                except socket.timeout:
+                    break
+                received = time.perf_counter()
+                header_length = (data[0] & 0x0F) * 4
+                icmp_type = data[header_length]
+                if icmp_type == 0:
+                    echo = data[header_length:header_length + 8]
+                    reached, note = True, ''
+                elif icmp_type in (11, 3):
+                    # Внутри ICMP-ошибки — заголовок исходного пакета и 8 байт нашего ICMP
+                    inner = data[header_length + 8:]
+                    echo = inner[(inner[0] & 0x0F) * 4:][:8]
+                    reached = icmp_type == 3
+                    note = self.UNREACHABLE_NOTES.get(data[header_length + 1], '') if reached else ''
+                else:
+                    continue
+                if len(echo) < 8:
+                    continue
+                _, _, _, echo_id, sequence = struct.unpack('!BBHHH', echo)
+                if echo_id != identifier or sequence not in sent:
+                    continue
+                ttl, probe, started = sent.pop(sequence)
+                self._record(ttl, probe, address, (received - started) * 1000, reached, note)
+                self._emit()
+        finally:
+            sock.close()
+
+
+# ==============================================
+# АВТОЗАГРУЗКА
+# ==============================================
+
+class StartupAnalyzer:
+    """Сбор записей автозагрузки: XDG autostart и systemd --user на Linux,
+    ключи Run реестра на Windows.
+
+    Каждая запись — словарь: source, name, command, location, binary, size,
+    enabled, start_cost (секунды или None). Файлы разбираются параллельно
+    в переданном пуле потоков.
+    """
+
+    XDG_DIRS = [Path("/etc/xdg/autostart")]
+    RUN_KEY = r"Software\Microsoft\Windows\CurrentVersion\Run"
+    APPROVED_KEY = r"Software\Microsoft\Windows\CurrentVersion\Explorer\StartupApproved\Run"
+
+    def __init__(self, executor):
+        self.executor = executor
+        config_home = Path(os.environ.get('XDG_CONFIG_HOME') or Path.home() / ".config")
+        self.user_autostart = config_home / "autostart"
+        self.systemd_user = config_home / "systemd" / "user"
+
+    def scan(self):
+        if platform.system() == "Windows":
+            entries = self._scan_registry()
+        else:
+            entries = self._scan_xdg() + self._scan_systemd()
+        # Размер исполняемого файла — отдельный stat на запись, тоже в пуле
+        for entry, (binary, size) in zip(entries, self.executor.map(self._resolve_binary, entries)):
+            entry['binary'] = binary
+            entry['size'] = size
+        return entries
+
+    @staticmethod
+    def _resolve_binary(entry):
+        try:
+            argv = shlex.split(entry['command'], posix=platform.system() != "Windows")
+        except ValueError:
+            argv = entry['command'].split()
+        # env VAR=1 program ... / sh -c "..." — пропускаем обёртки
+        while argv and (argv[0] in ("env", "/usr/bin/env") or '=' in argv[0]):
+            argv.pop(0)
+        if not argv:
+            return None, None
+        binary = shutil.which(argv[0].strip('"')) or argv[0].strip('"')
+        try:
+            return binary, os.stat(binary).st_size
+        except OSError:
+            return binary, None
+
+    # ---------- XDG ----------
+
+    @staticmethod
+    def _parse_desktop(path):
+        """Секция [Desktop Entry] .desktop файла в словарь"""
+        values = {}
+        in_entry = False
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('['):
+                        in_entry = line == '[Desktop Entry]'
+                    elif in_entry and '=' in line and not line.startswith('#'):
+                        key, value = line.split('=', 1)
+                        values.setdefault(key.strip(), value.strip())
+        except OSError:
+            return None
+        return values
+
+    def _scan_xdg(self):
+        # Пользовательский файл с тем же именем перекрывает системный
+        files = {}
+        for directory in self.XDG_DIRS + [self.user_autostart]:
+            try:
+                for path in directory.glob("*.desktop"):
+                    files[path.name] = path
+            except OSError:
+                continue
+        paths = list(files.values())
+        entries = []
+        for path, values in zip(paths, self.executor.map(self._parse_desktop, paths)):
+            if not values or 'Exec' not in values:
+                continue
+            only_show_in = values.get('OnlyShowIn')
+            desktop = os.environ.get('XDG_CURRENT_DESKTOP', '')
+            if only_show_in and desktop and not set(desktop.split(':')) & set(only_show_in.strip(';').split(';')):
+                continue
+            enabled = self._xdg_enabled(values)
+            entries.append({
+                'source': 'xdg',
+                'name': values.get('Name', path.stem),
+                'id': path.name,
+                'command': re.sub(r'\s*%[fFuUdDnNickvm]', '', values['Exec']),
+                'location': str(path),
+                'enabled': enabled,
+                'start_cost': None,
+            })
+        return entries
+
+    @staticmethod
+    def _xdg_enabled(values):
+        return (values.get('Hidden', 'false').lower() != 'true'
+                and values.get('X-GNOME-Autostart-enabled', 'true').lower() != 'false')
+
+    def set_xdg_enabled(self, entry, enabled):
+        """Hidden=true в пользовательской копии — так XDG отключает и системные записи.
+
+        При включении убирается и X-GNOME-Autostart-enabled=false, которым
+        отключают запись настройки сеанса GNOME.
+        """
+        source = Path(entry['location'])
+        target = self.user_autostart / entry['id']
+        keys = ('Hidden',) if not enabled else ('Hidden', 'X-GNOME-Autostart-enabled')
+        lines = []
+        try:
+            with open(source, 'r', encoding='utf-8', errors='replace') as f:
+                lines = [line for line in f.read().splitlines()
+                         if line.split('=', 1)[0].strip() not in keys]
+        except OSError:
+            pass
+        if '[Desktop Entry]' not in lines:
+            lines.insert(0, '[Desktop Entry]')
+        lines.insert(lines.index('[Desktop Entry]') + 1, f"Hidden={'false' if enabled else 'true'}")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(target.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, target)
+        entry['location'] = str(target)
+        values = self._parse_desktop(target)
+        if values is None or self._xdg_enabled(values) != enabled:
+            raise OSError(f"состояние записи в {target} не изменилось")
+
+    # ---------- systemd --user ----------
+
+    @staticmethod
+    def _parse_unit(path):
+        values = {}
+        section = None
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('['):
+                        section = line
+                    elif section in ('[Unit]', '[Service]') and '=' in line and not line.startswith(('#', ';')):
+                        key, value = line.split('=', 1)
+                        values.setdefault(key.strip(), value.strip())
+        except OSError:
+            return None
+        return values
+
+    def _scan_systemd(self):
+        # Включённые юниты — симлинки в *.target.wants
+        enabled = set()
+        units = {}
+        try:
+            for wants in self.systemd_user.glob("*.target.wants"):
+                for link in wants.iterdir():
+                    enabled.add(link.name)
+                    units.setdefault(link.name, link)
+            for path in self.systemd_user.glob("*.service"):
+                units[path.name] = path
+        except OSError:
+            pass
+        names = [name for name in units if name.endswith('.service')]
+        paths = [units[name] for name in names]
+        costs = self._systemd_start_costs(names)
+        entries = []
+        for name, path, values in zip(names, paths, self.executor.map(self._parse_unit, paths)):
+            if not values:
+                continue
+            entries.append({
+                'source': 'systemd',
+                'name': values.get('Description', name),
+                'id': name,
+                'command': values.get('ExecStart', '').lstrip('-@+!:'),
+                'location': str(path),
+                'enabled': name in enabled,
+                'start_cost': costs.get(name),
+            })
+        return entries
+
+    @staticmethod
+    def _systemd_start_costs(names):
+        """Время запуска юнитов из systemctl --user show (одним вызовом)"""
+        if not names or shutil.which("systemctl") is None:
+            return {}
+        try:
+            output = subprocess.run(
+                ["systemctl", "--user", "show", "-p", "Id,InactiveExitTimestampMonotonic,ActiveEnterTimestampMonotonic",
+                 *names], capture_output=True, text=True, timeout=5).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            return {}
+        costs = {}
+        for block in output.strip().split('\n\n'):
+            props = dict(line.split('=', 1) for line in block.splitlines() if '=' in line)
+            try:
+                started = int(props.get('InactiveExitTimestampMonotonic', 0))
+                active = int(props.get('ActiveEnterTimestampMonotonic', 0))
+            except ValueError:
+                continue
+            if started and active >= started:
+                costs[props.get('Id')] = (active - started) / 1e6
+        return costs
+
+    @staticmethod
+    def set_systemd_enabled(entry, enabled):
+        result = subprocess.run(["systemctl", "--user", "enable" if enabled else "disable", entry['id']],
+                                capture_output=True, text=True, timeout=15)
+        if result.returncode != 0:
+            raise OSError(result.stderr.strip() or f"systemctl: код {result.returncode}")
+
+    # ---------- реестр Windows ----------
+
+    def _scan_registry(self):
+        import winreg
+        hives = [(winreg.HKEY_CURRENT_USER, "HKCU"), (winreg.HKEY_LOCAL_MACHINE, "HKLM")]
+        return [entry for entries in self.executor.map(lambda hive: self._read_run_key(*hive), hives)
+                for entry in entries]
+
+    def _read_run_key(self, hive, hive_name):
+        import winreg
+        approved = {}
+        try:
+            with winreg.OpenKey(hive, self.APPROVED_KEY) as key:
+                for index in range(winreg.QueryInfoKey(key)[1]):
+                    name, data, _ = winreg.EnumValue(key, index)
+                    # Первый байт StartupApproved: чётный — включено, нечётный — отключено
+                    approved[name] = not (isinstance(data, bytes) and data and data[0] & 1)
+        except OSError:
+            pass
+        entries = []
+        try:
+            with winreg.OpenKey(hive, self.RUN_KEY) as key:
+                for index in range(winreg.QueryInfoKey(key)[1]):
+                    name, command, _ = winreg.EnumValue(key, index)
+                    entries.append({
+                        'source': 'registry',
+                        'name': name,
+                        'id': name,
+                        'hive': hive,
+                        'command': os.path.expandvars(str(command)),
+                        'location': f"{hive_name}\\{self.RUN_KEY}",
+                        'enabled': approved.get(name, True),
+                        'start_cost': None,
+                    })
+        except OSError:
+            pass
+        return entries
+
+    def set_registry_enabled(self, entry, enabled):
+        import winreg
+        # Так же отключает запись Диспетчер задач: значение остаётся в Run
+        data = bytes([2 if enabled else 3]) + bytes(11)
+        with winreg.CreateKeyEx(entry['hive'], self.APPROVED_KEY, 0, winreg.KEY_SET_VALUE) as key:
+            winreg.SetValueEx(key, entry['id'], 0, winreg.REG_BINARY, data)
+
+    def set_enabled(self, entry, enabled):
+        if entry['source'] == 'xdg':
+            self.set_xdg_enabled(entry, enabled)
+        elif entry['source'] == 'systemd':
+            self.set_systemd_enabled(entry, enabled)
+        else:
+            self.set_registry_enabled(entry, enabled)
+        entry['enabled'] = enabled
+
+
+# ==============================================
+# АВТОДОПОЛНЕНИЕ ПУТЕЙ (Tab)
+# ==============================================
+
+class DirectoryListingCache:
+    """Кэш содержимого каталогов для автодополнения.
+
+    Листинг хранится отсортированным по ключу сравнения, поэтому поиск по
+    префиксу — два bisect, а не проход по 100k имён. Запись действительна,
+    пока не изменилось mtime каталога (создание/удаление/переименование
+    внутри него меняет mtime).
+    """
+
+    def __init__(self, max_dirs=32):
+        self.max_dirs = max_dirs
+        self.case_insensitive = platform.system() == "Windows"
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _key(self, name):
+        return name.lower() if self.case_insensitive else name
+
+    def cached(self, directory):
+        """Листинг из кэша, если каталог не менялся (один stat), иначе None"""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._cache.get(directory)
+            if entry is None or entry[0] != mtime:
+                return None
+            # Порядок вставки словаря — порядок использования (LRU)
+            self._cache[directory] = self._cache.pop(directory)
+            return entry[1]
+
+    def listing(self, directory):
+        cached = self.cached(directory)
+        if cached is not None:
+            return cached
+        mtime = os.stat(directory).st_mtime_ns
+        entries = []
+        with os.scandir(directory) as iterator:
+            for entry in iterator:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                entries.append((self._key(entry.name), entry.name, is_dir))
+        entries.sort()
+        listing = ([key for key, _, _ in entries], [(name, is_dir) for _, name, is_dir in entries])
+        with self._lock:
+            self._cache[directory] = (mtime, listing)
+            while len(self._cache) > self.max_dirs:
+                self._cache.pop(next(iter(self._cache)))
+        return listing
+
+    def refresh(self, directories):
+        """Перечитывание изменившихся каталогов, уже бывших в кэше"""
+        with self._lock:
+            stale = [directory for directory in directories if directory in self._cache]
+        for directory in stale:
+            try:
+                self.listing(directory)
+            except OSError:
+                with self._lock:
+                    self._cache.pop(directory, None)
+
+    def matches(self, listing, prefix):
+        keys, entries = listing
+        key = self._key(prefix)
+        start = bisect_left(keys, key)
+        end = bisect_left(keys, key + '\U0010ffff', start)
+        return [entry for entry in entries[start:end]
+                if prefix.startswith('.') or not entry[0].startswith('.')]
+
+
+# ==============================================
+# СЦЕНАРИИ КОМАНД (.ocs)
+# ==============================================
+
+class ScriptError(Exception):
+    pass
+
+
+def parse_script(text):
+    """Разбор сценария в шаги.
+
+    Синтаксис: по команде на строку, '#' — комментарий;
+    set имя значение — переменная (${имя}, аргументы — ${1}, ${2}...);
+    on_error stop|continue — реакция на ошибку команды;
+    parallel { ... } — команды блока выполняются одновременно.
+    Шаги: ('set', строка, имя, значение), ('on_error', режим), ('cmd', строка, текст),
+    ('parallel', строка, [(строка, текст), ...]).
+    """
+    steps = []
+    block = None
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith('#'):
+            continue
+        if block is not None:
+            if line == '}':
+                steps.append(('parallel', block[0], block[1]))
+                block = None
+            elif line.startswith('parallel'):
+                raise ScriptError(f"строка {number}: вложенные parallel не поддерживаются")
+            else:
+                block[1].append((number, line))
+            continue
+        words = line.split(None, 2)
+        keyword = words[0].lower()
+        if keyword == 'parallel' and line.rstrip().endswith('{'):
+            block = (number, [])
+        elif keyword == 'set':
+            if len(words) < 2:
+                raise ScriptError(f"строка {number}: set <имя> <значение>")
+            value = words[2] if len(words) > 2 else ""
+            steps.append(('set', number, words[1], value[1:].strip() if value.startswith('=') else value))
+        elif keyword == 'on_error':
+            if len(words) != 2 or words[1].lower() not in ('stop', 'continue'):
+                raise ScriptError(f"строка {number}: on_error stop|continue")
+            steps.append(('on_error', words[1].lower()))
+        else:
+            steps.append(('cmd', number, line))
+    if block is not None:
+        raise ScriptError(f"строка {block[0]}: блок parallel не закрыт")
+    return steps
+
+
+class ScriptRunner:
+    """Выполнение шагов сценария.
+
+    execute(команда) -> bool выполняет одну команду и вызывается из потока
+    раннера или, для блоков parallel, из потоков executor. Итоги — в results:
+    (строка, команда, секунды, успех).
+    """
+
+    VARIABLE = re.compile(r'\$\{(\w+)\}')
+
+    def __init__(self, execute, executor, args=(), on_step=None):
+        self.execute = execute
+        self.executor = executor
+        self.variables = {str(index): value for index, value in enumerate(args, 1)}
+        self.on_step = on_step or (lambda number, command, parallel: None)
+        self.stop_on_error = True
+        self.results = []
+
+    def expand(self, number, text):
+        def replace(match):
+            name = match.group(1)
+            if name in self.variables:
+                return self.variables[name]
+            if name in os.environ:
+                return os.environ[name]
+            raise ScriptError(f"строка {number}: переменная ${{{name}}} не задана")
+        return self.VARIABLE.sub(replace, text)
+
+    def _timed(self, number, command):
+        started = time.perf_counter()
+        try:
+            ok = bool(self.execute(command))
+        except Exception as e:
+            logger.warning(f"Сценарий, строка {number}: {e}")
+            ok = False
+        return number, command, time.perf_counter() - started, ok
+
+    def run(self, steps):
+        """-> True, если сценарий дошёл до конца без остановки по ошибке"""
+        for step in steps:
+            kind = step[0]
+            if kind == 'set':
+                self.variables[step[2]] = self.expand(step[1], step[3])
+            elif kind == 'on_error':
+                self.stop_on_error = step[1] == 'stop'
+            elif kind == 'cmd':
+                command = self.expand(step[1], step[2])
+                self.on_step(step[1], command, False)
+                result = self._timed(step[1], command)
+                self.results.append(result)
+                if not result[3] and self.stop_on_error:
+                    return False
+            else:
+                commands = [(number, self.expand(number, text)) for number, text in step[2]]
+                for number, command in commands:
+                    self.on_step(number, command, True)
+                block = list(self.executor.map(lambda item: self._timed(*item), commands))
+                self.results.extend(block)
+                if self.stop_on_error and not all(result[3] for result in block):
+                    return False
+        return True
+
+
+# ==============================================
+# ПАЛИТРА КОМАНД (Ctrl+P)
+# ==============================================
+
+# (команда, описание, нужны ли аргументы)
+PALETTE_COMMANDS = [
+    ("help", "справка", False),
+    ("mkdir", "создать папку", True),
+    ("nb", "создать блокнот", True),
+    ("ip", "IP адреса", False),
+    ("ping", "пинг хоста", True),
+    ("dig", "DNS-запрос", True),
+    ("traceroute", "трассировка маршрута", True),
+    ("speedtest", "тест скорости", False),
+    ("metrics", "эндпоинт Prometheus", False),
+    ("alerts", "оповещения по порогам", False),
+    ("monitor", "мониторинг системы", False),
+    ("mem", "память процессов", False),
+    ("pstree", "дерево процессов", False),
+    ("kill", "завершить процессы", True),
+    ("killtree", "завершить дерево процессов", True),
+    ("autostart", "автозагрузка", False),
+    ("view", "просмотр большого файла", True),
+    ("search", "поиск текста по файлам", True),
+    ("locate", "поиск файла по индексу", True),
+    ("index", "индекс файлов", False),
+    ("zip", "архивировать папку", True),
+    ("unzip", "распаковать архив", True),
+    ("backup", "резервная копия папки", False),
+    ("save", "сохранить вывод в файл", True),
+    ("record", "запись сессии", False),
+    ("replay", "воспроизвести запись сессии", True),
+    ("bios", "BIOS/UEFI", False),
+    ("optimize", "оптимизация", False),
+    ("clear", "очистить консоль", False),
+    ("exit", "выход", False),
+]
+
+
+class FuzzyMatcher:
+    """Нечёткий поиск подпоследовательности с инкрементальным сужением.
+
+    Кандидаты идут в порядке приоритета. Каждое нажатие проверяет только
+    тех, кто подошёл под предыдущий запрос (если новый запрос его
+    продолжает), порциями через C-уровневые map/compress и в пределах
+    бюджета времени; непроверенный остаток досчитывается следующим вызовом
+    resume(). Точный рейтинг считается, только когда совпадений немного —
+    иначе достаточно первых по приоритету.
+    """
+
+    CHUNK = 2048
+    SCORE_LIMIT = 1000
+
+    def __init__(self, candidates, limit=50):
+        self.candidates = candidates
+        self.texts = [text.lower() for text, _ in candidates]
+        self.limit = limit
+        self.query = None
+        self.matched = []
+        self.pending = []
+        self._offset = 0
+
+    @staticmethod
+    def _pattern(query):
+        # a[^b]*b[^c]*c — подпоследовательность без возвратов регулярного выражения
+        parts = [re.escape(query[0])]
+        for char in query[1:]:
+            parts.append(f"[^{re.escape(char)}]*{re.escape(char)}")
+        return re.compile(''.join(parts))
+
+    def search(self, query, budget=0.003):
+        query = query.lower().strip()
+        if query and self.query and query.startswith(self.query):
+            # Сужение: всё, что не подошло под более короткий запрос, не подойдёт и сейчас
+            self.pending = self.matched + list(self.pending[self._offset:])
+        else:
+            # range вместо списка: сброс на 100k кандидатов ничего не копирует
+            self.pending = range(len(self.candidates))
+        self._offset = 0
+        self.query = query
+        self.matched = []
+        if not query:
+            self.matched, self.pending = list(self.pending), []
+        return self.resume(budget)
+
+    def resume(self, budget=0.003):
+        """Продолжение проверки; -> (результаты, закончен ли поиск)"""
+        if self._offset < len(self.pending):
+            search = self._pattern(self.query).search
+            texts = self.texts
+            pending = self.pending
+            deadline = time.perf_counter() + budget
+            position = self._offset
+            while position < len(pending) and time.perf_counter() < deadline:
+                chunk = pending[position:position + self.CHUNK]
+                self.matched += compress(chunk, map(search, [texts[index] for index in chunk]))
+                position += self.CHUNK
+            # Порядок matched сохраняет приоритет: непроверенные всегда идут после проверенных
+            self._offset = position
+        return self.results(), self._offset >= len(self.pending)
+
+    def results(self):
+        if not self.query or len(self.matched) > self.SCORE_LIMIT:
+            return [self.candidates[index] for index in self.matched[:self.limit]]
+        search = self._pattern(self.query).search
+        query = self.query
+        scored = []
+        for rank, index in enumerate(self.matched):
+            text = self.texts[index]
+            match = search(text)
+            start = match.start()
+            score = (match.end() - start) * 2 + start + len(text) * 0.1 + rank * 0.01
+            if text.startswith(query):
+                score -= 100
+            elif start and text[start - 1] in " /\\_-.":
+                score -= 10
+            scored.append((score, index))
+        scored.sort()
+        return [self.candidates[index] for _, index in scored[:self.limit]]
+
+
+class CommandPalette(QDialog):
+    """Окно Ctrl+P: строка запроса и список найденного"""
+
+    def __init__(self, parent, candidates, on_activate):
+        super().__init__(parent, Qt.Popup | Qt.FramelessWindowHint)
+        self.matcher = FuzzyMatcher(candidates)
+        self.on_activate = on_activate
+        self.resize(min(700, parent.width() - 40), 420)
+        self.setStyleSheet("""
+            QDialog { background-color: #1a1b26; border: 2px solid #805ad5; border-radius: 10px; }
+            QLineEdit {
+                background-color: #1a202c; color: #e2e8f0; border: 2px solid #5a67d8;
+                border-radius: 6px; padding: 8px; font-family: 'Consolas', 'Monospace'; font-size: 14px;
+            }
+            QListWidget {
+                background-color: #1a202c; color: #e2e8f0; border: none;
+                font-family: 'Consolas', 'Monospace'; font-size: 13px;
+            }
+            QListWidget::item:selected { background-color: #5a67d8; }
+        """)
+        layout = QVBoxLayout(self)
+        self.input = QLineEdit()
+        self.input.setPlaceholderText("Команда, история, действие или путь...")
+        self.list = QListWidget()
+        layout.addWidget(self.input)
+        layout.addWidget(self.list)
+
+        # Досчёт непроверенных кандидатов между нажатиями
+        self.resume_timer = QTimer(self)
+        self.resume_timer.setSingleShot(True)
+        self.resume_timer.timeout.connect(lambda: self.show_results(*self.matcher.resume()))
+
+        self.input.textChanged.connect(lambda text: self.show_results(*self.matcher.search(text)))
+        self.input.installEventFilter(self)
+        self.list.itemActivated.connect(self.activate)
+        self.show_results(*self.matcher.search(""))
+
+    def show_results(self, results, finished):
+        self.list.clear()
+        for text, payload in results:
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, payload)
+            self.list.addItem(item)
+        self.list.setCurrentRow(0)
+        if not finished:
+            self.resume_timer.start(0)
+
+    def eventFilter(self, obj, event):
+        if obj is self.input and event.type() == QEvent.KeyPress:
+            if event.key() in (Qt.Key_Down, Qt.Key_Up):
+                row = self.list.currentRow() + (1 if event.key() == Qt.Key_Down else -1)
+                self.list.setCurrentRow(max(0, min(self.list.count() - 1, row)))
+                return True
+            if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+                self.activate(self.list.currentItem())
+                return True
+        return super().eventFilter(obj, event)
+
+    def activate(self, item):
+        if item is None:
+            return
+        self.accept()
+        self.on_activate(item.data(Qt.UserRole))
+
+
+# ==============================================
+# ИНДЕКС ВЫВОДА И ПОИСК (Ctrl+F)
+# ==============================================
+
+class OutputLineIndex:
+    """Построчный теневой буфер текста консоли.
+
+    Строка N буфера соответствует блоку N документа QTextEdit, поэтому
+    найденное совпадение сразу переводится в позицию курсора без обхода
+    документа.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pending = []
+        self._length = 0
+        self._lower = None
+        self.line_starts = array('q', [0])
+
+    def append(self, text):
+        """Добавление текста (переводы строк уже нормализованы в '\n')"""
+        base = self._length
+        pos = text.find('\n')
+        while pos != -1:
+            self.line_starts.append(base + pos + 1)
+            pos = text.find('\n', pos + 1)
+        self._pending.append(text)
+        self._length += len(text)
+
+    def clear(self):
+        self._text = ""
+        self._pending = []
+        self._length = 0
+        self._lower = None
+        self.line_starts = array('q', [0])
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def text(self):
+        """Весь буфер одной строкой (склеивается лениво, только для полного поиска)"""
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending = []
+        return self._text
+
+    @property
+    def lower_text(self):
+        """Копия буфера в нижнем регистре для быстрого поиска без учёта регистра.
+
+        re.IGNORECASE на порядок медленнее обычного поиска, поэтому копия
+        строится при первом таком поиске и дальше дописывается только хвостом.
+        Возвращает None, если lower() изменил длину (редкие символы Unicode)
+        и смещения перестали бы совпадать.
+        """
+        if self._lower is False:
+            return None
+        text = self.text
+        if self._lower is None:
+            self._lower = text.lower()
+        elif len(self._lower) < len(text):
+            self._lower += text[len(self._lower):].lower()
+        if len(self._lower) != len(text):
+            self._lower = False
+            return None
+        return self._lower
+
+    def slice(self, start, end=None):
+        """Фрагмент буфера без склейки всего текста.
+
+        Новый вывод копится в хвосте, поэтому дописывание и подсветка
+        последних строк не копируют мегабайты уже накопленного текста.
+        """
+        if end is None:
+            end = self._length
+        base = len(self._text)
+        if end <= base:
+            return self._text[start:end]
+        if len(self._pending) > 1:
+            self._pending = ["".join(self._pending)]
+        tail = self._pending[0]
+        if start >= base:
+            return tail[start - base:end - base]
+        return self._text[start:] + tail[:end - base]
+
+    def line_count(self):
+        return len(self.line_starts)
+
+    def line_of(self, offset):
+        """Номер строки по смещению в буфере"""
+        return bisect_right(self.line_starts, offset) - 1
+
+    def qt_position(self, document, offset):
+        """Перевод смещения буфера в позицию QTextDocument.
+
+        Qt считает позиции в UTF-16, а эмодзи занимают две единицы,
+        поэтому колонка пересчитывается по тексту строки.
+        """
+        line = self.line_of(offset)
+        column = offset - self.line_starts[line]
+        prefix = self.slice(self.line_starts[line], offset)
+        if not prefix.isascii():
+            column = len(prefix.encode('utf-16-le')) // 2
+        return document.findBlockByNumber(line).position() + column
+
+
+def _lower_pattern(pattern):
+    """Нижний регистр для regex, не трогая escape-последовательности (\\D, \\W...)"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern[i] == '\\' and i + 1 < len(pattern):
+            parts.append(pattern[i:i + 2])
+            i += 2
+        else:
+            parts.append(pattern[i].lower())
+            i += 1
+    return "".join(parts)
+
+
+class OutputSearch:
+    """Поиск по OutputLineIndex: все совпадения хранятся массивами смещений"""
+
+    def __init__(self, index):
+        self.index = index
+        self.pattern = None
+        self.starts = array('q')
+        self.ends = array('q')
+        self.current = -1
+        self._scanned = 0
+        self._folded = False
+
+    def run(self, query, regex=False, case_sensitive=False):
+        """Новый поиск. Возвращает число совпадений (re.error пробрасывается)"""
+        self.reset()
+        if not query:
+            return 0
+        pattern = query if regex else re.escape(query)
+        self._folded = not case_sensitive and self.index.lower_text is not None
+        if self._folded:
+            self.pattern = re.compile(_lower_pattern(pattern), re.MULTILINE)
+        elif case_sensitive:
+            self.pattern = re.compile(pattern, re.MULTILINE)
+        else:
+            self.pattern = re.compile(pattern, re.MULTILINE | re.IGNORECASE)
+        self._scan_from(0)
+        self.current = 0 if self.starts else -1
+        return len(self.starts)
+
+    def extend(self):
+        """Досканировать только добавленный хвост буфера"""
+        if self.pattern is None or self._scanned >= len(self.index):
+            return 0
+        # Повторно просматриваем последнюю строку: совпадение могло её продолжить
+        start = self.index.line_starts[self.index.line_of(self._scanned)]
+        while self.starts and self.starts[-1] >= start:
+            self.starts.pop()
+            self.ends.pop()
+        before = len(self.starts)
+        self._scan_from(start)
+        if self.starts and not 0 <= self.current < len(self.starts):
+            self.current = 0 if self.current == -1 else len(self.starts) - 1
+        return len(self.starts) - before
+
+    def _scan_from(self, start):
+        if start == 0:
+            text = self.index.lower_text if self._folded else self.index.text
+        else:
+            text = self.index.slice(start)
+            if self._folded:
+                folded = text.lower()
+                text = folded if len(folded) == len(text) else None
+        if text is None:
+            # lower() сломал смещения — продолжаем медленным путём
+            self._folded = False
+            self.pattern = re.compile(self.pattern.pattern, re.MULTILINE | re.IGNORECASE)
+            text = self.index.slice(start)
+
+        starts, ends = self.starts, self.ends
+        for match in self.pattern.finditer(text):
+            if match.end() > match.start():
+                starts.append(start + match.start())
+                ends.append(start + match.end())
+        self._scanned = len(self.index)
+
+    def reset(self):
+        self.pattern = None
+        self._folded = False
+        self.starts = array('q')
+        self.ends = array('q')
+        self.current = -1
+        self._scanned = 0
+
+    def step(self, forward=True):
+        if not self.starts:
+            return -1
+        self.current = (self.current + (1 if forward else -1)) % len(self.starts)
+        return self.current
+
+    def in_range(self, start_offset, end_offset):
+        """Индексы совпадений, начинающихся в [start_offset, end_offset)"""
+        return range(bisect_left(self.starts, start_offset), bisect_left(self.starts, end_offset))
+
+
+# ==============================================
+# БОЛЬШОЙ ВЫВОД: ФАЙЛ И ВИРТУАЛЬНЫЙ ПРОСМОТР
+# ==============================================
+
+class OutputSpool:
+    """Буфер вывода процесса: в памяти до threshold байт, дальше — во временный файл"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.size = 0
+        self.path = None
+        self._buffer = []
+        self._file = None
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def write(self, data):
+        self.size += len(data)
+        if self._file is not None:
+            self._file.write(data)
+            return
+        self._buffer.append(data)
+        if self.size > self.threshold:
+            handle, path = tempfile.mkstemp(prefix="console_output_", suffix=".log")
+            self.path = Path(path)
+            self._file = os.fdopen(handle, 'wb')
+            self._file.writelines(self._buffer)
+            self._buffer = []
+
+    def getvalue(self):
+        return b"".join(self._buffer)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class LineOffsetIndex:
+    """Индекс строк большого файла через mmap.
+
+    Хранится не смещение каждой строки, а число строк до начала каждого
+    блока CHUNK байт (считается bytes.count на C-скорости, ~1 с на ГБ).
+    Строка N находится bisect'ом по блокам и парой find внутри блока,
+    поэтому переход в любое место файла мгновенный, а индекс на 1 ГБ
+    занимает ~128 КБ.
+    """
+
+    CHUNK = 64 * 1024
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.chunk_lines = array('Q', [0])  # строк до начала блока i
+        self.indexed = 0  # сколько байт уже проиндексировано
+        self._total = 0
+        self.done = self.size == 0
+
+    def build(self, stop_event=None):
+        """Построение индекса (в фоновом потоке)"""
+        mm = self.mm
+        total = self.chunk_lines[-1]
+        position = self.indexed
+        while position < self.size:
+            if stop_event is not None and stop_event.is_set():
+                return
+            end = min(position + self.CHUNK, self.size)
+            total += mm[position:end].count(b"\n")
+            position = end
+            if end < self.size:
+                self.chunk_lines.append(total)
+            self._total = total
+            self.indexed = position
+        self._total = total
+        self.done = True
+
+    @property
+    def line_count(self):
+        """Строк в проиндексированной части (последняя строка без \\n тоже считается)"""
+        if self.size == 0:
+            return 0
+        total = self._total
+        if self.done and self.mm[self.size - 1:self.size] != b"\n":
+            total += 1
+        return total
+
+    def line_offset(self, number):
+        """Смещение начала строки number (с нуля)"""
+        if number <= 0:
+            return 0
+        chunk = bisect_right(self.chunk_lines, number - 1) - 1
+        position = chunk * self.CHUNK
+        remaining = number - self.chunk_lines[chunk]
+        find = self.mm.find
+        while remaining > 0:
+            position = find(b"\n", position) + 1
+            if position == 0:
+                return self.size
+            remaining -= 1
+        return position
+
+    def lines(self, first, count, max_chars=4096):
+        """Строки [first, first + count) в виде текста"""
+        result = []
+        position = self.line_offset(first)
+        find = self.mm.find
+        for _ in range(count):
+            if position >= self.size:
+                break
+            end = find(b"\n", position)
+            if end < 0:
+                end = self.size
+            raw = self.mm[position:min(end, position + max_chars)]
+            result.append(raw.decode('utf-8', 'replace').rstrip('\r'))
+            position = end + 1
+        return result
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self._file.close()
+
+
+class SpillFileView(QAbstractScrollArea):
+    """Виртуальный просмотр: рисуются только видимые строки индекса"""
+
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+        self.setFont(QFont("Consolas", 10))
+        self.setStyleSheet("QAbstractScrollArea { background-color: #1e1e2e; border: none; }")
+        self.horizontalScrollBar().setSingleStep(8)
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+        self.horizontalScrollBar().valueChanged.connect(self.viewport().update)
+        self.update_ranges()
+
+    def visible_lines(self):
+        return max(1, self.viewport().height() // self.fontMetrics().lineSpacing())
+
+    def update_ranges(self):
+        bar = self.verticalScrollBar()
+        bar.setPageStep(self.visible_lines())
+        bar.setRange(0, max(0, min(self.index.line_count - self.visible_lines(), 2 ** 31 - 1)))
+        self.horizontalScrollBar().setRange(0, 4096 * self.fontMetrics().averageCharWidth())
+        self.horizontalScrollBar().setPageStep(self.viewport().width())
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_ranges()
+
+    def scroll_to_line(self, number):
+        self.verticalScrollBar().setValue(number)
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.setFont(self.font())
+        painter.setPen(QColor(220, 220, 220))
+        metrics = self.fontMetrics()
+        spacing = metrics.lineSpacing()
+        first = self.verticalScrollBar().value()
+        x = 6 - self.horizontalScrollBar().value()
+        number_width = metrics.horizontalAdvance("0" * 10)
+        for row, line in enumerate(self.index.lines(first, self.visible_lines() + 1)):
+            y = row * spacing + metrics.ascent()
+            painter.setPen(QColor(110, 110, 140))
+            painter.drawText(x, y, f"{first + row + 1:>9}")
+            painter.setPen(QColor(220, 220, 220))
+            painter.drawText(x + number_width, y, line.expandtabs(4))
+
+
+class SpillViewerDialog(QDialog):
+    """Окно просмотра большого вывода; индекс строится в фоне"""
+
+    def __init__(self, parent, path, title):
+        super().__init__(parent)
+        self.setWindowTitle(f"📄 {title}")
+        self.resize(1000, 650)
+        self.setStyleSheet("QDialog { background-color: #1a1b26; } QLabel { color: #e2e8f0; }")
+        self.index = LineOffsetIndex(path)
+        self._stop = threading.Event()
+        self._indexer = threading.Thread(target=self.index.build, args=(self._stop,), name="line-index", daemon=True)
+        self._indexer.start()
+
+        layout = QVBoxLayout(self)
+        top = QHBoxLayout()
+        self.status_label = QLabel()
+        top.addWidget(self.status_label, 1)
+        self.goto_input = QLineEdit()
+        self.goto_input.setPlaceholderText("Строка (Enter)")
+        self.goto_input.setFixedWidth(160)
+        self.goto_input.setStyleSheet("QLineEdit { background-color: #1a202c; color: #e2e8f0; padding: 4px; }")
+        self.goto_input.returnPressed.connect(self.goto_line)
+        top.addWidget(self.goto_input)
+        layout.addLayout(top)
+        self.view = SpillFileView(self.index)
+        layout.addWidget(self.view, 1)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh_status)
+        self.timer.start(200)
+        self.refresh_status()
+
+    def refresh_status(self):
+        index = self.index
+        percent = 100 * index.indexed // index.size if index.size else 100
+        state = "" if index.done else f" — индексация {percent}%"
+        self.status_label.setText(f"{index.path}  |  {index.size / 1024 ** 2:.1f} MB, "
+                                  f"строк: {index.line_count:,}{state}".replace(",", " "))
+        self.view.update_ranges()
+        if index.done:
+            self.timer.stop()
+
+    def goto_line(self):
+        try:
+            self.view.scroll_to_line(max(0, int(self.goto_input.text()) - 1))
+        except ValueError:
+            pass
+
+    def done(self, result):
+        self._stop.set()
+        self.timer.stop()
+        self._indexer.join()
+        self.index.close()
+        super().done(result)
+
+
+# ==============================================
+# ЗАПИСЬ И ЭКСПОРТ СЕССИИ
+# ==============================================
+
+def write_transcript(document, stream, as_html=False, flush_blocks=2000):
+    """Потоковая выгрузка документа консоли по блокам.
+
+    Документ обходится по блокам и фрагментам одного формата, текст
+    уходит в stream порциями — весь вывод целиком (toPlainText/toHtml)
+    в памяти не собирается. Возвращает число записанных строк.
+    """
+    if as_html:
+        stream.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Console</title></head>\n'
+                     '<body style="background:#1e1e2e;color:#dcdcdc">'
+                     '<pre style="font-family:Consolas,monospace;font-size:10pt">\n')
+    chunk = []
+    lines = 0
+    block = document.begin()
+    while block.isValid():
+        if as_html:
+            fragments = block.begin()
+            while not fragments.atEnd():
+                fragment = fragments.fragment()
+                if fragment.isValid():
+                    color = fragment.charFormat().foreground().color().name()
+                    chunk.append(f'<span style="color:{color}">{html.escape(fragment.text())}</span>')
+                fragments += 1
+        else:
+            chunk.append(block.text())
+        block = block.next()
+        if block.isValid():
+            chunk.append("\n")
+        lines += 1
+        if lines % flush_blocks == 0:
+            stream.write("".join(chunk))
+            chunk = []
+    stream.write("".join(chunk))
+    if as_html:
+        stream.write("\n</pre></body></html>\n")
+    return lines
+
+
+class SessionRecorder:
+    """Запись событий вывода в сжатый файл для последующего replay.
+
+    Формат: MAGIC, время начала (double), затем события — задержка от
+    предыдущего события в мс (uint32), цвет RGB (3 байта), длина текста
+    (uint32) и сам текст в UTF-8. Поток сжимается gzip; раз в
+    FLUSH_INTERVAL секунд делается Z_SYNC_FLUSH, чтобы после аварийного
+    завершения запись читалась до последнего сброса.
+    """
+
+    MAGIC = b"OCREC1"
+    EVENT = struct.Struct('<I3sI')
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path, tab):
+        self.path = Path(path)
+        self.tab = tab
+        self.events = 0
+        self.started = time.time()
+        self._last = self._flushed = time.monotonic()
+        self._file = gzip.open(self.path, 'wb', compresslevel=6)
+        self._file.write(self.MAGIC + struct.pack('<d', self.started))
+
+    def write(self, text, color):
+        now = time.monotonic()
+        delay = min(int((now - self._last) * 1000), 0xFFFFFFFF)
+        self._last = now
+        data = text.encode('utf-8')
+        self._file.write(self.EVENT.pack(delay, bytes((color.red(), color.green(), color.blue())), len(data)))
+        self._file.write(data)
+        self.events += 1
+        if now - self._flushed >= self.FLUSH_INTERVAL:
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+            self._flushed = now
+
+    def close(self):
+        self._file.close()
+
+    @classmethod
+    def read(cls, path):
+        """Генератор событий записи: (задержка в секундах, QColor, текст).
+
+        Оборванная запись (процесс завершился без close) читается до
+        последнего полного события.
+        """
+        with gzip.open(path, 'rb') as handle:
+            if handle.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError("файл не является записью сессии")
+            handle.read(8)
+            while True:
+                try:
+                    header = handle.read(cls.EVENT.size)
+                    if len(header) < cls.EVENT.size:
+                        return
+                    delay, rgb, length = cls.EVENT.unpack(header)
+                    data = handle.read(length)
+                except (EOFError, zlib.error):
+                    return
+                if len(data) < length:
+                    return
+                yield delay / 1000.0, QColor(rgb[0], rgb[1], rgb[2]), data.decode('utf-8', 'replace')
+
+
+# ==============================================
+# ПОИСК ПО ФАЙЛАМ (search)
+# ==============================================
+
+class TextSearch:
+    """Параллельный поиск регулярного выражения по дереву папок.
+
+    Папки обходятся задачами пула (os.scandir отпускает GIL), файлы
+    каждой папки ищутся пачками. Двоичные файлы отсеиваются по нулевому
+    байту в первых SNIFF байтах, большие файлы просматриваются через mmap
+    без чтения в память. Поиск идёт по байтам, поэтому кодировки файлов
+    не декодируются — декодируются только найденные строки.
+    """
+
+    SKIP_DIRS = {'.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', '.mypy_cache', '.tox'}
+    SNIFF = 8192
+    MMAP_THRESHOLD = 1024 * 1024
+    FILE_BATCH = 64
+    MAX_LINE = 300
+
+    def __init__(self, pattern, root, on_file, max_matches=1000, workers=None, stop_event=None):
+        self.regex = pattern
+        self.root = Path(root)
+        self.on_file = on_file  # on_file(path, [(номер строки, текст)])
+        self.max_matches = max_matches
+        self.workers = workers or min(32, (os.cpu_count() or 4) * 2)
+        self.stop_event = stop_event or threading.Event()
+        self.files = 0
+        self.bytes = 0
+        self.binary = 0
+        self.errors = 0
+        self.matches = 0
+        self.matched_files = 0
+        self.truncated = False
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._done = threading.Condition(self._lock)
+        self._pool = None
+
+    def run(self):
+        """Поиск до конца обхода, остановки или лимита совпадений"""
+        if self.root.is_file():
+            self._search_files([self.root])
+            return self
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="search") as pool:
+            self._pool = pool
+            self._submit(self._scan_dir, self.root)
+            with self._done:
+                while self._pending:
+                    self._done.wait()
+        return self
+
+    def _submit(self, fn, argument):
+        with self._lock:
+            self._pending += 1
+        self._pool.submit(self._task, fn, argument)
+
+    def _task(self, fn, argument):
+        try:
+            if not self.stop_event.is_set():
+                fn(argument)
+        except OSError:
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._done:
+                self._pending -= 1
+                if not self._pending:
+                    self._done.notify_all()
+
+    def _scan_dir(self, directory):
+        files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in self.SKIP_DIRS:
+                            self._submit(self._scan_dir, entry.path)
+                    elif entry.is_file():
+                        files.append(entry.path)
+                        if len(files) == self.FILE_BATCH:
+                            self._submit(self._search_files, files)
+                            files = []
+                except OSError:
+                    continue
+        if files:
+            self._search_files(files)
+
+    def _search_files(self, paths):
+        for path in paths:
+            if self.stop_event.is_set():
+                return
+            try:
+                found, size, binary = self._search_file(path)
+            except (OSError, ValueError):
+                with self._lock:
+                    self.errors += 1
+                continue
+            with self._lock:
+                self.files += 1
+                self.bytes += size
+                self.binary += binary
+                if found:
+                    room = self.max_matches - self.matches
+                    if room <= 0:
+                        continue
+                    if len(found) >= room:
+                        found = found[:room]
+                        self.truncated = True
+                        self.stop_event.set()
+                    self.matches += len(found)
+                    self.matched_files += 1
+                    # Под блокировкой: вывод одного файла не перемешивается с другими
+                    self.on_file(str(path), found)
+
+    def _search_file(self, path):
+        with open(path, 'rb') as handle:
+            size = os.fstat(handle.fileno()).st_size
+            head = handle.read(self.SNIFF)
+            if b"\0" in head:
+                return None, 0, 1
+            if size <= self.MMAP_THRESHOLD:
+                data = head + handle.read()
+                return self._match_lines(data), size, 0
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self._match_lines(data), size, 0
+
+    def _match_lines(self, data):
+        search = self.regex.search
+        size = len(data)
+        found = []
+        line_number = 1
+        counted = 0
+        position = 0
+        limit = self.max_matches
+        while position <= size and len(found) < limit:
+            match = search(data, position)
+            if match is None:
+                break
+            start = data.rfind(b"\n", 0, match.start()) + 1
+            end = data.find(b"\n", match.start())
+            if end < 0:
+                end = size
+            # Как в grep, совпадение не выходит за строку: \s+ и т.п. не должны
+            # захватывать перевод строки — перепроверяем в пределах строки
+            if match.end() > end and search(data, start, end) is None:
+                position = end + 1
+                continue
+            line_number += data.count(b"\n", counted, start)
+            counted = start
+            line = data[start:min(end, start + self.MAX_LINE)]
+            found.append((line_number, line.decode('utf-8', 'replace').rstrip('\r')))
+            # Остальные совпадения этой строки не нужны — ищем со следующей
+            position = end + 1
+        return found or None
+
+
+# ==============================================
+# ИНДЕКС ФАЙЛОВ (locate)
+# ==============================================
+
+class FileIndex:
+    """Индекс файлов выбранных корней в SQLite.
+
+    Хранятся папки (путь, mtime) и файлы (имя, расширение, размер, mtime).
+    Обновление инкрементальное: если mtime папки не изменился, её список
+    файлов и подпапок тот же — подпапки берутся из базы, и нетронутое
+    дерево обходится одним stat на папку без чтения каталогов. Изменение
+    содержимого файла mtime папки не меняет, поэтому размер и дата таких
+    файлов обновятся при следующем изменении папки.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY, updated REAL);
+        CREATE TABLE IF NOT EXISTS dirs (id INTEGER PRIMARY KEY, parent INTEGER,
+                                         path TEXT UNIQUE NOT NULL, mtime_ns INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS files (dir INTEGER NOT NULL, name TEXT NOT NULL, lname TEXT NOT NULL,
+                                          ext TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+        CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+        CREATE INDEX IF NOT EXISTS files_size ON files(size);
+        CREATE INDEX IF NOT EXISTS files_mtime ON files(mtime);
+        CREATE INDEX IF NOT EXISTS files_ext ON files(ext);
+    """
+    COMMIT_EVERY = 500
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._lock = threading.RLock()
+        self._update_lock = threading.Lock()
+
+    @property
+    def updating(self):
+        return self._update_lock.locked()
+
+    def roots(self):
+        with self._lock:
+            return self._db.execute("SELECT path, updated FROM roots ORDER BY path").fetchall()
+
+    def add_root(self, path):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO roots (path, updated) VALUES (?, NULL)", (str(path),))
+
+    def remove_root(self, path):
+        with self._lock, self._db:
+            removed = self._db.execute("DELETE FROM roots WHERE path = ?", (str(path),)).rowcount
+            self._delete_tree(str(path))
+        return bool(removed)
+
+    def _delete_tree(self, path):
+        prefix = path.rstrip(os.sep) + os.sep
+        where = "path = ? OR (path >= ? AND path < ?)"
+        args = (path, prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+        self._db.execute(f"DELETE FROM files WHERE dir IN (SELECT id FROM dirs WHERE {where})", args)
+        self._db.execute(f"DELETE FROM dirs WHERE {where}", args)
+
+    def update(self, stop_event=None):
+        """Инкрементальное обновление всех корней; возвращает статистику
+        (или None, если обновление уже идёт)"""
+        if not self._update_lock.acquire(blocking=False):
+            return None
+        stats = {'dirs': 0, 'scanned': 0, 'files': 0, 'removed': 0}
+        try:
+            for root, _ in self.roots():
+                self._walk(root, None, stats, stop_event)
+                with self._lock, self._db:
+                    self._db.execute("UPDATE roots SET updated = ? WHERE path = ?", (time.time(), root))
+        finally:
+            with self._lock:
+                self._db.commit()
+            self._update_lock.release()
+        return stats
+
+    def update_dirs(self, directories):
+        """Перечитывание изменившихся папок (пакет наблюдателя за файлами).
+
+        Указанные папки перечитываются без сравнения mtime — так
+        подхватываются и изменения размера файлов; новые папки
+        добавляются от ближайшего проиндексированного предка. Если идёт
+        полное обновление, возвращает None сразу, не дожидаясь его.
+        """
+        if not self._update_lock.acquire(blocking=False):
+            return None
+        stats = {'dirs': 0, 'scanned': 0, 'files': 0, 'removed': 0}
+        try:
+            roots = [root for root, _ in self.roots()]
+            starts = {}
+            for path in directories:
+                if not any(path_under(path, root) for root in roots):
+                    continue
+                with self._lock:
+                    while True:
+                        row = self._db.execute("SELECT parent FROM dirs WHERE path = ?", (path,)).fetchone()
+                        if row is not None or path in roots:
+                            break
+                        path = os.path.dirname(path)
+                starts[path] = row[0] if row is not None else None
+            for path, parent in sorted(starts.items()):
+                self._walk(path, parent, stats, force=True)
+            with self._lock:
+                self._db.commit()
+        finally:
+            self._update_lock.release()
+        return stats
+
+    def _walk(self, start, parent, stats, stop_event=None, force=False):
+        db = self._db
+        stack = [(start, parent)]
+        while stack:
+            if stop_event is not None and stop_event.is_set():
+                return
+            path, parent = stack.pop()
+            stats['dirs'] += 1
+            with self._lock:
+                row = db.execute("SELECT id, mtime_ns FROM dirs WHERE path = ?", (path,)).fetchone()
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except OSError:
+                    self._delete_tree(path)
+                    stats['removed'] += 1
+                    continue
+                if row is not None and row[1] == mtime_ns and not (force and path == start):
+                    stack.extend((child, row[0]) for (child,) in
+                                 db.execute("SELECT path FROM dirs WHERE parent = ?", (row[0],)))
+                    continue
+
+            files, subdirs = [], []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in TextSearch.SKIP_DIRS:
+                                    subdirs.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                info = entry.stat(follow_symlinks=False)
+                                files.append((entry.name, info.st_size, info.st_mtime))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            stats['scanned'] += 1
+            stats['files'] += len(files)
+
+            with self._lock:
+                if row is None:
+                    dir_id = db.execute("INSERT INTO dirs (parent, path, mtime_ns) VALUES (?, ?, ?)",
+                                        (parent, path, mtime_ns)).lastrowid
+                else:
+                    dir_id = row[0]
+                    db.execute("UPDATE dirs SET mtime_ns = ? WHERE id = ?", (mtime_ns, dir_id))
+                    db.execute("DELETE FROM files WHERE dir = ?", (dir_id,))
+                    # Подпапки, пропавшие с прошлого обхода, удаляются вместе с поддеревом
+                    current = set(subdirs)
+                    for (child,) in db.execute("SELECT path FROM dirs WHERE parent = ?", (dir_id,)).fetchall():
+                        if child not in current:
+                            self._delete_tree(child)
+                            stats['removed'] += 1
+                db.executemany("INSERT INTO files (dir, name, lname, ext, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                               [(dir_id, name, name.lower(), os.path.splitext(name)[1][1:].lower(), size, mtime)
+                                for name, size, mtime in files])
+                if stats['scanned'] % self.COMMIT_EVERY == 0:
+                    db.commit()
+            stack.extend((child, dir_id) for child in subdirs)
+
+    def query(self, pattern=None, min_size=None, max_size=None, newer=None, older=None,
+              ext=None, order='path', limit=100):
+        """Поиск по индексу: [(путь, размер, mtime)]"""
+        conditions, args = [], []
+        if pattern:
+            pattern = pattern.lower()
+            if any(char in pattern for char in '*?['):
+                conditions.append("f.lname GLOB ?")
+            else:
+                conditions.append("instr(f.lname, ?) > 0")
+            args.append(pattern)
+        for condition, value in (("f.size >= ?", min_size), ("f.size <= ?", max_size),
+                                 ("f.mtime >= ?", newer), ("f.mtime <= ?", older)):
+            if value is not None:
+                conditions.append(condition)
+                args.append(value)
+        if ext:
+            conditions.append("f.ext = ?")
+            args.append(ext.lower().lstrip('.'))
+        sql = "SELECT d.path, f.name, f.size, f.mtime FROM files f JOIN dirs d ON d.id = f.dir"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += {'size': " ORDER BY f.size DESC", 'mtime': " ORDER BY f.mtime DESC"}.get(order, "")
+        sql += " LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [(os.path.join(directory, name), size, mtime) for directory, name, size, mtime in rows]
+
+    def counts(self):
+        with self._lock:
+            dirs = self._db.execute("SELECT count(*) FROM dirs").fetchone()[0]
+            files, total = self._db.execute("SELECT count(*), coalesce(sum(size), 0) FROM files").fetchone()
+        return dirs, files, total
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ==============================================
+# НАБЛЮДЕНИЕ ЗА ФАЙЛОВОЙ СИСТЕМОЙ
+# ==============================================
+
+def path_under(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class InotifyBackend:
+    """inotify (Linux): по наблюдению на каждую папку, новые подпапки
+    рекурсивных корней подключаются по событию создания"""
+
+    name = "inotify"
+    IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x8, 0x40, 0x80
+    IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF = 0x100, 0x200, 0x400, 0x800
+    IN_Q_OVERFLOW, IN_IGNORED, IN_ONLYDIR, IN_ISDIR = 0x4000, 0x8000, 0x01000000, 0x40000000
+    MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, notify):
+        self.notify = notify
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.roots = {}
+        self.watches = {}  # wd -> путь
+        self.paths = {}  # путь -> wd
+        self._lock = threading.Lock()
+        self._running = True
+        threading.Thread(target=self._loop, name="inotify", daemon=True).start()
+
+    def _covered(self, path):
+        return any(path == root or (recursive and path_under(path, root)) for root, recursive in self.roots.items())
+
+    def _add_watch(self, path):
+        if path in self.paths:
+            return True
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            return ctypes.get_errno() != errno.ENOSPC  # исчерпан лимит max_user_watches
+        self.watches[wd] = path
+        self.paths[path] = wd
+        return True
+
+    def _add_tree(self, root):
+        for directory, subdirs, _ in os.walk(root):
+            subdirs[:] = [name for name in subdirs if name not in TextSearch.SKIP_DIRS]
+            if not self._add_watch(directory):
+                return False
+        return True
+
+    def set_paths(self, paths):
+        """Установка корней {путь: рекурсивно}; возвращает корни, которые не удалось наблюдать"""
+        failed = []
+        with self._lock:
+            previous, self.roots = self.roots, dict(paths)
+            self._remove_uncovered()
+            for root, recursive in paths.items():
+                if previous.get(root) == recursive:
+                    continue  # уже наблюдается — дерево повторно не обходим
+                if not (self._add_tree(root) if recursive else self._add_watch(root)):
+                    failed.append(root)
+                    del self.roots[root]
+            if failed:
+                # Частично подключённые деревья уходят на опрос — их наблюдения
+                # снимаются, чтобы не тратить лимит max_user_watches
+                self._remove_uncovered()
+        return failed
+
+    def _remove_uncovered(self):
+        for path, wd in list(self.paths.items()):
+            if not self._covered(path):
+                self._libc.inotify_rm_watch(self.fd, wd)
+                self.watches.pop(wd, None)
+                del self.paths[path]
+
+    def _loop(self):
+        buffer = b""
+        while self._running:
+            try:
+                ready, _, _ = select.select([self.fd], [], [], 0.5)
+                if not ready:
+                    continue
+                buffer += os.read(self.fd, 64 * 1024)
+            except (OSError, ValueError):
+                return
+            changed = set()
+            offset = 0
+            with self._lock:
+                while offset + self.EVENT.size <= len(buffer):
+                    wd, mask, _, length = self.EVENT.unpack_from(buffer, offset)
+                    name = buffer[offset + self.EVENT.size:offset + self.EVENT.size + length].rstrip(b"\0")
+                    offset += self.EVENT.size + length
+                    if mask & self.IN_Q_OVERFLOW:
+                        changed.update(self.roots)
+                        continue
+                    directory = self.watches.get(wd)
+                    if mask & self.IN_IGNORED:
+                        self.paths.pop(self.watches.pop(wd, None), None)
+                        continue
+                    if directory is None:
+                        continue
+                    changed.add(directory)
+                    if mask & self.IN_ISDIR and name:
+                        path = os.path.join(directory, os.fsdecode(name))
+                        changed.add(path)
+                        # Новая подпапка покрыта только рекурсивным корнем
+                        if mask & (self.IN_CREATE | self.IN_MOVED_TO) and self._covered(path):
+                            self._add_tree(path)
+                buffer = buffer[offset:]
+            if changed:
+                self.notify(changed)
+
+    def stop(self):
+        self._running = False
+
+
+class WindowsDirectoryBackend:
+    """ReadDirectoryChangesW (Windows): поток на корень, поддерево
+    отслеживается системой (bWatchSubtree).
+
+    Чтение асинхронное (FILE_FLAG_OVERLAPPED): поток ждёт либо завершения
+    чтения, либо своего события остановки, отменяет только собственный
+    запрос и сам закрывает handle — set_paths чужой handle не закрывает.
+    """
+
+    name = "ReadDirectoryChangesW"
+    FILTER = 0x1 | 0x2 | 0x8 | 0x10  # имена файлов и папок, размер, время записи
+    OPEN_FLAGS = 0x02000000 | 0x40000000  # FILE_FLAG_BACKUP_SEMANTICS | FILE_FLAG_OVERLAPPED
+    INFINITE = 0xFFFFFFFF
+
+    class OVERLAPPED(ctypes.Structure):
+        _fields_ = [('Internal', ctypes.c_void_p), ('InternalHigh', ctypes.c_void_p),
+                    ('Offset', ctypes.c_uint32), ('OffsetHigh', ctypes.c_uint32), ('hEvent', ctypes.c_void_p)]
+
+    def __init__(self, notify):
+        self.notify = notify
+        kernel32 = self._kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        kernel32.CreateFileW.restype = ctypes.c_void_p
+        kernel32.CreateFileW.argtypes = [ctypes.c_wchar_p, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_void_p,
+                                         ctypes.c_uint32, ctypes.c_uint32, ctypes.c_void_p]
+        kernel32.ReadDirectoryChangesW.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32,
+                                                   ctypes.c_int, ctypes.c_uint32, ctypes.c_void_p,
+                                                   ctypes.c_void_p, ctypes.c_void_p]
+        kernel32.CreateEventW.restype = ctypes.c_void_p
+        kernel32.CreateEventW.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_wchar_p]
+        kernel32.SetEvent.argtypes = [ctypes.c_void_p]
+        kernel32.ResetEvent.argtypes = [ctypes.c_void_p]
+        kernel32.WaitForMultipleObjects.argtypes = [ctypes.c_uint32, ctypes.c_void_p, ctypes.c_int, ctypes.c_uint32]
+        kernel32.WaitForMultipleObjects.restype = ctypes.c_uint32
+        kernel32.GetOverlappedResult.argtypes = [ctypes.c_void_p, ctypes.c_void_p,
+                                                 ctypes.POINTER(ctypes.c_uint32), ctypes.c_int]
+        kernel32.CancelIoEx.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+        self.roots = {}
+        self._watches = {}  # корень -> (handle, событие остановки); сам кортеж — метка потока
+        self._lock = threading.Lock()
+
+    def set_paths(self, paths):
+        failed = []
+        with self._lock:
+            for root in list(self._watches):
+                if paths.get(root) != self.roots.get(root):
+                    _handle, stop_event = self._watches.pop(root)
+                    self._kernel32.SetEvent(stop_event)
+            self.roots = dict(paths)
+            for root, recursive in paths.items():
+                if root in self._watches:
+                    continue
+                handle = self._kernel32.CreateFileW(root, 0x1, 0x7, None, 3, self.OPEN_FLAGS, None)
+                if handle in (None, ctypes.c_void_p(-1).value):
+                    failed.append(root)
+                    continue
+                stop_event = self._kernel32.CreateEventW(None, True, False, None)
+                if not stop_event:
+                    self._kernel32.CloseHandle(handle)
+                    failed.append(root)
+                    continue
+                watch = self._watches[root] = (handle, stop_event)
+                threading.Thread(target=self._loop, args=(root, watch, recursive),
+                                 name="dir-changes", daemon=True).start()
+        return failed
+
+    def _loop(self, root, watch, recursive):
+        handle, stop_event = watch
+        kernel32 = self._kernel32
+        buffer = ctypes.create_string_buffer(64 * 1024)
+        returned = ctypes.c_uint32()
+        overlapped = self.OVERLAPPED()
+        overlapped.hEvent = kernel32.CreateEventW(None, True, False, None)
+        events = (ctypes.c_void_p * 2)(overlapped.hEvent, stop_event)
+        try:
+            while overlapped.hEvent and self._watches.get(root) is watch:
+                kernel32.ResetEvent(overlapped.hEvent)
+                if not kernel32.ReadDirectoryChangesW(handle, buffer, len(buffer), recursive, self.FILTER,
+                                                      None, ctypes.addressof(overlapped), None):
+                    return  # папка удалена или недоступна
+                if kernel32.WaitForMultipleObjects(2, ctypes.addressof(events), False, self.INFINITE) != 0:
+                    # Остановка: отменяем свой запрос и дожидаемся отмены,
+                    # пока буфер ещё жив
+                    kernel32.CancelIoEx(handle, ctypes.addressof(overlapped))
+                    kernel32.GetOverlappedResult(handle, ctypes.addressof(overlapped), ctypes.byref(returned), True)
+                    return
+                if not kernel32.GetOverlappedResult(handle, ctypes.addressof(overlapped),
+                                                    ctypes.byref(returned), False):
+                    return
+                if returned.value == 0:
+                    self.notify({root})  # переполнение буфера — перечитать корень
+                    continue
+                data = buffer.raw[:returned.value]
+                changed = set()
+                offset = 0
+                while True:
+                    following, action, length = struct.unpack_from('<III', data, offset)
+                    path = os.path.join(root, data[offset + 12:offset + 12 + length].decode('utf-16-le'))
+                    changed.add(os.path.dirname(path))
+                    if action != 3:  # добавление/удаление/переименование может касаться папки
+                        changed.add(path)
+                    if not following:
+                        break
+                    offset += following
+                self.notify(changed)
+        finally:
+            # handle закрывает только его поток, после завершения чтения
+            kernel32.CloseHandle(handle)
+            kernel32.CloseHandle(stop_event)
+            if overlapped.hEvent:
+                kernel32.CloseHandle(overlapped.hEvent)
+
+    def stop(self):
+        self.set_paths({})
+
+
+class PollingBackend:
+    """Запасной вариант: сравнение снимков mtime папок.
+
+    Как и индекс файлов, папка с прежним mtime не перечитывается —
+    её подпапки берутся из прошлого снимка, так что опрос стоит один
+    stat на папку.
+    """
+
+    name = "опрос"
+
+    def __init__(self, notify, interval=2.0):
+        self.notify = notify
+        self.interval = interval
+        self.roots = {}
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = True
+        threading.Thread(target=self._loop, name="fs-poll", daemon=True).start()
+
+    def set_paths(self, paths):
+        with self._lock:
+            self.roots = dict(paths)
+            for root in list(self._snapshots):
+                if root not in paths:
+                    del self._snapshots[root]
+            for root, recursive in paths.items():
+                if root not in self._snapshots:
+                    self._snapshots[root] = self._scan(root, recursive, {})[0]
+        return []
+
+    def _scan(self, root, recursive, previous):
+        snapshot, changed = {}, set()
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            old = previous.get(path)
+            if old is not None and old[0] == mtime:
+                children = old[1]
+            else:
+                changed.add(path)
+                children = []
+                if recursive:
+                    try:
+                        with os.scandir(path) as entries:
+                            children = [entry.path for entry in entries
+                                        if entry.name not in TextSearch.SKIP_DIRS
+                                        and entry.is_dir(follow_symlinks=False)]
+                    except OSError:
+                        pass
+            snapshot[path] = (mtime, children)
+            stack.extend(children)
+        changed.update(path for path in previous if path not in snapshot)
+        return snapshot, changed
+
+    def _loop(self):
+        while self._running:
+            self._wake.wait(self.interval)
+            with self._lock:
+                roots = dict(self.roots)
+            changed = set()
+            for root, recursive in roots.items():
+                snapshot, root_changed = self._scan(root, recursive, self._snapshots.get(root, {}))
+                with self._lock:
+                    if root in self.roots:
+                        self._snapshots[root] = snapshot
+                        changed |= root_changed
+            if changed:
+                self.notify(changed)
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+
+class FileSystemWatcher:
+    """Наблюдение за папками с пакетной доставкой изменений.
+
+    События системного механизма (inotify / ReadDirectoryChangesW, иначе
+    опрос) сводятся к множеству изменившихся папок и отдаются в on_batch
+    одним пакетом, когда поток событий затих на debounce секунд (но не
+    реже чем раз в max_delay), — распаковка архива из тысяч файлов даёт
+    одно обновление кэшей, а не тысячи.
+    """
+
+    def __init__(self, on_batch, debounce=0.3, max_delay=2.0, poll_interval=2.0):
+        self.on_batch = on_batch
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.batches = 0
+        self.paths = {}
+        self._pending = set()
+        self._first = self._last = 0.0
+        self._cond = threading.Condition()
+        self._running = True
+        self.backend = None
+        try:
+            if platform.system() == "Linux":
+                self.backend = InotifyBackend(self._notify)
+            elif platform.system() == "Windows":
+                self.backend = WindowsDirectoryBackend(self._notify)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Системное наблюдение за файлами недоступно, используется опрос: {e}")
+        self.poller = PollingBackend(self._notify, poll_interval)
+        # Подключение корней (обход дерева для inotify, первый снимок опроса)
+        # выполняется по очереди в своём потоке, а не в GUI-потоке
+        self._setup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fs-watch-setup")
+        threading.Thread(target=self._deliver, name="fs-watch", daemon=True).start()
+
+    @property
+    def polled(self):
+        return list(self.poller.roots)
+
+    def set_paths(self, paths):
+        """Корни наблюдения {путь: рекурсивно}"""
+        if paths == self.paths:
+            return
+        self.paths = dict(paths)
+        self._setup.submit(self._apply_paths, dict(paths))
+
+    def _apply_paths(self, paths):
+        try:
+            failed = self.backend.set_paths(paths) if self.backend is not None else list(paths)
+            self.poller.set_paths({path: paths[path] for path in failed})
+        except Exception as e:
+            logger.error(f"Ошибка настройки наблюдения за файлами: {e}")
+
+    def _notify(self, paths):
+        with self._cond:
+            now = time.monotonic()
+            if not self._pending:
+                self._first = now
+            self._pending.update(paths)
+            self._last = now
+            self._cond.notify()
+
+    def _deliver(self):
+        while self._running:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                now = time.monotonic()
+                wait = min(self._last + self.debounce, self._first + self.max_delay) - now
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                batch, self._pending = self._pending, set()
+            self.batches += 1
+            try:
+                self.on_batch(batch)
+            except Exception as e:
+                logger.error(f"Ошибка обработки изменений файлов: {e}")
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+        self._setup.shutdown(wait=False, cancel_futures=True)
+        if self.backend is not None:
+            self.backend.stop()
+        self.poller.stop()
+
+
+# ==============================================
+# АРХИВЫ (zip/unzip)
+# ==============================================
+
+class ParallelZipWriter:
+    """Создание ZIP со сжатием на всех ядрах.
+
+    Файлы режутся на блоки CHUNK байт, каждый блок сжимается отдельной
+    задачей пула (zlib отпускает GIL). Блоки, кроме последнего,
+    завершаются Z_FULL_FLUSH — выровненные по байту куски raw deflate
+    можно склеить в один поток, как это делает pigz. Сборщик пишет
+    результаты строго по порядку, держа в работе не больше window
+    блоков, поэтому память не зависит от размера архива. Заголовок
+    записи пишется заранее и дописывается (CRC, размеры) по завершении
+    файла; при необходимости используются расширения ZIP64.
+    """
+
+    CHUNK = 1024 * 1024
+    ZIP64_LIMIT = 0xFFFFFFFF
+    LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+    CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+    END_RECORD = struct.Struct('<IHHHHIIH')
+    ZIP64_END_RECORD = struct.Struct('<IQHHIIQQQQ')
+    ZIP64_LOCATOR = struct.Struct('<IIQI')
+    FLAG_UTF8 = 0x800
+
+    def __init__(self, path, level=6, workers=None, progress=None, stop_event=None):
+        self.path = Path(path)
+        self.level = level
+        self.workers = workers or os.cpu_count() or 4
+        self.window = self.workers * 4
+        self.progress = progress or (lambda done, total, files: None)
+        self.stop_event = stop_event or threading.Event()
+        self.entries = []
+        self.total = 0
+        self.done = 0
+        self.compressed = 0
+
+    @staticmethod
+    def collect(sources, base=None):
+        """[(путь на диске, имя в архиве, stat)] для файлов и папок (с подпапками)"""
+        items = []
+        for source in sources:
+            source = Path(source)
+            root = Path(base) if base is not None else source.parent
+            if source.is_dir():
+                items.append((source, source.relative_to(root).as_posix() + "/", source.stat()))
+                for directory, subdirs, files in os.walk(source):
+                    subdirs.sort()
+                    for name in list(subdirs):
+                        path = Path(directory) / name
+                        try:
+                            items.append((path, path.relative_to(root).as_posix() + "/", path.stat()))
+                        except OSError:
+                            # Папка удалена или недоступна во время обхода — не спускаемся в неё
+                            subdirs.remove(name)
+                    for name in sorted(files):
+                        path = Path(directory) / name
+                        try:
+                            items.append((path, path.relative_to(root).as_posix(), path.stat()))
+                        except OSError:
+                            continue
+            else:
+                items.append((source, source.relative_to(root).as_posix(), source.stat()))
+        return items
+
+    @staticmethod
+    def _dos_time(timestamp):
+        moment = datetime.fromtimestamp(max(timestamp, 315532800))  # ZIP не хранит даты раньше 1980
+        return ((moment.hour << 11) | (moment.minute << 5) | (moment.second // 2),
+                ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day)
+
+    def write(self, items):
+        """Запись архива из collect(); возвращает число записей"""
+        self.total = sum(info.st_size for _, name, info in items if not name.endswith("/"))
+        own_path = self.path.resolve()
+        with open(self.path, 'wb') as archive, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="zip") as pool:
+            pending = deque()
+            for path, name, info in items:
+                if self.stop_event.is_set():
+                    raise InterruptedError("архивация остановлена")
+                if Path(path).resolve() == own_path:
+                    continue
+                entry = {'name': name.encode('utf-8'), 'mtime': info.st_mtime, 'size': 0, 'csize': 0,
+                         'crc': 0, 'method': 8, 'mode': info.st_mode, 'zip64': False}
+                if name.endswith("/"):
+                    entry['method'] = 0
+                    pending.append(('begin', entry))
+                    pending.append(('end', entry))
+                    continue
+                entry['zip64'] = info.st_size * 1.05 > self.ZIP64_LIMIT
+                try:
+                    source = open(path, 'rb')
+                except OSError:
+                    continue  # файл исчез или недоступен — пропускаем
+                pending.append(('begin', entry))
+                with source:
+                    data = source.read(self.CHUNK)
+                    while True:
+                        following = source.read(self.CHUNK) if len(data) == self.CHUNK else b""
+                        last = not following
+                        entry['crc'] = zlib.crc32(data, entry['crc'])
+                        entry['size'] += len(data)
+                        single = last and entry['size'] == len(data)
+                        pending.append(('chunk', entry, len(data),
+                                        pool.submit(self._compress_block, data, last, single)))
+                        while len(pending) > self.window:
+                            self._consume(archive, pending.popleft())
+                        if last:
+                            break
+                        data = following
+                pending.append(('end', entry))
+            while pending:
+                self._consume(archive, pending.popleft())
+            self._write_central_directory(archive)
+        return len(self.entries)
+
+    def _compress_block(self, data, last, single):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+        if single and len(compressed) >= len(data):
+            return data, True  # не сжимается (фото, архивы) — храним как есть
+        return compressed, False
+
+    def _local_header(self, entry):
+        time_, date_ = self._dos_time(entry['mtime'])
+        if entry['zip64']:
+            extra = struct.pack('<HHQQ', 1, 16, entry['size'], entry['csize'])
+            sizes = (self.ZIP64_LIMIT, self.ZIP64_LIMIT)
+        else:
+            extra = b""
+            sizes = (entry['csize'], entry['size'])
+        header = self.LOCAL_HEADER.pack(0x04034b50, 45 if entry['zip64'] else 20, self.FLAG_UTF8,
+                                        entry['method'], time_, date_, entry['crc'], sizes[0], sizes[1],
+                                        len(entry['name']), len(extra))
+        return header + entry['name'] + extra
+
+    def _consume(self, archive, item):
+        kind, entry = item[0], item[1]
+        if kind == 'begin':
+            entry['offset'] = archive.tell()
+            archive.write(self._local_header(entry))
+        elif kind == 'chunk':
+            data, stored = item[3].result()
+            if stored:
+                entry['method'] = 0
+            archive.write(data)
+            entry['csize'] += len(data)
+            self.done += item[2]
+            self.compressed += len(data)
+            self.progress(self.done, self.total, len(self.entries))
+        else:
+            end = archive.tell()
+            archive.seek(entry['offset'])
+            archive.write(self._local_header(entry))
+            archive.seek(end)
+            self.entries.append(entry)
+
+    def _write_central_directory(self, archive):
+        start = archive.tell()
+        limit = self.ZIP64_LIMIT
+        for entry in self.entries:
+            time_, date_ = self._dos_time(entry['mtime'])
+            zip64 = [value for value in (entry['size'], entry['csize'], entry['offset']) if value >= limit]
+            extra = struct.pack(f'<HH{len(zip64)}Q', 1, 8 * len(zip64), *zip64) if zip64 else b""
+            directory = entry['name'].endswith(b"/")
+            attributes = (entry['mode'] & 0xFFFF) << 16 | (0x10 if directory else 0)
+            archive.write(self.CENTRAL_HEADER.pack(
+                0x02014b50, (3 << 8) | 45, 45 if zip64 or entry['zip64'] else 20, self.FLAG_UTF8,
+                entry['method'], time_, date_, entry['crc'], min(entry['csize'], limit),
+                min(entry['size'], limit), len(entry['name']), len(extra), 0, 0, 0, attributes,
+                min(entry['offset'], limit)))
+            archive.write(entry['name'] + extra)
+        end = archive.tell()
+        count, size = len(self.entries), end - start
+        if count >= 0xFFFF or start >= limit or size >= limit:
+            archive.write(self.ZIP64_END_RECORD.pack(0x06064b50, 44, (3 << 8) | 45, 45, 0, 0,
+                                                     count, count, size, start))
+            archive.write(self.ZIP64_LOCATOR.pack(0x07064b50, 0, end, 1))
+        archive.write(self.END_RECORD.pack(0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                                           min(size, limit), min(start, limit), 0))
+
+
+def extract_archive(path, destination, workers=None, progress=None, stop_event=None):
+    """Распаковка ZIP потоково (буфер 1 МБ на файл) в несколько потоков.
+
+    Каждый поток открывает архив своим ZipFile — чтение и распаковка
+    идут параллельно без общей блокировки. Пути вне destination
+    (../, абсолютные) отклоняются. Возвращает (файлов, байт).
+    """
+    destination = Path(destination).resolve()
+    progress = progress or (lambda done, total, files: None)
+    stop_event = stop_event or threading.Event()
+    with zipfile.ZipFile(path) as archive:
+        members = archive.infolist()
+    total = sum(member.file_size for member in members)
+    state = {'done': 0, 'files': 0}
+    lock = threading.Lock()
+    local = threading.local()
+    handles = []
+
+    def target_of(member):
+        target = (destination / member.filename).resolve()
+        if target != destination and destination not in target.parents:
+            raise ValueError(f"небезопасный путь в архиве: {member.filename}")
+        return target
+
+    for member in members:
+        target = target_of(member)
+        (target if member.is_dir() else target.parent).mkdir(parents=True, exist_ok=True)
+
+    def extract(member):
+        if stop_event.is_set():
+            return
+        if not hasattr(local, 'archive'):
+            local.archive = zipfile.ZipFile(path)
+            with lock:
+                handles.append(local.archive)
+        target = target_of(member)
+        with local.archive.open(member) as source, open(target, 'wb') as output:
+            while True:
+                block = source.read(1024 * 1024)
+                if not block:
+                    break
+                output.write(block)
+                with lock:
+                    state['done'] += len(block)
+        timestamp = time.mktime(member.date_time + (0, 0, -1))
+        os.utime(target, (timestamp, timestamp))
+        with lock:
+            state['files'] += 1
+            progress(state['done'], total, state['files'])
+
+    files = [member for member in members if not member.is_dir()]
+    try:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 4, thread_name_prefix="unzip") as pool:
+            for future in [pool.submit(extract, member) for member in files]:
+                future.result()
+    finally:
+        for handle in handles:
+            handle.close()
+    if stop_event.is_set():
+        raise InterruptedError("распаковка остановлена")
+    return state['files'], state['done']
+
+
+# ==============================================
+# ВКЛАДКИ КОНСОЛИ
+# ==============================================
+
+class ConsoleTab(QTextEdit):
+    """Вкладка консоли: свой вывод, индекс поиска, история и рабочая папка.
+
+    Пока вкладка скрыта, вывод копится в pending и рисуется одним блоком
+    при активации — фоновые вкладки не тратят время на вёрстку документа.
+    """
+
+    def __init__(self, target_dir, title="Консоль"):
+        super().__init__()
+        self.setReadOnly(True)
+        self.target_dir = target_dir
+        self.title = title
+        self.command_history = []
+        self.history_index = 0
+        self.output_index = OutputLineIndex()
+        self.output_search = OutputSearch(self.output_index)
+        self.pending = []
+        self.closed = False
+
+    def buffer(self, text, color):
+        # Соседние куски одного цвета склеиваются: меньше вставок при активации
+        if self.pending and self.pending[-1][1] == color:
+            self.pending[-1][0].append(text)
+        else:
+            self.pending.append(([text], color))
+
+
 # ==============================================
 # КОМПАКТНОЕ ГЛАВНОЕ ОКНО (ПОЛНАЯ ВЕРСИЯ)
 # ==============================================
 
 class OptimizedConsoleWindow(QMainWindow):
+    # Вывод из фоновых потоков доставляется в GUI-поток через очередь сигналов
+    text_requested = pyqtSignal(str, QColor, object)
+    alert_event = pyqtSignal(str, str)
+    completion_ready = pyqtSignal(str, str, object)
+    # Команды сценария разбираются в GUI-потоке; поток сценария ждёт результата
+    script_dispatch = pyqtSignal(str, object)
+    script_finished = pyqtSignal(int)
+    spill_ready = pyqtSignal(str, str)
+    # Пакет изменившихся папок от наблюдателя; watches_stale — пересчитать корни наблюдения
+    fs_changed = pyqtSignal(object)
+    watches_stale = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
         self.is_windows = platform.system() == "Windows"
         self.current_dir = Path.cwd()
-        self.target_dir = self._get_desktop_path()
-        self.command_history = []
-        self.history_index = 0
+        # Состояние консоли живёт во вкладках (ConsoleTab); до их создания —
+        # папка по умолчанию для первой вкладки
+        self.tabs = None
+        self.config_target_dir = None
+        self._dispatch_tab = None
+        self._tab_context = threading.local()
+        self._default_target_dir = self._get_desktop_path()
 
         # Цветовая схема
         self.bg_color = QColor(30, 30, 46)
@@ -99,9 +4576,229 @@ class OptimizedConsoleWindow(QMainWindow):
         self.setWindowIcon(EmbeddedLogo.get_logo_icon())
 
         # Инициализация
+        self.config_manager = ConfigManager(parent=self)
+        self.app_config = self.config_manager.config
+        self.max_history = 100
+        self.language = "ru"
+        self.app_logging = AppLogging()
+        self.app_logging.configure(self.app_config)
         self.load_settings()
+        self.usage_stats = UsageStatistics(
+            keep_days=int(self.app_config.get('statistics', {}).get('keep_days', 7)))
+        monitor_config = self.app_config.get('monitor', {})
+        self.monitor_sampler = MonitorSampler(interval=float(monitor_config.get('interval', 1.0)))
+        self.monitor_sampler.add_collector('system', CpuMemoryCollector())
+        self.monitor_sampler.add_collector('disk', DiskStatsCollector(
+            probe_timeout=float(monitor_config.get('disk_probe_timeout', 2.0))))
+        self.network_collector = NetworkStatsCollector()
+        self.monitor_sampler.add_collector('network', self.network_collector)
+        self.worker_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="console-worker")
+        self.text_requested.connect(self.print_text)
+        self.speedtest_server = None
+        self.error_count = 0
+        self.command_stats = CommandStats()
+        self.metrics_exporter = MetricsExporter(self.command_stats)
+        self.monitor_sampler.add_listener(self.metrics_exporter.on_sample)
+        self.metrics_server = None
+        self.metrics_config = None
+
+        # История метрик пишется постоянно, поэтому сэмплер работает с запуска
+        self.metric_history = None
+        history_config = monitor_config.get('history', {})
+        if history_config.get('enabled', True):
+            try:
+                self.metric_history = MetricHistory(
+                    raw_seconds=int(history_config.get('raw_seconds', 3600)),
+                    minute_days=int(history_config.get('minute_days', 7)),
+                    hour_days=int(history_config.get('hour_days', 365)))
+                self.monitor_sampler.add_listener(self.metric_history.on_sample)
+                self.monitor_sampler.start()
+            except (OSError, ValueError) as e:
+                logger.warning(f"История метрик недоступна: {e}")
+        self._history_text = ("", 0)
+
+        # Оповещения проверяются в потоке сэмплера, события уходят в GUI сигналом
+        self.alert_engine = AlertEngine(on_event=self._emit_alert)
+        self.alerts_config = None
+        self.alert_event.connect(self.on_alert_event)
+        self.monitor_sampler.add_listener(self.alert_engine.evaluate)
+        self.tray_icon = None
+        self.startup_analyzer = StartupAnalyzer(self.worker_pool)
+        self.autostart_entries = []
+        self.memory_report = ProcessMemoryReport(self.worker_pool)
+        self.dns_resolver = DnsResolver(self.worker_pool)
+        self.listing_cache = DirectoryListingCache()
+        self._last_completion = None
+        self.recent_paths = []
+        self.spill_files = []
+        self.recorder = None
+        self.replay_stops = set()
+        self.search_stop = threading.Event()
+        self.file_index = None
+        self.index_stop = threading.Event()
+        self.archive_stop = threading.Event()
+        self.index_timer = QTimer(self)
+        self.index_timer.timeout.connect(lambda: self.update_file_index(quiet=True))
+        watcher_config = self.app_config.get('watcher', {})
+        self.fs_watcher = None
+        if watcher_config.get('enabled', True):
+            self.fs_watcher = FileSystemWatcher(
+                self.on_fs_batch,
+                debounce=float(watcher_config.get('debounce_ms', 300)) / 1000,
+                poll_interval=float(watcher_config.get('poll_interval', 2.0)))
+        self.folder_summaries = {}
+        self._index_backlog = set()
+        self._index_backlog_lock = threading.Lock()
+        self.headless = False
+        self._deferred_work = None
+        self._script_tasks = None
+        self._stats_deferred = False
+        self._thread_errors = threading.local()
+        self.script_dispatch.connect(self._dispatch_for_script, Qt.BlockingQueuedConnection)
+        self.completion_ready.connect(self.apply_completion)
+        self.spill_ready.connect(self.show_spill_viewer)
+        self.fs_changed.connect(self.on_fs_changed)
+        self.watches_stale.connect(self.sync_watches)
         self.init_ui()
+        self.apply_config(self.app_config)
+        self.config_manager.config_changed.connect(self.on_config_changed)
+        self.sync_watches()
         self.print_welcome()
+        logger.info(f"Optimized Console v11.0 запущена (папка: {self.target_dir})")
+
+    # ==============================================
+    # ВКЛАДКИ
+    # ==============================================
+
+    def context_tab(self):
+        """Вкладка, к которой относится текущий код.
+
+        В GUI-потоке — вкладка выполняемой команды или активная; в фоновых
+        потоках — вкладка, запустившая задачу (см. bind_tab).
+        """
+        if threading.current_thread() is threading.main_thread():
+            tab = self._dispatch_tab
+        else:
+            tab = getattr(self._tab_context, 'tab', None)
+        if tab is None and self.tabs is not None:
+            tab = self.tabs.currentWidget()
+        return tab
+
+    def bind_tab(self, fn):
+        """Обёртка, выполняющая fn в контексте текущей вкладки (для фоновых задач)"""
+        tab = self.context_tab()
+
+        def bound(*args, **kwargs):
+            previous = getattr(self._tab_context, 'tab', None)
+            self._tab_context.tab = tab
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._tab_context.tab = previous
+        return bound
+
+    @property
+    def console_output(self):
+        return self.context_tab()
+
+    @property
+    def output_index(self):
+        return self.context_tab().output_index
+
+    @property
+    def output_search(self):
+        return self.context_tab().output_search
+
+    @property
+    def target_dir(self):
+        tab = self.context_tab()
+        return tab.target_dir if tab is not None else self._default_target_dir
+
+    @target_dir.setter
+    def target_dir(self, value):
+        tab = self.context_tab()
+        if tab is None:
+            self._default_target_dir = value
+        else:
+            tab.target_dir = value
+            self.watches_stale.emit()
+
+    @property
+    def command_history(self):
+        return self.context_tab().command_history
+
+    @property
+    def history_index(self):
+        return self.context_tab().history_index
+
+    @history_index.setter
+    def history_index(self, value):
+        self.context_tab().history_index = value
+
+    def new_tab(self, target_dir=None):
+        """Новая вкладка (Ctrl+T); рабочая папка наследуется от активной"""
+        tab = ConsoleTab(Path(target_dir or self.target_dir), f"Консоль {self.tabs.count() + 1}")
+        tab.setStyleSheet(f"""
+            QTextEdit {{
+                background-color: {self.bg_color.name()};
+                color: {self.text_color.name()};
+                font-family: 'Consolas', 'Cascadia Code', 'Monospace';
+                font-size: 13px;
+                border: none;
+                border-radius: 10px;
+                padding: 15px;
+                line-height: 1.4;
+                selection-background-color: #5a67d8;
+            }}
+        """)
+        # Подсветка совпадений пересчитывается только для видимой области
+        tab.verticalScrollBar().valueChanged.connect(self._update_search_highlights)
+        tab.viewport().installEventFilter(self)
+        self.tabs.setCurrentIndex(self.tabs.addTab(tab, f"🖥️ {tab.title}"))
+        self.command_input.setFocus()
+        self.watches_stale.emit()
+        return tab
+
+    def close_tab(self, index=None):
+        """Закрытие вкладки (Ctrl+W); последняя вкладка не закрывается"""
+        if self.tabs.count() <= 1:
+            return
+        index = self.tabs.currentIndex() if index is None else index
+        tab = self.tabs.widget(index)
+        tab.closed = True
+        tab.pending.clear()
+        self.tabs.removeTab(index)
+        tab.deleteLater()
+        self.sync_watches()
+
+    def on_tab_changed(self, index):
+        """Активация вкладки: отрисовка накопленного вывода, папка, поиск"""
+        tab = self.tabs.widget(index)
+        if tab is None:
+            return
+        self.flush_tab(tab)
+        self.update_dir_label(tab)
+        if self.search_frame.isVisible():
+            self.run_output_search()
+
+    def flush_tab(self, tab):
+        """Вставка вывода, накопленного скрытой вкладкой"""
+        if not tab.pending:
+            return
+        pending, tab.pending = tab.pending, []
+        cursor = tab.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        for parts, color in pending:
+            text = ''.join(parts)
+            text_format = QTextCharFormat()
+            text_format.setForeground(QBrush(color))
+            cursor.setCharFormat(text_format)
+            cursor.insertText(text)
+            tab.output_index.append(text)
+        cursor.endEditBlock()
+        tab.setTextCursor(cursor)
+        tab.ensureCursorVisible()
 
     def _get_desktop_path(self):
         """Получение пути к Рабочему столу"""
@@ -125,32 +4822,105 @@ class OptimizedConsoleWindow(QMainWindow):
             return desktop
 
     def load_settings(self):
-        """Загрузка настроек"""
-        settings_file = Path.home() / ".optimized_console_settings.json"
-        if settings_file.exists():
-            try:
-                with open(settings_file, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                    if 'target_dir' in settings:
-                        saved_path = Path(settings['target_dir'])
-                        if saved_path.exists():
-                            self.target_dir = saved_path
-            except:
-                pass
+        """Загрузка настроек (слитая конфигурация, см. ConfigManager)"""
+        target_dir = self.app_config.get('target_dir')
+        if target_dir:
+            saved_path = Path(target_dir)
+            if saved_path.exists():
+                self.target_dir = saved_path
 
     def save_settings(self):
         """Сохранение настроек"""
-        settings_file = Path.home() / ".optimized_console_settings.json"
-        settings = {
+        try:
+            with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+            if not isinstance(settings, dict):
+                settings = {}
+        except (OSError, ValueError):
+            settings = {}
+        # Ключи, добавленные пользователем вручную (например, settings.max_history), сохраняются
+        settings.update({
             'target_dir': str(self.target_dir),
             'last_used': datetime.now().isoformat(),
             'version': '11.0'
-        }
+        })
+        try:
+            atomic_write_json(SETTINGS_FILE, settings)
+        except OSError:
+            pass
+
+    def apply_config(self, config):
+        """Применение конфигурации к работающему приложению"""
+        settings = config.get('settings', {})
         try:
-            with open(settings_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, indent=2, ensure_ascii=False)
-        except:
+            self.max_history = max(1, int(settings.get('max_history', self.max_history)))
+        except (TypeError, ValueError):
             pass
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            if len(tab.command_history) > self.max_history:
+                del tab.command_history[:-self.max_history]
+                tab.history_index = len(tab.command_history)
+
+        self.language = settings.get('language', self.language)
+        self.features = config.get('features', {})
+
+        # auto_save выключен — статистика пишется только при выходе
+        if settings.get('auto_save', True):
+            interval = config.get('statistics', {}).get('flush_interval', 60)
+            self.stats_timer.start(max(1, int(interval)) * 1000)
+        else:
+            self.stats_timer.stop()
+
+        # Секция metrics применяется только при её изменении, чтобы перезагрузка
+        # других настроек не отменяла ручное "metrics on/off"
+        metrics = config.get('metrics', {})
+        if metrics != self.metrics_config:
+            self.metrics_config = metrics
+            if metrics.get('enabled', False):
+                self.start_metrics_server(int(metrics.get('port', 9464)), metrics.get('host', '127.0.0.1'))
+            else:
+                self.stop_metrics_server()
+
+        # Фоновое обновление индекса файлов (если он создан командой index add)
+        try:
+            interval = parse_duration(config.get('file_index', {}).get('update_interval', '10m'))
+        except ValueError:
+            interval = 600
+        if interval > 0:
+            self.index_timer.start(int(interval * 1000))
+        else:
+            self.index_timer.stop()
+
+        alerts = config.get('alerts', [])
+        if alerts != self.alerts_config:
+            self.alerts_config = alerts
+            self.load_alert_rules(alerts)
+
+        # Папка из конфигурации применяется к активной вкладке, только когда
+        # она изменилась в файле, — иначе перезагрузка сбросила бы cd вкладок
+        target_dir = config.get('target_dir')
+        if target_dir != self.config_target_dir:
+            self.config_target_dir = target_dir
+            if target_dir and Path(target_dir) != self.target_dir and Path(target_dir).exists():
+                self.target_dir = Path(target_dir)
+                self.refresh_info()
+
+    def on_config_changed(self, config):
+        """Горячая перезагрузка конфигурации"""
+        previous = self.app_config
+        self.app_config = config
+
+        if any(previous.get(section) != config.get(section) for section in ('app', 'features', 'logging')):
+            self.app_logging.configure(config)
+
+        self.apply_config(config)
+
+        changed = [section for section in ('app', 'settings', 'features', 'logging')
+                   if previous.get(section) != config.get(section)]
+        if changed:
+            logger.info(f"Конфигурация перезагружена: {', '.join(changed)}")
+            self.print_text(f"⚙️ Конфигурация перезагружена ({', '.join(changed)})\n", self.info_color)
 
     def init_ui(self):
         """Инициализация красивого интерфейса"""
@@ -269,22 +5039,36 @@ class OptimizedConsoleWindow(QMainWindow):
         console_layout = QVBoxLayout(console_frame)
         console_layout.setContentsMargins(2, 2, 2, 2)
 
-        self.console_output = QTextEdit()
-        self.console_output.setReadOnly(True)
-        self.console_output.setStyleSheet(f"""
-            QTextEdit {{
-                background-color: {self.bg_color.name()};
-                color: {self.text_color.name()};
-                font-family: 'Consolas', 'Cascadia Code', 'Monospace';
-                font-size: 13px;
-                border: none;
-                border-radius: 10px;
-                padding: 15px;
-                line-height: 1.4;
-                selection-background-color: #5a67d8;
-            }}
+        # Панель поиска (Ctrl+F), скрыта по умолчанию
+        self.search_frame = self._create_search_bar()
+        console_layout.addWidget(self.search_frame)
+
+        # Вкладки консоли; первая создаётся после поля ввода
+        self.tabs = QTabWidget()
+        self.tabs.setTabsClosable(True)
+        self.tabs.setMovable(True)
+        self.tabs.setDocumentMode(True)
+        self.tabs.setStyleSheet("""
+            QTabBar::tab {
+                background-color: #1a202c;
+                color: #a0aec0;
+                padding: 6px 14px;
+                border-top-left-radius: 6px;
+                border-top-right-radius: 6px;
+            }
+            QTabBar::tab:selected {
+                background-color: #2d3748;
+                color: #ffffff;
+            }
         """)
-        console_layout.addWidget(self.console_output)
+        new_tab_btn = QPushButton("➕")
+        new_tab_btn.setToolTip("Новая вкладка (Ctrl+T)")
+        new_tab_btn.setStyleSheet("QPushButton { background: transparent; color: white; border: none; padding: 4px 8px; }")
+        new_tab_btn.clicked.connect(lambda: self.new_tab())
+        self.tabs.setCornerWidget(new_tab_btn, Qt.TopRightCorner)
+        self.tabs.tabCloseRequested.connect(self.close_tab)
+        console_layout.addWidget(self.tabs)
+        self.search_input.installEventFilter(self)
 
         main_layout.addWidget(console_frame, 1)  # 1 значит растягиваем
 
@@ -335,6 +5119,9 @@ class OptimizedConsoleWindow(QMainWindow):
             }}
         """)
         self.command_input.returnPressed.connect(self.execute_command)
+        self.command_input.installEventFilter(self)
+        self.new_tab(self._default_target_dir)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
         input_layout.addWidget(self.command_input, 1)
 
         input_layout.addSpacing(10)
@@ -383,7 +5170,7 @@ class OptimizedConsoleWindow(QMainWindow):
         actions_layout.setSpacing(8)
 
         # Быстрые действия с исправленными обработчиками
-        quick_actions = [
+        self.quick_actions = quick_actions = [
             ("📁 Открыть папку", self.open_target_folder, "#4299e1"),
             ("📄 Создать блокнот", self.create_notebook_dialog, "#48bb78"),
             ("📁 Создать папку", self.create_folder_dialog, "#ed8936"),
@@ -438,14 +5225,110 @@ class OptimizedConsoleWindow(QMainWindow):
             }}
         """)
 
-        status_label = QLabel("💡 Готов к работе | F1: Справка | F2-F12: Быстрые команды | ↑↓: История")
+        status_label = QLabel("💡 Готов к работе | F1: Справка | F2-F12: Быстрые команды | Ctrl+F: Поиск | Ctrl+P: Палитра | Tab: Путь | ↑↓: История")
         status_bar.addWidget(status_label)
 
+        self.alert_label = QLabel("")
+        status_bar.addPermanentWidget(self.alert_label)
+
         self.setStatusBar(status_bar)
 
+        # Поиск по выводу
+        QShortcut(QKeySequence.Find, self, activated=self.show_search_bar)
+        # Палитра команд
+        QShortcut(QKeySequence("Ctrl+P"), self, activated=self.show_command_palette)
+        # Вкладки
+        QShortcut(QKeySequence("Ctrl+T"), self, activated=lambda: self.new_tab())
+        QShortcut(QKeySequence("Ctrl+W"), self, activated=lambda: self.close_tab())
+
+        # Периодический сброс статистики (интервал из statistics.flush_interval)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.usage_stats.flush)
+
         # Фокус на поле ввода
         self.command_input.setFocus()
 
+    def _create_search_bar(self):
+        """Панель поиска по выводу консоли"""
+        frame = QFrame()
+        frame.setStyleSheet("""
+            QFrame {
+                background-color: #2d3748;
+                border-radius: 8px;
+                border: 2px solid #5a67d8;
+            }
+            QLabel, QCheckBox {
+                color: #e2e8f0;
+                font-size: 12px;
+                border: none;
+                background: transparent;
+            }
+        """)
+        layout = QHBoxLayout(frame)
+        layout.setContentsMargins(8, 4, 8, 4)
+        layout.setSpacing(6)
+
+        layout.addWidget(QLabel("🔍"))
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Поиск в выводе (Enter - далее, Shift+Enter - назад, Esc - закрыть)")
+        self.search_input.setStyleSheet("""
+            QLineEdit {
+                background-color: #1a202c;
+                color: #e2e8f0;
+                border: 2px solid #4a5568;
+                border-radius: 6px;
+                padding: 4px 8px;
+                font-family: 'Consolas', 'Monospace';
+                font-size: 13px;
+            }
+        """)
+        layout.addWidget(self.search_input, 1)
+
+        self.search_regex_check = QCheckBox("Regex")
+        self.search_case_check = QCheckBox("Aa")
+        self.search_case_check.setToolTip("Учитывать регистр")
+        layout.addWidget(self.search_regex_check)
+        layout.addWidget(self.search_case_check)
+
+        self.search_status_label = QLabel("")
+        self.search_status_label.setMinimumWidth(110)
+        layout.addWidget(self.search_status_label)
+
+        button_style = """
+            QPushButton {
+                background-color: rgba(255, 255, 255, 0.15);
+                color: white;
+                border: none;
+                border-radius: 6px;
+                padding: 4px 8px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: rgba(255, 255, 255, 0.25);
+            }
+        """
+        for text, tooltip, handler in (("▲", "Предыдущее", lambda: self.search_step(False)),
+                                       ("▼", "Следующее", lambda: self.search_step(True)),
+                                       ("✖", "Закрыть", self.hide_search_bar)):
+            btn = QPushButton(text)
+            btn.setToolTip(tooltip)
+            btn.setStyleSheet(button_style)
+            btn.clicked.connect(handler)
+            layout.addWidget(btn)
+
+        # Небольшая задержка, чтобы не искать на каждое нажатие клавиши
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(120)
+        self.search_timer.timeout.connect(self.run_output_search)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_regex_check.toggled.connect(self.run_output_search)
+        self.search_case_check.toggled.connect(self.run_output_search)
+
+        frame.hide()
+        return frame
+
     def _darken_color(self, color, amount=20):
         """Затемнение цвета для эффекта hover"""
         import re
@@ -463,6 +5346,7 @@ class OptimizedConsoleWindow(QMainWindow):
 
     def open_target_folder(self):
         """Открытие папки - работает"""
+        logger.info("Инструмент: Открыть папку")
         try:
             if not self.target_dir.exists():
                 self.target_dir.mkdir(parents=True, exist_ok=True)
@@ -822,6 +5706,7 @@ class OptimizedConsoleWindow(QMainWindow):
 
     def show_developer_tools(self):
         """Инструменты разработчика - работает"""
+        logger.info("Инструмент: Инструменты разработчика")
         self.print_text("🛠️ Запуск инструментов разработчика...\n", self.info_color)
 
         dialog = QDialog(self)
@@ -911,6 +5796,7 @@ class OptimizedConsoleWindow(QMainWindow):
 
     def show_security_tools(self):
         """Инструменты безопасности - работает"""
+        logger.info("Инструмент: Инструменты безопасности")
         self.print_text("🔐 Запуск инструментов безопасности...\n", self.info_color)
 
         dialog = QDialog(self)
@@ -1000,11 +5886,12 @@ class OptimizedConsoleWindow(QMainWindow):
 
     def show_system_monitor(self):
         """Мониторинг системы - работает"""
+        logger.info("Инструмент: Мониторинг системы")
         self.print_text("📊 Запуск мониторинга системы...\n", self.info_color)
 
         dialog = QDialog(self)
         dialog.setWindowTitle("📊 МОНИТОРИНГ СИСТЕМЫ")
-        dialog.setFixedSize(600, 500)
+        dialog.setFixedSize(700, 650)
         dialog.setStyleSheet("""
             QDialog {
                 background-color: #1a1b26;
@@ -1047,37 +5934,19 @@ class OptimizedConsoleWindow(QMainWindow):
             }
         """)
 
-        try:
-            cpu = psutil.cpu_percent(interval=0.5)
-            memory = psutil.virtual_memory()
-
-            info_text = f"💻 СИСТЕМНАЯ ИНФОРМАЦИЯ:\n"
-            info_text += f"┌{'─' * 50}┐\n"
-            info_text += f"│ Система: {platform.system()} {platform.release()}\n"
-            info_text += f"│ Архитектура: {platform.architecture()[0]}\n"
-            info_text += f"│ Процессор: {platform.processor()[:50]}...\n"
-            info_text += f"│ Хостнейм: {socket.gethostname()}\n"
-            info_text += f"│ Python: {platform.python_version()}\n"
-            info_text += f"└{'─' * 50}┘\n\n"
-
-            info_text += f"⚡ ЗАГРУЗКА ЦП:\n"
-            info_text += f"┌{'─' * 50}┐\n"
-            info_text += f"│ Использование CPU: {cpu}%\n"
-            info_text += f"│ Ядер: {psutil.cpu_count()} (логических: {psutil.cpu_count(logical=True)})\n"
-            info_text += f"└{'─' * 50}┘\n\n"
-
-            info_text += f"🧠 ИСПОЛЬЗОВАНИЕ ПАМЯТИ:\n"
-            info_text += f"┌{'─' * 50}┐\n"
-            info_text += f"│ Всего: {self.format_bytes(memory.total)}\n"
-            info_text += f"│ Использовано: {self.format_bytes(memory.used)} ({memory.percent}%)\n"
-            info_text += f"│ Свободно: {self.format_bytes(memory.free)}\n"
-            info_text += f"│ Доступно: {self.format_bytes(memory.available)}\n"
-            info_text += f"└{'─' * 50}┘\n"
+        # Данные берутся из фонового сэмплера: диалог только перерисовывает текст
+        self.monitor_sampler.start()
 
-            monitor_text.setText(info_text)
+        def refresh_monitor():
+            scroll = monitor_text.verticalScrollBar()
+            position = scroll.value()
+            monitor_text.setText(self._format_monitor_text(self.monitor_sampler.latest))
+            scroll.setValue(position)
 
-        except Exception as e:
-            monitor_text.setText(f"❌ Ошибка при получении информации: {str(e)}")
+        refresh_monitor()
+        monitor_timer = QTimer(dialog)
+        monitor_timer.timeout.connect(refresh_monitor)
+        monitor_timer.start(1000)
 
         layout.addWidget(monitor_text, 1)
 
@@ -1106,13 +5975,104 @@ class OptimizedConsoleWindow(QMainWindow):
 
         dialog.exec_()
 
+    def _format_monitor_text(self, snapshot):
+        """Текст окна мониторинга по снимку сэмплера"""
+        info_text = f"💻 СИСТЕМНАЯ ИНФОРМАЦИЯ:\n"
+        info_text += f"┌{'─' * 50}┐\n"
+        info_text += f"│ Система: {platform.system()} {platform.release()}\n"
+        info_text += f"│ Архитектура: {platform.architecture()[0]}\n"
+        info_text += f"│ Процессор: {platform.processor()[:50]}...\n"
+        info_text += f"│ Хостнейм: {socket.gethostname()}\n"
+        info_text += f"│ Python: {platform.python_version()}\n"
+        info_text += f"└{'─' * 50}┘\n\n"
+
+        system = snapshot.get('system')
+        if not system:
+            return info_text + "⏳ Сбор данных...\n"
+
+        info_text += f"⚡ ЗАГРУЗКА ЦП:\n"
+        info_text += f"┌{'─' * 50}┐\n"
+        info_text += f"│ Использование CPU: {system['cpu_percent']}%\n"
+        info_text += f"│ Ядер: {psutil.cpu_count()} (логических: {psutil.cpu_count(logical=True)})\n"
+        info_text += f"└{'─' * 50}┘\n\n"
+
+        info_text += f"🧠 ИСПОЛЬЗОВАНИЕ ПАМЯТИ:\n"
+        info_text += f"┌{'─' * 50}┐\n"
+        info_text += f"│ Всего: {self.format_bytes(system['memory_total'])}\n"
+        info_text += f"│ Использовано: {self.format_bytes(system['memory_used'])} ({system['memory_percent']}%)\n"
+        info_text += f"│ Свободно: {self.format_bytes(system['memory_free'])}\n"
+        info_text += f"│ Доступно: {self.format_bytes(system['memory_available'])}\n"
+        info_text += f"└{'─' * 50}┘\n\n"
+
+        disk = snapshot.get('disk', {})
+        info_text += f"💽 ДИСКИ (ввод-вывод):\n"
+        info_text += f"┌{'─' * 50}┐\n"
+        devices = disk.get('devices', {})
+        if not devices:
+            info_text += "│ Нет данных (появятся со следующей выборкой)\n"
+        for name, io in sorted(devices.items()):
+            info_text += (f"│ {name:<10} ⬇ {self.format_bytes(io['read_bps'])}/s  "
+                          f"⬆ {self.format_bytes(io['write_bps'])}/s  "
+                          f"IOPS {io['read_iops']:.0f}/{io['write_iops']:.0f}\n")
+        info_text += f"└{'─' * 50}┘\n\n"
+
+        info_text += f"📂 РАЗДЕЛЫ:\n"
+        info_text += f"┌{'─' * 50}┐\n"
+        for part in disk.get('partitions', []):
+            label = f"│ {part['mountpoint']:<14} {part['fstype']:<6} "
+            if part['state'] == 'ok':
+                info_text += (label + f"{self.format_bytes(part['used'])} из {self.format_bytes(part['total'])} "
+                              f"({part['percent']}%), свободно {self.format_bytes(part['free'])}\n")
+            elif part['state'] == 'timeout':
+                info_text += label + f"⏳ не отвечает ({part['waiting']:.0f} с)\n"
+            elif part['state'] == 'error':
+                info_text += label + f"❌ {part['error'][:40]}\n"
+            else:
+                info_text += label + "⏳ опрос...\n"
+        info_text += f"└{'─' * 50}┘\n"
+        return info_text + self._format_history_text()
+
+    def _format_history_text(self):
+        """Спарклайны CPU/RAM за час, сутки и неделю (пересчёт раз в 10 с)"""
+        if self.metric_history is None:
+            return ""
+        text, built = self._history_text
+        if time.monotonic() - built < 10:
+            return text
+
+        bars = "▁▂▃▄▅▆▇█"
+
+        def sparkline(points, field):
+            line = ""
+            for point in points:
+                if point is None:
+                    line += " "
+                else:
+                    line += bars[min(len(bars) - 1, int(point[field] / 100 * len(bars)))]
+            return line
+
+        def peak(points, field):
+            values = [p[field] for p in points if p is not None]
+            return f"ср {sum(values) / len(values):5.1f}% макс {max(values):5.1f}%" if values else "нет данных"
+
+        text = f"\n📈 ИСТОРИЯ (data/metrics_*.ring):\n"
+        text += f"┌{'─' * 50}┐\n"
+        for label, seconds in (("час", 3600), ("сутки", 86400), ("неделя", 7 * 86400)):
+            points = self.metric_history.series(seconds, points=48)
+            text += f"│ CPU {label:<7}{sparkline(points, 0)} {peak(points, 0)}\n"
+            text += f"│ RAM {label:<7}{sparkline(points, 1)} {peak(points, 1)}\n"
+        text += f"└{'─' * 50}┘\n"
+        self._history_text = (text, time.monotonic())
+        return text
+
     def show_network_tools(self):
         """Сетевые инструменты - работает"""
+        logger.info("Инструмент: Сетевые инструменты")
         self.print_text("📡 Запуск сетевых инструментов...\n", self.info_color)
 
         dialog = QDialog(self)
         dialog.setWindowTitle("📡 СЕТЕВЫЕ ИНСТРУМЕНТЫ")
-        dialog.setFixedSize(600, 500)
+        dialog.setFixedSize(850, 700)
         dialog.setStyleSheet("""
             QDialog {
                 background-color: #1a1b26;
@@ -1155,19 +6115,65 @@ class OptimizedConsoleWindow(QMainWindow):
             }
         """)
 
-        network_info = "📡 СЕТЕВЫЕ ИНСТРУМЕНТЫ:\n"
-        network_info += "=" * 50 + "\n\n"
-        network_info += "📡 ПИНГ ХОСТА:\n"
-        network_info += "1. Введите хост (например, google.com)\n"
-        network_info += "2. Нажмите 'Выполнить пинг'\n\n"
-        network_info += "🔍 ПРОВЕРКА ПОРТА:\n"
-        network_info += "1. Введите хост и порт\n"
-        network_info += "2. Нажмите 'Проверить порт'\n\n"
-        network_info += "💡 Для полной версии используйте консольную команду:\n"
-        network_info += "tools network\n"
-
-        network_text.setText(network_info)
-        layout.addWidget(network_text, 1)
+        layout.addWidget(network_text, 1)
+
+        connections_label = QLabel("🔌 Сокеты: сбор данных...")
+        connections_label.setStyleSheet("color: #e2e8f0; font-size: 13px; font-weight: bold; font-family: 'Segoe UI';")
+        layout.addWidget(connections_label)
+
+        connections_model = ConnectionTableModel(dialog)
+        connections_view = QTableView()
+        connections_view.setModel(connections_model)
+        connections_view.setAlternatingRowColors(True)
+        connections_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        connections_view.verticalHeader().hide()
+        connections_view.verticalHeader().setDefaultSectionSize(22)
+        connections_view.horizontalHeader().setStretchLastSection(True)
+        for column, width in enumerate((80, 200, 200, 110, 70)):
+            connections_view.setColumnWidth(column, width)
+        connections_view.setStyleSheet("""
+            QTableView {
+                background-color: #1a202c;
+                alternate-background-color: #202736;
+                color: #e2e8f0;
+                border: 2px solid #4a5568;
+                border-radius: 10px;
+                font-family: 'Consolas', 'Monospace';
+                font-size: 12px;
+                selection-background-color: #5a67d8;
+            }
+            QHeaderView::section {
+                background-color: #2d3748;
+                color: #e2e8f0;
+                border: none;
+                padding: 4px;
+                font-weight: bold;
+            }
+        """)
+        layout.addWidget(connections_view, 2)
+
+        # Таблица сокетов собирается только пока открыт диалог
+        collector = self.network_collector
+        collector.want_connections = True
+        self.monitor_sampler.start()
+
+        def refresh_network():
+            network_text.setText(self._format_network_text(self.monitor_sampler.latest))
+            if collector.connections_error:
+                connections_label.setText(f"🔌 Сокеты: ❌ {collector.connections_error}")
+                return
+            if collector.connections_time is None:
+                return
+            added, removed = connections_model.update(collector.connections)
+            connections_label.setText(
+                f"🔌 Сокеты: {len(connections_model.rows)} (+{added} / −{removed}), "
+                f"обновлено {datetime.fromtimestamp(collector.connections_time).strftime('%H:%M:%S')}")
+
+        refresh_network()
+        network_timer = QTimer(dialog)
+        network_timer.timeout.connect(refresh_network)
+        network_timer.start(1000)
+        dialog.finished.connect(lambda _result: setattr(collector, 'want_connections', False))
 
         close_btn = QPushButton("❌ Закрыть")
         close_btn.setStyleSheet("""
@@ -1194,63 +6200,84 @@ class OptimizedConsoleWindow(QMainWindow):
 
         dialog.exec_()
 
+    def _format_network_text(self, snapshot):
+        """Скорости интерфейсов для окна сетевых инструментов"""
+        network_info = "📡 СЕТЕВЫЕ ИНТЕРФЕЙСЫ:\n"
+        network_info += "=" * 50 + "\n"
+        nics = snapshot.get('network', {}).get('nics', {})
+        if not nics:
+            network_info += "⏳ Сбор данных...\n"
+        for name, nic in sorted(nics.items(), key=lambda item: -(item[1]['rx_bps'] + item[1]['tx_bps'])):
+            network_info += (f"{name[:16]:<16} ⬇ {self.format_bytes(nic['rx_bps']):>11}/s  "
+                             f"⬆ {self.format_bytes(nic['tx_bps']):>11}/s  "
+                             f"(всего ⬇ {self.format_bytes(nic['rx_total'])} ⬆ {self.format_bytes(nic['tx_total'])})\n")
+        network_info += "\n💡 Команды: ping <host>, ip\n"
+        return network_info
+
     def show_ip_info(self):
         """Показать IP адреса - работает"""
-        try:
-            info_text = "🌐 СЕТЕВАЯ ИНФОРМАЦИЯ:\n"
-            info_text += "=" * 60 + "\n\n"
-
-            # Имя хоста
-            hostname = socket.gethostname()
-            info_text += f"🏠 Имя компьютера: {hostname}\n\n"
-
-            # Локальные IP
-            info_text += "📡 ЛОКАЛЬНЫЕ IP АДРЕСА:\n"
-            try:
-                local_ip = socket.gethostbyname_ex(hostname)[2]
-                for ip in local_ip:
-                    if not ip.startswith('127.'):
-                        info_text += f"  • {ip}\n"
-            except:
-                pass
-
-            # Дополнительный способ получения локального IP
-            try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                s.connect(("8.8.8.8", 80))
-                local_ip = s.getsockname()[0]
-                s.close()
-                info_text += f"  • {local_ip} (через 8.8.8.8)\n"
-            except:
-                pass
-
-            # MAC адрес
-            info_text += "\n🔗 MAC АДРЕС:\n"
-            try:
-                mac = ':'.join(['{:02x}'.format((uuid.getnode() >> elements) & 0xff)
-                                for elements in range(0, 8 * 6, 8)][::-1])
-                info_text += f"  {mac}\n"
-            except:
-                info_text += "  Не удалось получить\n"
+        logger.info("Инструмент: IP информация")
 
-            # Публичный IP
-            info_text += "\n🌍 ПУБЛИЧНЫЙ IP:\n"
+        def collect():
+            # Имя хоста, внешний сокет и ipify могут ждать секунды — не в GUI-потоке
             try:
-                with urllib.request.urlopen('https://api.ipify.org', timeout=5) as response:
-                    public_ip = response.read().decode('utf-8')
-                    info_text += f"  {public_ip}\n"
-            except:
-                info_text += "  Не удалось получить\n"
-
-            info_text += "\n" + "=" * 60 + "\n"
-
-            self.print_text(info_text, self.network_color)
-
-        except Exception as e:
-            self.print_text(f"❌ Ошибка при получении IP: {e}\n", self.error_color)
+                info_text = "🌐 СЕТЕВАЯ ИНФОРМАЦИЯ:\n"
+                info_text += "=" * 60 + "\n\n"
+
+                # Имя хоста
+                hostname = socket.gethostname()
+                info_text += f"🏠 Имя компьютера: {hostname}\n\n"
+
+                # Локальные IP
+                info_text += "📡 ЛОКАЛЬНЫЕ IP АДРЕСА:\n"
+                try:
+                    local_ip = self.dns_resolver.resolve(hostname)
+                    for ip in local_ip:
+                        if not ip.startswith('127.'):
+                            info_text += f"  • {ip}\n"
+                except:
+                    pass
+
+                # Дополнительный способ получения локального IP
+                try:
+                    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    s.connect(("8.8.8.8", 80))
+                    local_ip = s.getsockname()[0]
+                    s.close()
+                    info_text += f"  • {local_ip} (через 8.8.8.8)\n"
+                except:
+                    pass
+
+                # MAC адрес
+                info_text += "\n🔗 MAC АДРЕС:\n"
+                try:
+                    mac = ':'.join(['{:02x}'.format((uuid.getnode() >> elements) & 0xff)
+                                    for elements in range(0, 8 * 6, 8)][::-1])
+                    info_text += f"  {mac}\n"
+                except:
+                    info_text += "  Не удалось получить\n"
+
+                # Публичный IP
+                info_text += "\n🌍 ПУБЛИЧНЫЙ IP:\n"
+                try:
+                    with urllib.request.urlopen('https://api.ipify.org', timeout=5) as response:
+                        public_ip = response.read().decode('utf-8')
+                        info_text += f"  {public_ip}\n"
+                except:
+                    info_text += "  Не удалось получить\n"
+
+                info_text += "\n" + "=" * 60 + "\n"
+
+                self.print_text(info_text, self.network_color)
+
+            except Exception as e:
+                self.print_text(f"❌ Ошибка при получении IP: {e}\n", self.error_color)
+
+        self.run_in_background(collect)
 
     def show_bios_tools(self):
         """Инструменты BIOS - работает"""
+        logger.info("Инструмент: Инструменты BIOS")
         self.print_text("⚡ Запуск инструментов BIOS...\n", self.info_color)
 
         dialog = QDialog(self)
@@ -1351,6 +6378,7 @@ class OptimizedConsoleWindow(QMainWindow):
 
     def show_optimization_tools(self):
         """Инструменты оптимизации - работает"""
+        logger.info("Инструмент: Оптимизация системы")
         self.print_text("🔧 Запуск инструментов оптимизации...\n", self.info_color)
 
         dialog = QDialog(self)
@@ -1404,11 +6432,11 @@ class OptimizedConsoleWindow(QMainWindow):
         optimize_info += "🧹 ОЧИСТКА СИСТЕМЫ:\n"
         optimize_info += "1. Очистка временных файлов\n"
         optimize_info += "2. Очистка DNS кэша\n"
-        optimize_info += "3. Оптимизация автозагрузки\n\n"
+        optimize_info += "3. Оптимизация автозагрузки (команда autostart)\n\n"
 
         optimize_info += "⚡ УСКОРЕНИЕ РАБОТЫ:\n"
         optimize_info += "1. Дефрагментация дисков\n"
-        optimize_info += "2. Оптимизация памяти\n"
+        optimize_info += "2. Оптимизация памяти (команда mem)\n"
         optimize_info += "3. Настройка виртуальной памяти\n\n"
 
         optimize_info += "💡 ДЛЯ WINDOWS:\n"
@@ -1444,16 +6472,328 @@ class OptimizedConsoleWindow(QMainWindow):
 
         dialog.exec_()
 
+    # ==============================================
+    # ПОИСК ПО ВЫВОДУ (Ctrl+F)
+    # ==============================================
+
+    def show_search_bar(self):
+        """Открыть панель поиска"""
+        self.search_frame.show()
+        selected = self.console_output.textCursor().selectedText()
+        if selected and '\u2029' not in selected:
+            self.search_input.setText(selected)
+        self.search_input.setFocus()
+        self.search_input.selectAll()
+        self.run_output_search()
+
+    def hide_search_bar(self):
+        """Закрыть панель поиска и снять подсветку"""
+        self.search_timer.stop()
+        self.search_frame.hide()
+        self.output_search.reset()
+        self.console_output.setExtraSelections([])
+        self.command_input.setFocus()
+
+    def run_output_search(self):
+        """Поиск по теневому буферу вывода"""
+        if not self.search_frame.isVisible():
+            return
+        self.search_timer.stop()
+        try:
+            count = self.output_search.run(self.search_input.text(),
+                                           regex=self.search_regex_check.isChecked(),
+                                           case_sensitive=self.search_case_check.isChecked())
+        except re.error as e:
+            self.output_search.reset()
+            self.search_status_label.setText(f"<span style='color: #ff6464;'>regex: {e.msg}</span>")
+            self.console_output.setExtraSelections([])
+            return
+
+        if count:
+            self._reveal_current_match()
+        self._update_search_status()
+        self._update_search_highlights()
+
+    def search_step(self, forward=True):
+        """Переход к следующему/предыдущему совпадению"""
+        if self.search_timer.isActive():
+            self.run_output_search()
+            return
+        if self.output_search.step(forward) >= 0:
+            self._reveal_current_match()
+            self._update_search_status()
+            self._update_search_highlights()
+
+    def _update_search_status(self):
+        search = self.output_search
+        if not self.search_input.text():
+            self.search_status_label.setText("")
+        elif not search.starts:
+            self.search_status_label.setText("<span style='color: #ff6464;'>Не найдено</span>")
+        else:
+            self.search_status_label.setText(f"{search.current + 1} из {len(search.starts)}")
+
+    def _reveal_current_match(self):
+        """Прокрутка к текущему совпадению"""
+        search = self.output_search
+        document = self.console_output.document()
+        cursor = QTextCursor(document)
+        cursor.setPosition(self.output_index.qt_position(document, search.starts[search.current]))
+        self.console_output.setTextCursor(cursor)
+        self.console_output.ensureCursorVisible()
+
+    def _update_search_highlights(self):
+        """Подсветка совпадений только в видимой части консоли"""
+        search = self.output_search
+        if not search.starts or not self.search_frame.isVisible():
+            if self.console_output.extraSelections():
+                self.console_output.setExtraSelections([])
+            return
+
+        viewport = self.console_output.viewport()
+        first = self.console_output.cursorForPosition(QPoint(0, 0)).blockNumber()
+        last = self.console_output.cursorForPosition(
+            QPoint(viewport.width() - 1, viewport.height() - 1)).blockNumber()
+        line_starts = self.output_index.line_starts
+        start_offset = line_starts[first]
+        end_offset = line_starts[last + 1] if last + 1 < len(line_starts) else len(self.output_index)
+
+        document = self.console_output.document()
+        match_format = QTextCharFormat()
+        match_format.setBackground(QColor(246, 173, 85, 110))
+        current_format = QTextCharFormat()
+        current_format.setBackground(QColor(246, 173, 85))
+        current_format.setForeground(QColor(26, 27, 38))
+
+        selections = []
+        for i in search.in_range(start_offset, end_offset):
+            cursor = QTextCursor(document)
+            cursor.setPosition(self.output_index.qt_position(document, search.starts[i]))
+            cursor.setPosition(self.output_index.qt_position(document, search.ends[i]), QTextCursor.KeepAnchor)
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = cursor
+            selection.format = current_format if i == search.current else match_format
+            selections.append(selection)
+        self.console_output.setExtraSelections(selections)
+
+    def eventFilter(self, obj, event):
+        """Клавиши панели поиска и перерисовка подсветки при resize"""
+        if obj is self.search_input and event.type() == QEvent.KeyPress:
+            if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+                self.search_step(not (event.modifiers() & Qt.ShiftModifier))
+                return True
+            if event.key() == Qt.Key_Escape:
+                self.hide_search_bar()
+                return True
+        elif event.type() == QEvent.KeyPress and event.key() == Qt.Key_Tab and obj is self.command_input:
+            # Tab не переводит фокус, а дополняет путь
+            self.complete_path()
+            return True
+        elif event.type() == QEvent.Resize and obj.parent() is self.tabs.currentWidget():
+            self._update_search_highlights()
+        return super().eventFilter(obj, event)
+
     # ==============================================
     # ОСТАЛЬНЫЕ МЕТОДЫ
     # ==============================================
 
-    def print_text(self, text, color=None):
-        """Вывод текста в консоль"""
+    def complete_path(self):
+        """Дополнение пути под курсором относительно target_dir"""
+        text = self.command_input.text()
+        cursor = self.command_input.cursorPosition()
+        head = text[:cursor]
+        # Токен под курсором: после последнего пробела или открывающей кавычки
+        quote = head.rfind('"') if head.count('"') % 2 else -1
+        start = quote + 1 if quote >= 0 else (max(head.rfind(' '), head.rfind('\t')) + 1)
+        token = head[start:]
+
+        directory_part, prefix = os.path.split(token)
+        directory = Path(os.path.expanduser(directory_part)) if directory_part else Path()
+        if not directory.is_absolute():
+            directory = self.target_dir / directory
+        directory = str(directory)
+
+        listing = self.listing_cache.cached(directory)
+        if listing is not None:
+            self.apply_completion(text, directory, (token, start, cursor, prefix, listing))
+            return
+
+        # Листинг не в кэше: ждём не дольше кадра, иначе досчитаем в фоне
+        future = self.worker_pool.submit(self.listing_cache.listing, directory)
+        try:
+            listing = future.result(timeout=0.016)
+        except FutureTimeout:
+            future.add_done_callback(lambda f: self.completion_ready.emit(
+                text, directory, (token, start, cursor, prefix, f)))
+            return
+        except OSError:
+            return
+        self.apply_completion(text, directory, (token, start, cursor, prefix, listing))
+
+    def apply_completion(self, text, directory, request):
+        """Подстановка результата (в GUI-потоке)"""
+        token, start, cursor, prefix, listing = request
+        if isinstance(listing, Future):
+            if listing.exception() is not None:
+                return
+            listing = listing.result()
+        if self.command_input.text() != text:
+            return  # пользователь уже изменил ввод
+        matches = self.listing_cache.matches(listing, prefix)
+        if not matches:
+            return
+
+        names = [name for name, _ in matches]
+        common = os.path.commonprefix(names)
+        if self.listing_cache.case_insensitive and len(set(name.lower() for name in names)) > 1:
+            common = names[0][:len(os.path.commonprefix([name.lower() for name in names]))]
+        if len(matches) == 1:
+            name, is_dir = matches[0]
+            completion = name + (os.sep if is_dir else "")
+        else:
+            completion = common
+            # Повторный Tab без продвижения показывает варианты
+            if len(common) <= len(prefix) and self._last_completion == (text, cursor):
+                shown = [name + (os.sep if is_dir else "") for name, is_dir in matches[:200]]
+                more = f"\n  ...и ещё {len(matches) - 200}" if len(matches) > 200 else ""
+                self.print_text("📂 " + "  ".join(shown) + more + "\n", self.output_color)
+        new_token = token[:len(token) - len(prefix)] + completion
+        if ' ' in completion and not (start > 0 and text[start - 1] == '"'):
+            new_token = '"' + new_token
+            start_text = text[:start] + new_token
+        else:
+            start_text = text[:start] + new_token
+        if len(matches) == 1 and not matches[0][1]:
+            start_text += '"' if start_text[start:].startswith('"') or (start > 0 and text[start - 1] == '"') else ""
+            start_text += " "
+        self.command_input.setText(start_text + text[cursor:])
+        self.command_input.setCursorPosition(len(start_text))
+        if len(matches) == 1:
+            self.remember_path(os.path.join(directory, matches[0][0]))
+        self._last_completion = (self.command_input.text(), len(start_text))
+
+    def remember_path(self, path):
+        """Недавние пути для палитры команд (последний — первым)"""
+        path = str(path)
+        if path in self.recent_paths:
+            self.recent_paths.remove(path)
+        self.recent_paths.insert(0, path)
+        del self.recent_paths[50:]
+
+    def show_command_palette(self):
+        """Ctrl+P: поиск по командам, истории, быстрым действиям и путям"""
+        candidates = [(f"⌨️ {command} — {description}", ('command', command, needs_args))
+                      for command, description, needs_args in PALETTE_COMMANDS]
+        candidates += [(f"⚡ {text}", ('action', handler)) for text, handler, _ in self.quick_actions]
+        candidates += [(f"🕘 {command}", ('history', command))
+                       for command in dict.fromkeys(reversed(self.command_history))]
+        candidates += [(f"📂 {path}", ('path', path)) for path in self.recent_paths]
+
+        palette = CommandPalette(self, candidates, self.activate_palette_item)
+        palette.move(self.mapToGlobal(QPoint((self.width() - palette.width()) // 2, 60)))
+        palette.show()
+        palette.input.setFocus()
+
+    def activate_palette_item(self, payload):
+        kind = payload[0]
+        if kind == 'action':
+            payload[1]()
+            return
+        if kind == 'path':
+            path = payload[1]
+            current = self.command_input.text()
+            self.command_input.setText(current + (f'"{path}"' if ' ' in path else path))
+        elif kind == 'command' and payload[2]:
+            self.command_input.setText(payload[1] + " ")
+        else:
+            self.command_input.setText(payload[1])
+            self.execute_command()
+            return
+        self.command_input.setFocus()
+        self.command_input.end(False)
+
+    def _counted(self, fn, *args):
+        """Задача для фонового потока: исключения выводятся в консоль,
+        результат — число ошибок, напечатанных задачей"""
+        def task():
+            errors_before = getattr(self._thread_errors, 'count', 0)
+            try:
+                fn(*args)
+            except Exception as e:
+                self.print_text(f"💥 Ошибка: {e}\n", self.error_color)
+            return getattr(self._thread_errors, 'count', 0) - errors_before
+        return self.bind_tab(task)
+
+    def _track(self, future):
+        # Команда сценария: поток сценария дождётся задачи и учтёт её ошибки
+        if self._script_tasks is not None and threading.current_thread() is threading.main_thread():
+            self._script_tasks.append(future)
+        return future
+
+    def run_in_background(self, fn, *args):
+        """Выполнение задачи в общем пуле потоков; -> Future с числом ошибок задачи"""
+        return self._track(self.worker_pool.submit(self._counted(fn, *args)))
+
+    def run_in_thread(self, fn, *args, callback, name="task"):
+        """fn в отдельном daemon-потоке (может надолго зависнуть на сети или
+        диске), затем callback(Future) там же; -> Future с числом ошибок"""
+        def work():
+            result = Future()
+            result.set_running_or_notify_cancel()
+            try:
+                result.set_result(fn(*args))
+            except Exception as e:
+                result.set_exception(e)
+            callback(result)
+        return self._track(run_in_daemon_thread(self._counted(work), name=name))
+
+    def print_text(self, text, color=None, tab=None):
+        """Вывод текста в консоль (можно вызывать из любого потока)"""
         if color is None:
             color = self.text_color
+        if color == self.error_color and text.strip():
+            # Ошибки, выведенные этим потоком, — признак неуспеха команды сценария
+            self._thread_errors.count = getattr(self._thread_errors, 'count', 0) + 1
+        if tab is None:
+            tab = self.context_tab()
+        if threading.current_thread() is not threading.main_thread():
+            self.text_requested.emit(text, QColor(color), tab)
+            return
+        if color == self.error_color and text.strip():
+            self.error_count += 1
+            logger.error(text.strip())
+        if self.headless:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        # Qt превращает \r и \r\n в отдельные блоки — приводим к \n,
+        # чтобы строки теневого буфера совпадали с блоками документа
+        if '\r' in text or '\u2029' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n').replace('\u2029', '\n')
+        if self.recorder is not None and self.recorder.tab is tab:
+            try:
+                self.recorder.write(text, color)
+            except OSError as e:
+                recorder, self.recorder = self.recorder, None
+                try:
+                    recorder.close()
+                except OSError:
+                    pass
+                self.print_text(f"❌ Запись остановлена, ошибка записи {recorder.path}: {e}\n",
+                                self.error_color, tab)
+
+        if tab.closed:
+            return
+        if tab is not self.tabs.currentWidget():
+            tab.buffer(text, QColor(color))
+            return
 
-        cursor = self.console_output.textCursor()
+        searching = self.search_frame.isVisible()
+        if searching:
+            # Во время поиска не уводим вид от текущего совпадения
+            cursor = QTextCursor(tab.document())
+        else:
+            cursor = tab.textCursor()
         cursor.movePosition(QTextCursor.End)
 
         text_format = QTextCharFormat()
@@ -1461,8 +6801,16 @@ class OptimizedConsoleWindow(QMainWindow):
         cursor.setCharFormat(text_format)
 
         cursor.insertText(text)
-        self.console_output.setTextCursor(cursor)
-        self.console_output.ensureCursorVisible()
+        tab.output_index.append(text)
+
+        if searching:
+            if tab.output_search.extend():
+                self._update_search_status()
+                self._update_search_highlights()
+            return
+
+        tab.setTextCursor(cursor)
+        tab.ensureCursorVisible()
 
     def show_help(self):
         """Показать справку"""
@@ -1491,6 +6839,26 @@ class OptimizedConsoleWindow(QMainWindow):
   • ip          - показать IP адреса
   • ping <host> - пинг хоста
   • monitor     - мониторинг системы
+  • speedtest [url] [потоки] - тест скорости (speedtest serve - локальный сервер)
+  • metrics [on [порт] | off] - эндпоинт /metrics для Prometheus
+  • alerts / alert add cpu > 90 2m / alert del N - оповещения по порогам
+  • autostart [disable|enable N] - записи автозагрузки
+  • mem [N] - процессы, занимающие больше всего памяти (USS/PSS)
+  • pstree [pid|имя] - дерево процессов
+  • dig / nslookup <имя...> [тип] [@сервер] - DNS-запросы (dig --cache, dig --flush)
+  • traceroute [-I] <host> - трассировка маршрута (все TTL параллельно)
+  • run <файл.ocs> [аргументы] - сценарий команд (set, on_error, parallel { })
+  • view <файл> - просмотр большого файла/вывода (вывод больше порога сохраняется в файл)
+  • search [-i] [-F] [-m N] <regex> [путь] - поиск текста по файлам (search stop)
+  • zip [-1..-9] <папка|файлы> [-o архив.zip] - архивация на всех ядрах (zip stop)
+  • unzip <архив.zip> [папка] - распаковка; backup [папка] - копия в data/backups
+  • watch - наблюдение за папками (inotify / ReadDirectoryChangesW / опрос)
+  • index add [путь] / index update / index remove <путь> - индекс файлов
+  • locate <шаблон> [--size >100MB] [--newer 2d] [--ext py] - поиск по индексу
+  • save [--html] <файл> - сохранить вывод вкладки (текст или HTML с цветами)
+  • record on [файл] / record off - запись вывода в сжатый файл .ocrec
+  • replay <файл> [скорость] - воспроизвести запись (replay s.ocrec 4; replay stop)
+  • kill [-SIG] [-y] <имя|шаблон|pid...> / killtree [-SIG] <pid> - завершение процессов
   • clear/cls   - очистить консоль
 
 📌 ГОРЯЧИЕ КЛАВИШИ:
@@ -1506,6 +6874,10 @@ class OptimizedConsoleWindow(QMainWindow):
   • F10 - безопасность
   • F11 - BIOS
   • F12 - оптимизация
+  • Ctrl+F - поиск по выводу (regex, подсветка всех совпадений)
+  • Tab - дополнение пути (повторный Tab - все варианты)
+  • Ctrl+P - палитра: команды, история, быстрые действия, недавние пути
+  • Ctrl+T / Ctrl+W - новая / закрыть вкладку (у каждой своя папка и история)
 
 ✨ ОСОБЕННОСТИ v11.0:
   • Все кнопки работают!
@@ -1519,14 +6891,29 @@ class OptimizedConsoleWindow(QMainWindow):
 
     def refresh_info(self):
         """Обновление информации"""
-        self.dir_label.setText(f"📁 {str(self.target_dir)[:50]}")
-        self.dir_label.setToolTip(str(self.target_dir))
+        self.remember_path(self.target_dir)
+        directory = str(self.target_dir)
+        # Дальше сводку держит актуальной наблюдатель за файлами, без повторного обхода
+        summary = self.folder_summaries.get(directory) or self.folder_summary(directory)
+        if summary is not None:
+            self.folder_summaries[directory] = summary
+        self.update_dir_label(self.context_tab())
+        if summary is not None:
+            files, folders, size = summary
+            self.print_text(f"📁 {directory}: файлов {files}, папок {folders}, {self.format_bytes(size)}\n",
+                            self.output_color)
         self.print_text(f"✅ Информация обновлена\n", self.success_color)
 
     def clear_console(self):
         """Очистка консоли"""
+        self.console_output.pending.clear()
         self.console_output.clear()
+        self.output_index.clear()
+        self.output_search.reset()
+        self.console_output.setExtraSelections([])
         self.print_text("🧹 Консоль очищена\n", self.success_color)
+        if self.search_frame.isVisible():
+            self.run_output_search()
 
     def execute_command(self):
         """Выполнение команды"""
@@ -1536,14 +6923,32 @@ class OptimizedConsoleWindow(QMainWindow):
         if not command:
             return
 
+        logger.info(f"Команда: {command}")
+        self.usage_stats.record_command()
+
         if command and (not self.command_history or self.command_history[-1] != command):
             self.command_history.append(command)
+            if len(self.command_history) > self.max_history:
+                del self.command_history[:-self.max_history]
         self.history_index = len(self.command_history)
 
         prompt_symbol = ">" if self.is_windows else "$"
         self.print_text(f"\n[{prompt_symbol}] ", self.prompt_color)
         self.print_text(f"{command}\n", QColor(255, 255, 200))
 
+        started = time.perf_counter()
+        errors_before = self.error_count
+        self._dispatch_tab = self.tabs.currentWidget()
+        self._stats_deferred = False
+        try:
+            self.dispatch_command(command)
+        finally:
+            self._dispatch_tab = None
+            if not self._stats_deferred:
+                self.command_stats.record(command, time.perf_counter() - started, self.error_count > errors_before)
+
+    def dispatch_command(self, command):
+        """Разбор и выполнение одной команды"""
         cmd_lower = command.lower()
         cmd_parts = command.split()
 
@@ -1554,8 +6959,66 @@ class OptimizedConsoleWindow(QMainWindow):
         elif cmd_lower in ["firewall", "брандмауэр"]:
             self.print_text("🔥 Используйте кнопку 'Безопасность' для инструментов брандмауэра\n", self.info_color)
             return
-        elif cmd_lower in ["speedtest", "speed", "скорость"]:
-            self.print_text("🌐 Тест скорости интернета в разработке...\n", self.info_color)
+        elif cmd_parts[0].lower() in ["speedtest", "speed", "скорость"]:
+            self.do_speedtest_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "metrics":
+            self.do_metrics_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() in ["alerts", "alert", "оповещения"]:
+            self.do_alerts_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() in ["nslookup", "dig"]:
+            self.do_dns_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "run":
+            self.do_run_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "view":
+            self.do_view_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "search" or (cmd_parts[0].lower() == "grep" and shutil.which("grep") is None):
+            # grep — псевдоним только там, где системного grep нет (Windows)
+            self.do_search_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() in ["zip", "backup"]:
+            self.do_zip_command(cmd_parts[0].lower(), cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "unzip":
+            self.do_unzip_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "watch":
+            self.do_watch_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "index":
+            self.do_index_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "locate":
+            self.do_locate_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "save":
+            self.do_save_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "record":
+            self.do_record_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "replay":
+            self.do_replay_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() in ["traceroute", "tracert"]:
+            self.do_traceroute_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() == "pstree":
+            self.do_pstree_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() in ["kill", "killtree"]:
+            self.do_kill_command(cmd_parts[0].lower(), cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() in ["mem", "память"]:
+            self.do_mem_command(cmd_parts[1:])
+            return
+        elif cmd_parts[0].lower() in ["autostart", "автозагрузка"]:
+            self.do_autostart_command(cmd_parts[1:])
             return
         elif cmd_lower in ["optimize", "оптимизация"]:
             self.show_optimization_tools()
@@ -1608,28 +7071,597 @@ class OptimizedConsoleWindow(QMainWindow):
             self.run_system_command(command)
 
     def do_ping_command(self, host):
-        """Выполнение команды ping"""
+        """Выполнение команды ping (адрес берётся из общего DNS-кэша)"""
         self.print_text(f"📡 Пинг {host}...\n", self.network_color)
 
+        def run():
+            try:
+                addresses = self.dns_resolver.resolve(host)
+                if not addresses:
+                    self.print_text(f"❌ Не удалось разрешить имя {host}\n", self.error_color)
+                    return
+                target = addresses[0]
+                if target != host:
+                    self.print_text(f"🔎 {host} → {target}\n", self.network_color)
+
+                param = '-n' if self.is_windows else '-c'
+                command = ['ping', param, '4', target]
+
+                result = subprocess.run(command, capture_output=True, text=True, timeout=10)
+
+                if result.returncode == 0:
+                    self.print_text("✅ Пинг успешен!\n", self.success_color)
+                    if result.stdout:
+                        self.print_text(result.stdout[:500] + "\n", self.text_color)
+                else:
+                    self.print_text(f"❌ Ошибка: {result.stderr or result.stdout}\n", self.error_color)
+            except subprocess.TimeoutExpired:
+                self.print_text("❌ Таймаут\n", self.error_color)
+            except Exception as e:
+                self.print_text(f"❌ Ошибка: {e}\n", self.error_color)
+
+        self.run_in_background(run)
+
+    def do_run_command(self, args):
+        """run <файл.ocs> [аргументы...]"""
+        if not args:
+            self.print_text("❌ Использование: run <файл.ocs> [аргументы...]\n", self.error_color)
+            return
+        path = Path(os.path.expanduser(args[0]))
+        if not path.is_absolute():
+            path = self.target_dir / path
+        if self._deferred_work is not None:
+            # run внутри сценария выполняется синхронно в потоке внешнего сценария
+            self._deferred_work.append(lambda: self.run_script(path, args[1:]))
+            return
+        future = run_in_daemon_thread(self.bind_tab(self.run_script), path, args[1:], name="script")
+        future.add_done_callback(lambda f: self.script_finished.emit(0 if f.exception() is None and f.result() else 1))
+
+    def run_script(self, path, args=()):
+        """Выполнение сценария (в фоновом потоке); -> True при успехе"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                steps = parse_script(f.read())
+        except (OSError, UnicodeDecodeError, ScriptError) as e:
+            self.print_text(f"❌ Сценарий {path.name}: {e}\n", self.error_color)
+            return False
+        logger.info(f"Сценарий: {path}")
+        self.print_text(f"📜 Сценарий {path.name}\n", self.info_color)
+
+        def on_step(number, command, parallel):
+            marker = "∥" if parallel else "▶"
+            self.print_text(f"\n{marker} [{number}] {command}\n", QColor(255, 255, 200))
+
+        started = time.perf_counter()
+        # Свой пул для parallel: команды блока сами занимают worker_pool и
+        # вложенные сценарии не должны ждать друг друга в общем пуле
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix="script") as executor:
+            runner = ScriptRunner(self.bind_tab(self.execute_script_command), executor, args, on_step)
+            try:
+                completed = runner.run(steps)
+            except ScriptError as e:
+                self.print_text(f"❌ {e}\n", self.error_color)
+                completed = False
+        elapsed = time.perf_counter() - started
+
+        failed = sum(1 for result in runner.results if not result[3])
+        summary = f"\n⏱️ ИТОГИ СЦЕНАРИЯ {path.name}: {len(runner.results)} команд за {elapsed:.2f} с"
+        summary += f", ошибок: {failed}\n" if failed else "\n"
+        for number, command, seconds, ok in runner.results:
+            summary += f"  {'✅' if ok else '❌'} {seconds:>8.2f} с  [{number}] {command}\n"
+        if not completed:
+            summary += "⛔ Сценарий остановлен после ошибки\n"
+        self.print_text(summary, self.success_color if completed and not failed else self.warning_color)
+        return completed and not failed
+
+    def execute_script_command(self, command):
+        """Одна команда сценария (из фонового потока); -> True при успехе"""
+        result = {'tab': self.context_tab()}
+        self.script_dispatch.emit(command, result)
+        ok = result.get('errors', 1) == 0
+        # Системные команды и вложенные сценарии выполняются здесь, параллельно с другими
+        for work in result.get('deferred', []):
+            errors_before = getattr(self._thread_errors, 'count', 0)
+            work_result = work()
+            ok = ok and getattr(self._thread_errors, 'count', 0) == errors_before and work_result is not False
+        # Фоновые задачи команды (ping, dig, search, zip...): успех — по их завершению
+        for future in result.get('tasks', []):
+            ok = future.result() == 0 and ok
+        return ok
+
+    def _dispatch_for_script(self, command, result):
+        """Разбор команды сценария в GUI-потоке (эхо команды печатает run_script)"""
+        self.usage_stats.record_command()
+        errors_before = getattr(self._thread_errors, 'count', 0)
+        started = time.perf_counter()
+        self._deferred_work = []
+        self._script_tasks = []
+        self._dispatch_tab = result['tab']
+        self._stats_deferred = False
+        try:
+            self.dispatch_command(command)
+        except Exception as e:
+            self.print_text(f"💥 Ошибка: {e}\n", self.error_color)
+        finally:
+            self._dispatch_tab = None
+            result['deferred'] = self._deferred_work
+            result['tasks'] = self._script_tasks
+            self._deferred_work = None
+            self._script_tasks = None
+            result['errors'] = getattr(self._thread_errors, 'count', 0) - errors_before
+            if not self._stats_deferred:
+                self.command_stats.record(command, time.perf_counter() - started, result['errors'] > 0)
+
+    def do_traceroute_command(self, args):
+        """traceroute [-I] [-m хопов] [-q проб] [-w секунд] <host>"""
+        options = {'max_hops': 30, 'probes': 3, 'timeout': 2.0, 'use_icmp': False}
+        host = None
+        try:
+            arguments = iter(args)
+            for arg in arguments:
+                if arg == "-I":
+                    options['use_icmp'] = True
+                elif arg == "-m":
+                    options['max_hops'] = max(1, min(64, int(next(arguments))))
+                elif arg == "-q":
+                    options['probes'] = max(1, min(10, int(next(arguments))))
+                elif arg == "-w":
+                    options['timeout'] = max(0.1, float(next(arguments)))
+                else:
+                    host = arg
+        except (StopIteration, ValueError):
+            host = None
+        if host is None:
+            self.print_text("❌ Использование: traceroute [-I] [-m хопов] [-q проб] [-w секунд] <host>\n",
+                            self.error_color)
+            return
+        logger.info(f"Инструмент: traceroute {host}")
+
+        def print_ptr(address, future):
+            try:
+                names = [record['value'] for record in future.result()['records'] if record['type'] == 'PTR']
+            except Exception:
+                return
+            if names:
+                self.print_text(f"   ↳ {address} = {names[0].rstrip('.')}\n", self.output_color)
+
+        resolved = set()
+
+        def on_hop(hop):
+            rtts = [rtt for rtt in hop['rtts'] if rtt is not None]
+            if not rtts:
+                self.print_text(f"{hop['ttl']:>3}  {' '.join('*' * len(hop['rtts']))}\n", self.output_color)
+                return
+            stats = f"{min(rtts):.2f} / {sum(rtts) / len(rtts):.2f} / {max(rtts):.2f} мс"
+            lost = len(hop['rtts']) - len(rtts)
+            self.print_text(f"{hop['ttl']:>3}  {hop['address']:<40} {stats}"
+                            f"{f'  потеряно {lost}' if lost else ''} {hop['note']}\n", self.network_color)
+            # Обратные DNS-имена приходят позже отдельными строками и не задерживают хопы
+            if hop['address'] not in resolved:
+                resolved.add(hop['address'])
+                future = self.worker_pool.submit(self.dns_resolver.query, hop['address'], 'PTR')
+                future.add_done_callback(self.bind_tab(lambda f, address=hop['address']: print_ptr(address, f)))
+
+        def run():
+            addresses = self.dns_resolver.resolve(host)
+            if not addresses:
+                self.print_text(f"❌ Не удалось разрешить имя {host}\n", self.error_color)
+                return
+            self.print_text(f"🛰️ Трассировка {host} ({addresses[0]}), до {options['max_hops']} хопов, "
+                            f"{'ICMP' if options['use_icmp'] else 'UDP'}:\n", self.network_color)
+            started = time.perf_counter()
+            tracer = Traceroute(addresses[0], on_hop=on_hop, **options)
+            try:
+                hops = tracer.run()
+            except PermissionError:
+                self.print_text("❌ Недостаточно прав для отправки проб (запустите от администратора)\n",
+                                self.error_color)
+                return
+            except OSError as e:
+                self.print_text(f"❌ Трассировка не удалась: {e}\n", self.error_color)
+                return
+            reached = "цель достигнута" if tracer.destination_ttl else "цель не достигнута"
+            self.print_text(f"✅ {len(hops)} хопов за {time.perf_counter() - started:.2f} с, {reached}\n",
+                            self.success_color)
+
+        self.run_in_background(run)
+
+    def do_dns_command(self, args):
+        """nslookup|dig <имя...> [тип] [@сервер] | dig --cache | dig --flush"""
+        if args and args[0] == "--flush":
+            self.dns_resolver.flush()
+            self.print_text("🧹 DNS-кэш очищен\n", self.success_color)
+            return
+        if args and args[0] == "--cache":
+            entries = self.dns_resolver.cache_entries()
+            report = (f"🗂️ DNS-КЭШ: {len(entries)} записей, попаданий {self.dns_resolver.hits}, "
+                      f"промахов {self.dns_resolver.misses}\n")
+            for (name, qtype, server), ttl in sorted(entries, key=lambda item: (item[0][:2], item[0][2] or '')):
+                report += f"  {name:<40} {qtype:<6} ещё {ttl} с{f' @{server}' if server else ''}\n"
+            self.print_text(report, self.network_color)
+            return
+
+        qtype = 'A'
+        server = None
+        names = []
+        for arg in args:
+            if arg.startswith('@'):
+                server = arg[1:]
+            elif arg.upper() in DnsResolver.TYPES:
+                qtype = arg.upper()
+            else:
+                names.append(arg)
+        if not names:
+            self.print_text("❌ Использование: dig <имя...> [A|AAAA|MX|TXT|NS|CNAME|PTR|SOA|SRV] [@сервер]\n",
+                            self.error_color)
+            return
+        logger.info(f"Инструмент: DNS {qtype} {' '.join(names)}")
+
+        def report(future):
+            for name, result in future.result():
+                if isinstance(result, Exception):
+                    self.print_text(f"❌ {name}: {result}\n", self.error_color)
+                    continue
+                source = "кэш" if result['cached'] else f"{result['server']}, {result['ms']:.0f} мс"
+                text = f"🔎 {name} {result['type']}: {result['status']} ({source})\n"
+                for record in result['records']:
+                    text += f"  {record['name']:<35} {record['ttl']:>7}  {record['type']:<6} {record['value']}\n"
+                self.print_text(text, self.network_color if result['records'] else self.warning_color)
+
+        # Разбор имён раздаётся в worker_pool, ожидание — в отдельном потоке
+        self.run_in_thread(self.dns_resolver.query_many, names, qtype, server, callback=report, name="dns-query")
+
+    def do_speedtest_command(self, args):
+        """speedtest [url] [потоки] | speedtest serve [порт] | speedtest stop"""
+        options = self.app_config.get('speedtest', {})
+
+        if args and args[0].lower() == "serve":
+            if self.speedtest_server is not None:
+                port = self.speedtest_server.server_address[1]
+                self.print_text(f"ℹ️ Сервер уже запущен: http://127.0.0.1:{port}\n", self.info_color)
+                return
+            try:
+                port = int(args[1]) if len(args) > 1 else 8765
+                self.speedtest_server = SpeedTestServer(port)
+            except (ValueError, OSError) as e:
+                self.print_text(f"❌ Не удалось запустить сервер: {e}\n", self.error_color)
+                return
+            port = self.speedtest_server.server_address[1]
+            self.print_text(f"✅ Локальный сервер speedtest: http://127.0.0.1:{port}\n"
+                            f"   Проверка: speedtest http://127.0.0.1:{port}\n", self.success_color)
+            return
+        if args and args[0].lower() == "stop":
+            if self.speedtest_server is not None:
+                self.speedtest_server.shutdown()
+                self.speedtest_server.server_close()
+                self.speedtest_server = None
+                self.print_text("✅ Сервер speedtest остановлен\n", self.success_color)
+            return
+
+        url = args[0] if args else options.get('url', 'https://speed.cloudflare.com')
+        try:
+            streams = int(args[1]) if len(args) > 1 else int(options.get('streams', 4))
+        except ValueError:
+            self.print_text("❌ Использование: speedtest [url] [потоки] | speedtest serve [порт]\n", self.error_color)
+            return
+
+        tester = SpeedTester(url, streams=streams,
+                             duration=float(options.get('duration', 8)),
+                             warmup=float(options.get('warmup', 2)),
+                             progress=lambda text: self.print_text(text, self.output_color))
+        self.print_text(f"🌐 Тест скорости: {url} ({streams} потоков, {tester.duration:.0f} с на фазу)...\n",
+                        self.network_color)
+        logger.info(f"Инструмент: speedtest {url}")
+
+        def run_test():
+            try:
+                result = tester.run()
+            except (OSError, http.client.HTTPException) as e:
+                self.print_text(f"❌ Тест скорости не удался: {e}\n", self.error_color)
+                return
+            report = "📊 РЕЗУЛЬТАТ ТЕСТА СКОРОСТИ:\n"
+            report += f"  Задержка:   {result['latency_avg']:.1f} мс (мин {result['latency_min']:.1f} мс)\n"
+            report += f"  Джиттер:    {result['jitter']:.1f} мс\n"
+            report += f"  Скачивание: {result['download_mbps']:.1f} Mbps ({self.format_bytes(result['download_bytes'])})\n"
+            report += f"  Загрузка:   {result['upload_mbps']:.1f} Mbps ({self.format_bytes(result['upload_bytes'])})\n"
+            self.print_text(report, self.success_color)
+            logger.info(f"speedtest: ⬇ {result['download_mbps']:.1f} Mbps, ⬆ {result['upload_mbps']:.1f} Mbps, "
+                        f"{result['latency_avg']:.1f} мс")
+
+        self.run_in_background(run_test)
+
+    def start_metrics_server(self, port=9464, host="127.0.0.1"):
+        """Запуск эндпоинта /metrics"""
+        if self.metrics_server is not None:
+            if self.metrics_server.server_address[:2] == (host, port):
+                return
+            self.stop_metrics_server()
         try:
-            param = '-n' if self.is_windows else '-c'
-            command = ['ping', param, '4', host]
+            self.metrics_server = MetricsServer(self.metrics_exporter, port, host)
+        except OSError as e:
+            self.print_text(f"❌ Не удалось открыть /metrics на {host}:{port}: {e}\n", self.error_color)
+            return
+        self.monitor_sampler.start()
+        host, port = self.metrics_server.server_address[:2]
+        self.print_text(f"📈 Метрики Prometheus: http://{host}:{port}/metrics\n", self.info_color)
+        logger.info(f"Эндпоинт метрик запущен на {host}:{port}")
+
+    def stop_metrics_server(self):
+        if self.metrics_server is None:
+            return
+        self.metrics_server.stop()
+        self.metrics_server = None
+        self.print_text("📈 Эндпоинт метрик остановлен\n", self.info_color)
+        logger.info("Эндпоинт метрик остановлен")
+
+    def do_metrics_command(self, args):
+        """metrics [on [порт] | off]"""
+        if not args:
+            if self.metrics_server is None:
+                self.print_text("📈 Эндпоинт метрик выключен (metrics on [порт])\n", self.info_color)
+            else:
+                host, port = self.metrics_server.server_address[:2]
+                self.print_text(f"📈 Метрики: http://{host}:{port}/metrics\n", self.info_color)
+            return
+        if args[0].lower() == "on":
+            try:
+                port = int(args[1]) if len(args) > 1 else int(self.app_config.get('metrics', {}).get('port', 9464))
+            except ValueError:
+                self.print_text("❌ Использование: metrics on [порт]\n", self.error_color)
+                return
+            self.start_metrics_server(port, self.app_config.get('metrics', {}).get('host', '127.0.0.1'))
+        elif args[0].lower() == "off":
+            self.stop_metrics_server()
+        else:
+            self.print_text("❌ Использование: metrics [on [порт] | off]\n", self.error_color)
+
+    def load_alert_rules(self, entries):
+        """Правила оповещений из секции alerts"""
+        rules = []
+        for entry in entries:
+            try:
+                rules.append(AlertRule.from_config(entry))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Пропущено правило оповещения {entry}: {e}")
+        self.alert_engine.set_rules(rules)
+        self._update_alert_label()
+        if rules:
+            self.monitor_sampler.start()
+
+    def _emit_alert(self, kind, rule, value):
+        """Вызывается в потоке сэмплера"""
+        self.alert_event.emit(kind, f"{rule.name} (сейчас {self._format_alert_value(rule.metric, value)})")
 
-            result = subprocess.run(command, capture_output=True, text=True, timeout=10)
+    @staticmethod
+    def _format_alert_value(metric, value):
+        if metric.startswith('disk_free'):
+            return f"{value / 1024 ** 3:.1f} GB"
+        if metric in AlertEngine.RATE_METRICS:
+            return f"{value / 1024 ** 2:.1f} MB/s"
+        return f"{value:.1f}%"
+
+    def on_alert_event(self, kind, message):
+        """Событие оповещения в GUI-потоке: консоль, статус бар, трей"""
+        if kind == 'firing':
+            logger.warning(f"Оповещение: {message}")
+            self.print_text(f"🚨 Оповещение: {message}\n", self.warning_color)
+            title = "🚨 Оповещение"
+        else:
+            logger.info(f"Оповещение снято: {message}")
+            self.print_text(f"✅ Оповещение снято: {message}\n", self.success_color)
+            title = "✅ Оповещение снято"
+        self._update_alert_label()
+
+        if self.features.get('notifications', False) and QSystemTrayIcon.isSystemTrayAvailable():
+            if self.tray_icon is None:
+                self.tray_icon = QSystemTrayIcon(EmbeddedLogo.get_logo_icon(), self)
+                self.tray_icon.show()
+            self.tray_icon.showMessage(title, message, QSystemTrayIcon.Warning, 5000)
+
+    def _update_alert_label(self):
+        count = self.alert_engine.firing_count()
+        self.alert_label.setText(f"🚨 Активных оповещений: {count}" if count else "")
+        self.alert_label.setStyleSheet(f"color: {self.warning_color.name()};")
+
+    def do_alerts_command(self, args):
+        """alerts | alert add <метрика> <оп> <порог> [длительность] [гистерезис] | alert del <N>"""
+        if not args or args[0].lower() == "list":
+            if not self.alert_engine.rules:
+                self.print_text("🔔 Правил оповещений нет (alert add cpu > 90 2m)\n", self.info_color)
+                return
+            self.print_text("🔔 ПРАВИЛА ОПОВЕЩЕНИЙ:\n", self.info_color)
+            for number, rule in enumerate(self.alert_engine.rules, 1):
+                state = "🚨 сработало" if rule.firing else ("⏳ ожидание" if rule.pending_since else "✅ норма")
+                current = "" if rule.value is None else f", сейчас {self._format_alert_value(rule.metric, rule.value)}"
+                self.print_text(f"  {number}. {rule.name} за {rule.duration:.0f} с — {state}{current}\n",
+                                self.warning_color if rule.firing else self.output_color)
+            return
+        action = args[0].lower()
+        if action == "add" and len(args) >= 4:
+            try:
+                rule = AlertRule(args[1], args[2], args[3],
+                                 args[4] if len(args) > 4 else 0,
+                                 args[5] if len(args) > 5 else 0)
+            except ValueError as e:
+                self.print_text(f"❌ {e}\n", self.error_color)
+                return
+            self.alert_engine.add_rule(rule)
+            self.monitor_sampler.start()
+            self.print_text(f"🔔 Добавлено правило: {rule.name}\n", self.success_color)
+        elif action in ("del", "remove") and len(args) == 2:
+            try:
+                rule = self.alert_engine.remove_rule(int(args[1]) - 1)
+            except (ValueError, IndexError):
+                self.print_text("❌ Нет правила с таким номером\n", self.error_color)
+                return
+            self._update_alert_label()
+            self.print_text(f"🗑️ Удалено правило: {rule.name}\n", self.info_color)
+        else:
+            self.print_text("❌ Использование: alerts | alert add <метрика> <оп> <порог> [длительность] [гистерезис] | alert del <N>\n",
+                            self.error_color)
+
+    def do_pstree_command(self, args):
+        """pstree [pid | имя]"""
+        roots = None
+        if args:
+            roots = [proc.pid for proc in ProcessTools.find(args)]
+            if not roots:
+                self.print_text(f"❌ Процессы не найдены: {' '.join(args)}\n", self.error_color)
+                return
+        lines = ProcessTools.format_tree(roots)
+        self.print_text(f"🌳 ДЕРЕВО ПРОЦЕССОВ ({len(lines)}):\n" + "\n".join(lines) + "\n", self.output_color)
+
+    def do_kill_command(self, command, args):
+        """kill [-SIG] [-y] <имя|шаблон|pid...> | killtree [-SIG] <pid>"""
+        sig = signal.SIGTERM
+        confirmed = False
+        while args and args[0].startswith('-'):
+            if args[0] == "-y":
+                confirmed = True
+            else:
+                try:
+                    sig = ProcessTools.parse_signal(args[0])
+                except ValueError as e:
+                    self.print_text(f"❌ {e}\n", self.error_color)
+                    return
+            args = args[1:]
+        if not args or (command == "killtree" and (len(args) != 1 or not args[0].isdigit())):
+            self.print_text("❌ Использование: kill [-SIG] [-y] <имя|шаблон|pid...> | killtree [-SIG] <pid>\n",
+                            self.error_color)
+            return
 
-            if result.returncode == 0:
-                self.print_text("✅ Пинг успешен!\n", self.success_color)
-                if result.stdout:
-                    self.print_text(result.stdout[:500] + "\n", self.text_color)
+        def run():
+            started = time.perf_counter()
+            if command == "killtree":
+                try:
+                    gone, alive, errors = ProcessTools.kill_tree(int(args[0]), sig)
+                except psutil.NoSuchProcess:
+                    self.print_text(f"❌ Нет процесса с PID {args[0]}\n", self.error_color)
+                    return
+                except PermissionError as e:
+                    self.print_text(f"❌ {e}\n", self.error_color)
+                    return
             else:
-                self.print_text(f"❌ Ошибка: {result.stderr}\n", self.error_color)
-        except subprocess.TimeoutExpired:
-            self.print_text("❌ Таймаут\n", self.error_color)
+                procs = ProcessTools.find(args)
+                if not procs:
+                    self.print_text(f"❌ Процессы не найдены: {' '.join(args)}\n", self.error_color)
+                    return
+                if len(procs) > 1 and not confirmed:
+                    listing = "\n".join(f"  {proc.pid:>7}  {proc.info['name']}" for proc in procs[:30])
+                    more = f"\n  ...и ещё {len(procs) - 30}" if len(procs) > 30 else ""
+                    self.print_text(f"⚠️ Под запрос подходят {len(procs)} процессов:\n{listing}{more}\n"
+                                    f"   Для отправки {sig.name} всем повторите с -y: "
+                                    f"{command} -{sig.name} -y {' '.join(args)}\n", self.warning_color)
+                    return
+                gone, alive, errors = ProcessTools.send_batch(procs, sig)
+            elapsed = time.perf_counter() - started
+            logger.info(f"{command} {sig.name}: {len(gone)} ок, {len(alive)} живы, {len(errors)} ошибок")
+            self.print_text(f"⚡ {sig.name}: {len(gone)} процессов за {elapsed:.2f} с\n", self.success_color)
+            if alive:
+                self.print_text(f"⚠️ Не завершились: {', '.join(str(proc.pid) for proc in alive[:20])}\n",
+                                self.warning_color)
+            for proc, error in errors[:10]:
+                self.print_text(f"❌ PID {proc.pid}: {error}\n", self.error_color)
+            if len(errors) > 10:
+                self.print_text(f"❌ ...и ещё {len(errors) - 10} ошибок\n", self.error_color)
+
+        self.run_in_background(run)
+
+    def do_mem_command(self, args):
+        """mem [N] — топ процессов по USS/PSS"""
+        try:
+            limit = max(1, int(args[0])) if args else 15
+        except ValueError:
+            self.print_text("❌ Использование: mem [количество]\n", self.error_color)
+            return
+        logger.info("Инструмент: память процессов")
+        self.print_text("🧠 Анализ памяти процессов...\n", self.info_color)
+        # Ожидание результатов пула — в отдельном потоке, чтобы не занимать рабочий
+        self.run_in_thread(self.memory_report.collect, limit, callback=self._print_mem_report, name="mem-report")
+
+    def _print_mem_report(self, future):
+        try:
+            rows, total = future.result()
+        except Exception as e:
+            self.print_text(f"❌ Ошибка анализа памяти: {e}\n", self.error_color)
+            return
+        memory = psutil.virtual_memory()
+
+        def size(value):
+            return self.format_bytes(value) if value is not None else "—"
+
+        report = (f"🧠 ПАМЯТЬ ПРОЦЕССОВ (топ {len(rows)} из {total}, "
+                  f"занято {memory.percent}% из {self.format_bytes(memory.total)}):\n")
+        report += f"  {'PID':>7}  {'USS':>10}  {'PSS':>10}  {'RSS':>10}  {'SWAP':>10}  ИМЯ\n"
+        for row in rows:
+            report += (f"  {row['pid']:>7}  {size(row['uss']):>10}  {size(row['pss']):>10}  "
+                       f"{size(row['rss']):>10}  {size(row['swap']):>10}  {row['name']}\n")
+        report += "💡 USS — память, освобождаемая при завершении процесса; PSS учитывает долю общих библиотек\n"
+        self.print_text(report, self.output_color)
+
+    def do_autostart_command(self, args):
+        """autostart | autostart disable <N> | autostart enable <N>"""
+        if not args:
+            logger.info("Инструмент: автозагрузка")
+            self.print_text("🚀 Сканирую автозагрузку...\n", self.info_color)
+            # Внешняя задача в отдельном потоке: сам скан раздаёт разбор файлов в worker_pool
+            self.run_in_thread(self.startup_analyzer.scan, callback=self._print_autostart, name="autostart-scan")
+            return
+        action = args[0].lower()
+        if action not in ("disable", "enable") or len(args) != 2:
+            self.print_text("❌ Использование: autostart | autostart disable <N> | autostart enable <N>\n",
+                            self.error_color)
+            return
+        try:
+            entry = self.autostart_entries[int(args[1]) - 1]
+        except (ValueError, IndexError):
+            self.print_text("❌ Нет записи с таким номером (сначала выполните autostart)\n", self.error_color)
+            return
+        enabled = action == "enable"
+        try:
+            self.startup_analyzer.set_enabled(entry, enabled)
+        except (OSError, subprocess.SubprocessError) as e:
+            self.print_text(f"❌ Не удалось изменить запись: {e}\n", self.error_color)
+            return
+        logger.info(f"Автозагрузка: {entry['name']} -> {'вкл' if enabled else 'выкл'}")
+        self.print_text(f"{'✅ Включено' if enabled else '⛔ Отключено'}: {entry['name']}\n", self.success_color)
+
+    def _print_autostart(self, future):
+        """Вызывается в потоке скана, вывод через print_text"""
+        try:
+            entries = future.result()
         except Exception as e:
-            self.print_text(f"❌ Ошибка: {e}\n", self.error_color)
+            self.print_text(f"❌ Ошибка сканирования автозагрузки: {e}\n", self.error_color)
+            return
+        self.autostart_entries = entries
+        if not entries:
+            self.print_text("🚀 Записей автозагрузки не найдено\n", self.info_color)
+            return
+        sources = {'xdg': 'XDG', 'systemd': 'systemd', 'registry': 'Реестр'}
+        report = f"🚀 АВТОЗАГРУЗКА ({len(entries)} записей):\n"
+        for number, entry in enumerate(entries, 1):
+            size = self.format_bytes(entry['size']) if entry['size'] is not None else "—"
+            cost = f"{entry['start_cost']:.2f} с" if entry['start_cost'] is not None else "—"
+            report += (f"  {number:>2}. {'✅' if entry['enabled'] else '⛔'} [{sources[entry['source']]}] "
+                       f"{entry['name']}\n"
+                       f"      {entry['binary'] or entry['command']} | размер: {size} | запуск: {cost}\n")
+        report += "💡 autostart disable <N> — отключить запись, autostart enable <N> — включить\n"
+        self.print_text(report, self.output_color)
 
     def run_system_command(self, command):
         """Выполнение системной команды"""
+        if threading.current_thread() is threading.main_thread():
+            # Длительность и ошибку процесса запишет поток, который его дождётся
+            self._stats_deferred = True
+            if self._deferred_work is not None:
+                # Команда сценария: процесс запустит поток сценария, а не GUI-поток
+                self._deferred_work.append(lambda: self.run_system_command(command))
+            else:
+                # Вывод читается потоково и может быть гигабайтным — не держим GUI-поток
+                self.run_in_background(self.run_system_command, command)
+            return
+        started = time.perf_counter()
+        failed = True
         try:
             if self.is_windows:
                 target_path = str(self.target_dir)
@@ -1639,7 +7671,6 @@ class OptimizedConsoleWindow(QMainWindow):
                 full_command = f'cd /d {target_path} && {command}'
                 shell_cmd = ["cmd.exe", "/c", full_command]
             else:
-                import shlex
                 target_path = shlex.quote(str(self.target_dir))
                 full_command = f'cd {target_path} && {command}'
                 shell_cmd = ["/bin/bash", "-c", full_command]
@@ -1650,20 +7681,41 @@ class OptimizedConsoleWindow(QMainWindow):
                 shell_cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                stdin=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True,
-                encoding='utf-8'
+                stdin=subprocess.DEVNULL
             )
 
-            output, error = process.communicate()
-
-            if output:
-                self.print_text(output, self.text_color)
-            if error:
-                self.print_text(error, self.error_color)
-
+            # Сверх порога вывод уходит во временный файл, а не в QTextEdit
+            threshold = int(float(self.app_config.get('output', {}).get('spill_threshold_mb', 4)) * 1024 ** 2)
+            output, error = OutputSpool(threshold), OutputSpool(threshold)
+
+            def pump(stream, spool):
+                read = stream.read1
+                while True:
+                    data = read(256 * 1024)
+                    if not data:
+                        break
+                    spool.write(data)
+                spool.close()
+
+            error_reader = threading.Thread(target=pump, args=(process.stderr, error), daemon=True)
+            error_reader.start()
+            pump(process.stdout, output)
+            error_reader.join()
+            process.wait()
+
+            for spool, color in ((output, self.text_color), (error, self.error_color)):
+                if spool.spilled:
+                    self.spill_files.append(spool.path)
+                    self.print_text(f"📄 Вывод слишком большой ({self.format_bytes(spool.size)}), "
+                                    f"сохранён в файл: {spool.path}\n"
+                                    f"   Открыть снова: view {spool.path}\n", self.output_color)
+                    if not self.headless:
+                        self.spill_ready.emit(str(spool.path), command)
+                elif spool.size:
+                    self.print_text(spool.getvalue().decode('utf-8', 'replace'), color)
+
+            logger.info(f"Системная команда завершена с кодом {process.returncode}: {command}")
+            failed = process.returncode != 0
             if process.returncode == 0:
                 self.print_text(f"✅ Команда выполнена\n", self.success_color)
             else:
@@ -1671,6 +7723,506 @@ class OptimizedConsoleWindow(QMainWindow):
 
         except Exception as e:
             self.print_text(f"💥 Ошибка: {e}\n", self.error_color)
+        finally:
+            self.command_stats.record(command, time.perf_counter() - started, failed)
+
+    def show_spill_viewer(self, path, title=None):
+        """Открытие виртуального просмотра большого файла"""
+        try:
+            dialog = SpillViewerDialog(self, path, title or Path(path).name)
+        except OSError as e:
+            self.print_text(f"❌ Не удалось открыть файл: {e}\n", self.error_color)
+            return
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.show()
+
+    def resolve_user_path(self, name):
+        """Путь из аргумента команды относительно текущей папки вкладки"""
+        path = Path(name).expanduser()
+        if not path.is_absolute():
+            path = self.target_dir / path
+        return path
+
+    def do_save_command(self, args):
+        """save [--html] <файл> — выгрузка вывода текущей вкладки"""
+        as_html = "--html" in args
+        names = [arg for arg in args if arg != "--html"]
+        if not names:
+            self.print_text("❌ Использование: save [--html] <файл.txt|файл.html>\n", self.error_color)
+            return
+        path = self.resolve_user_path(" ".join(names))
+        as_html = as_html or path.suffix.lower() in (".html", ".htm")
+        tab = self.context_tab()
+        self.flush_tab(tab)
+        start = time.perf_counter()
+        try:
+            with open(path, 'w', encoding='utf-8', newline='\n') as stream:
+                lines = write_transcript(tab.document(), stream, as_html)
+        except OSError as e:
+            self.print_text(f"❌ Не удалось сохранить: {e}\n", self.error_color)
+            return
+        kind = "HTML" if as_html else "текст"
+        self.print_text(f"💾 Сохранено ({kind}, строк: {lines}, {self.format_bytes(path.stat().st_size)}) "
+                        f"за {time.perf_counter() - start:.2f} с: {path}\n", self.success_color)
+
+    def do_record_command(self, args):
+        """record [on [файл]|off] — запись вывода вкладки в сжатый файл"""
+        action = args[0].lower() if args else "status"
+        if action in ("on", "start"):
+            if self.recorder is not None:
+                self.print_text(f"⚠️ Запись уже идёт: {self.recorder.path}\n", self.error_color)
+                return
+            if len(args) > 1:
+                path = self.resolve_user_path(" ".join(args[1:]))
+            else:
+                path = self.target_dir / f"session_{datetime.now():%Y%m%d_%H%M%S}.ocrec"
+            try:
+                self.recorder = SessionRecorder(path, self.context_tab())
+            except OSError as e:
+                self.print_text(f"❌ Не удалось начать запись: {e}\n", self.error_color)
+                return
+            self.print_text(f"⏺️ Запись вывода вкладки: {path}\n", self.success_color)
+        elif action in ("off", "stop"):
+            if self.recorder is None:
+                self.print_text("ℹ️ Запись не ведётся\n", self.output_color)
+                return
+            recorder, self.recorder = self.recorder, None
+            recorder.close()
+            self.print_text(f"⏹️ Запись остановлена: {recorder.path} (событий: {recorder.events}, "
+                            f"{self.format_bytes(recorder.path.stat().st_size)})\n"
+                            f"   Воспроизвести: replay {recorder.path}\n", self.success_color)
+        elif self.recorder is not None:
+            self.print_text(f"⏺️ Идёт запись: {self.recorder.path} (событий: {self.recorder.events})\n",
+                            self.output_color)
+        else:
+            self.print_text("ℹ️ Запись не ведётся. Использование: record on [файл] / record off\n",
+                            self.output_color)
+
+    def do_replay_command(self, args):
+        """replay <файл> [скорость] — воспроизведение записи сессии"""
+        if args and args[0].lower() == "stop":
+            for stop in list(self.replay_stops):
+                stop.set()
+            return
+        if not args:
+            self.print_text("❌ Использование: replay <файл.ocrec> [скорость, напр. 2 или 0.5] / replay stop\n",
+                            self.error_color)
+            return
+        speed = 1.0
+        if len(args) > 1:
+            try:
+                speed = float(args[-1].lower().lstrip('x'))
+                args = args[:-1]
+            except ValueError:
+                pass
+        if speed <= 0:
+            self.print_text("❌ Скорость должна быть больше нуля\n", self.error_color)
+            return
+        path = self.resolve_user_path(" ".join(args))
+        if not path.is_file():
+            self.print_text(f"❌ Файл не найден: {path}\n", self.error_color)
+            return
+        stop = threading.Event()
+        self.replay_stops.add(stop)
+
+        def replay():
+            self.print_text(f"▶️ Воспроизведение {path.name} (x{speed:g})\n", self.output_color)
+            events = 0
+            try:
+                for delay, color, text in SessionRecorder.read(path):
+                    # Долгие паузы сессии (ожидание ввода) сокращаются до 2 с
+                    if stop.wait(min(delay / speed, 2.0)):
+                        self.print_text("⏹️ Воспроизведение остановлено\n", self.output_color)
+                        return
+                    self.print_text(text, color)
+                    events += 1
+            finally:
+                self.replay_stops.discard(stop)
+            self.print_text(f"⏹️ Воспроизведение завершено (событий: {events})\n", self.output_color)
+
+        self.run_in_background(replay)
+
+    def do_search_command(self, args):
+        """search [-i] [-F] [-m N] <regex> [путь] — поиск по файлам"""
+        if args and args[0].lower() == "stop":
+            self.search_stop.set()
+            return
+        flags, fixed, limit, positional = 0, False, 1000, []
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if arg == "-i":
+                flags |= re.IGNORECASE
+            elif arg == "-F":
+                fixed = True
+            elif arg == "-m" and args:
+                try:
+                    limit = max(1, int(args.pop(0)))
+                except ValueError:
+                    self.print_text("❌ -m: нужно число\n", self.error_color)
+                    return
+            else:
+                positional.append(arg)
+        if not positional:
+            self.print_text("❌ Использование: search [-i] [-F] [-m N] <regex> [путь] / search stop\n",
+                            self.error_color)
+            return
+        text = positional[0]
+        try:
+            pattern = re.compile((re.escape(text) if fixed else text).encode('utf-8'), flags | re.MULTILINE)
+        except re.error as e:
+            self.print_text(f"❌ Ошибка в выражении: {e}\n", self.error_color)
+            return
+        root = self.resolve_user_path(" ".join(positional[1:])) if len(positional) > 1 else self.target_dir
+        if not root.exists():
+            self.print_text(f"❌ Путь не найден: {root}\n", self.error_color)
+            return
+        self.search_stop = stop = threading.Event()
+
+        def on_file(path, found):
+            self.print_text(f"📄 {path}\n", self.output_color)
+            self.print_text("".join(f"  {number}: {line}\n" for number, line in found), self.text_color)
+
+        def search():
+            self.print_text(f"🔎 Поиск «{text}» в {root}\n", self.output_color)
+            start = time.perf_counter()
+            result = TextSearch(pattern, root, on_file, max_matches=limit, stop_event=stop).run()
+            elapsed = time.perf_counter() - start
+            if result.truncated:
+                self.print_text(f"⚠️ Показаны первые {limit} совпадений (search -m N)\n", self.output_color)
+            elif stop.is_set():
+                self.print_text("⏹️ Поиск остановлен\n", self.output_color)
+            skipped = f", двоичных пропущено: {result.binary}" if result.binary else ""
+            errors = f", недоступно: {result.errors}" if result.errors else ""
+            self.print_text(f"✅ Совпадений: {result.matches} в {result.matched_files} файлах; "
+                            f"просмотрено {result.files} файлов ({self.format_bytes(result.bytes)}) "
+                            f"за {elapsed:.2f} с{skipped}{errors}\n", self.success_color)
+
+        self.run_in_background(search)
+
+    def get_file_index(self, create=False):
+        """Индекс файлов; база создаётся только по команде index add"""
+        if self.file_index is None:
+            path = DATA_DIR / "file_index.db"
+            if not create and not path.exists():
+                return None
+            self.file_index = FileIndex(path)
+        return self.file_index
+
+    def update_file_index(self, quiet=False):
+        """Инкрементальное обновление индекса в фоне"""
+        index = self.get_file_index()
+        if index is None or index.updating or not index.roots():
+            return
+
+        def update():
+            start = time.perf_counter()
+            stats = index.update(self.index_stop)
+            self.flush_index_backlog()
+            if stats is not None and not quiet:
+                self.print_text(f"✅ Индекс обновлён за {time.perf_counter() - start:.2f} с: папок {stats['dirs']}, "
+                                f"перечитано {stats['scanned']}, файлов в них {stats['files']}, "
+                                f"удалено папок {stats['removed']}\n", self.success_color)
+
+        self.run_in_background(update)
+
+    def do_index_command(self, args):
+        """index [add [путь]|remove <путь>|update] — индекс файлов для locate"""
+        action = args[0].lower() if args else "status"
+        if action == "add":
+            path = self.resolve_user_path(" ".join(args[1:])) if len(args) > 1 else self.target_dir
+            if not path.is_dir():
+                self.print_text(f"❌ Папка не найдена: {path}\n", self.error_color)
+                return
+            self.get_file_index(create=True).add_root(path.resolve())
+            self.sync_watches()
+            self.print_text(f"📇 Папка добавлена в индекс: {path.resolve()}\n", self.success_color)
+            self.update_file_index()
+            return
+        index = self.get_file_index()
+        if index is None:
+            self.print_text("ℹ️ Индекс не создан. Использование: index add [путь]\n", self.output_color)
+            return
+        if action == "remove" and len(args) > 1:
+            path = self.resolve_user_path(" ".join(args[1:])).resolve()
+            if index.remove_root(path):
+                self.sync_watches()
+                self.print_text(f"🗑️ Папка удалена из индекса: {path}\n", self.success_color)
+            else:
+                self.print_text(f"❌ Папки нет среди корней индекса: {path}\n", self.error_color)
+        elif action == "update":
+            if index.updating:
+                self.print_text("ℹ️ Индекс уже обновляется\n", self.output_color)
+            else:
+                self.update_file_index()
+        else:
+            dirs, files, total = index.counts()
+            lines = [f"📇 ИНДЕКС ФАЙЛОВ ({index.path}, {self.format_bytes(index.path.stat().st_size)}):",
+                     f"  Папок: {dirs}, файлов: {files} ({self.format_bytes(total)})"]
+            for root, updated in index.roots():
+                when = datetime.fromtimestamp(updated).strftime('%d.%m %H:%M') if updated else "не обновлялся"
+                lines.append(f"  • {root} — {when}")
+            if index.updating:
+                lines.append("  ⏳ Идёт обновление")
+            self.print_text("\n".join(lines) + "\n", self.output_color)
+
+    def do_locate_command(self, args):
+        """locate [шаблон] [--size >100MB] [--newer 2d] [--older 30d] [--ext py] [-n N]"""
+        index = self.get_file_index()
+        if index is None:
+            self.print_text("ℹ️ Индекс не создан. Сначала: index add [путь]\n", self.error_color)
+            return
+        options = {'limit': 100}
+        patterns = []
+        args = list(args)
+        try:
+            while args:
+                arg = args.pop(0)
+                if arg == "-n" and args:
+                    options['limit'] = max(1, int(args.pop(0)))
+                elif arg == "--size" and args:
+                    value = args.pop(0)
+                    if value.startswith('<'):
+                        options['max_size'] = parse_size(value.lstrip('<='))
+                    else:
+                        options['min_size'] = parse_size(value.lstrip('>='))
+                    options.setdefault('order', 'size')
+                elif arg in ("--newer", "--older") and args:
+                    options[arg[2:]] = time.time() - parse_duration(args.pop(0))
+                    options.setdefault('order', 'mtime')
+                elif arg == "--ext" and args:
+                    options['ext'] = args.pop(0)
+                else:
+                    patterns.append(arg)
+        except ValueError as e:
+            self.print_text(f"❌ {e}\n", self.error_color)
+            return
+        if not patterns and len(options) == 1:
+            self.print_text("❌ Использование: locate <шаблон> [--size >100MB|<1K] [--newer 2d] "
+                            "[--older 30d] [--ext py] [-n N]\n", self.error_color)
+            return
+
+        def locate():
+            # Запрос по подстроке — полный просмотр таблицы файлов, а во время
+            # обновления индекса ещё и ожидание записи: не в GUI-потоке
+            start = time.perf_counter()
+            try:
+                rows = index.query(" ".join(patterns) or None, **options)
+            except sqlite3.Error as e:
+                self.print_text(f"❌ Ошибка индекса: {e}\n", self.error_color)
+                return
+            elapsed = (time.perf_counter() - start) * 1000
+            lines = [f"  {datetime.fromtimestamp(mtime):%d.%m.%Y %H:%M}  {self.format_bytes(size):>10}  {path}"
+                     for path, size, mtime in rows]
+            if lines:
+                self.print_text("\n".join(lines) + "\n", self.text_color)
+            more = f" (показаны первые {options['limit']}, -n N)" if len(rows) == options['limit'] else ""
+            self.print_text(f"🔎 Найдено: {len(rows)}{more} за {elapsed:.1f} мс\n", self.success_color)
+
+        self.run_in_background(locate)
+
+    def sync_watches(self):
+        """Корни наблюдения: папки вкладок (только сами папки) и корни индекса (с поддеревом)"""
+        if self.fs_watcher is None or self.tabs is None:
+            return
+        paths = {str(self.tabs.widget(i).target_dir): False for i in range(self.tabs.count())}
+        index = self.get_file_index()
+        if index is not None:
+            for root, _ in index.roots():
+                paths[root] = True
+        self.fs_watcher.set_paths(paths)
+
+    def on_fs_batch(self, directories):
+        """Пакет изменений (поток наблюдателя): точечное обновление кэшей"""
+        directories = {os.path.normpath(path) for path in directories}
+        self.listing_cache.refresh(directories)
+        with self._index_backlog_lock:
+            self._index_backlog |= directories
+        self.flush_index_backlog()
+        watched = self.fs_watcher.paths
+        summaries = {path: self.folder_summary(path) for path in directories
+                     if path in self.folder_summaries or watched.get(path) is False}
+        self.fs_changed.emit(summaries)
+
+    def flush_index_backlog(self):
+        """Изменившиеся папки — в индекс; пока идёт полное обновление,
+        они копятся и применяются по его окончании"""
+        index = self.get_file_index()
+        while True:
+            with self._index_backlog_lock:
+                directories, self._index_backlog = self._index_backlog, set()
+            if index is None or not directories or index.update_dirs(directories) is not None:
+                return
+            with self._index_backlog_lock:
+                self._index_backlog |= directories
+            # Полное обновление могло закончиться между попыткой и возвратом
+            # в очередь — тогда его собственный сброс очереди уже прошёл
+            if index.updating:
+                return
+
+    def folder_summary(self, directory):
+        """(файлов, папок, байт) непосредственно в папке"""
+        files = folders = size = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            folders += 1
+                        else:
+                            files += 1
+                            size += entry.stat().st_size
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return files, folders, size
+
+    def on_fs_changed(self, summaries):
+        """Обновление сводки папок в GUI-потоке"""
+        self.folder_summaries.update(summaries)
+        if str(self.tabs.currentWidget().target_dir) in summaries:
+            self.update_dir_label(self.tabs.currentWidget())
+
+    def update_dir_label(self, tab):
+        directory = str(tab.target_dir)
+        summary = self.folder_summaries.get(directory)
+        self.dir_label.setText(f"📁 {directory[:50]}")
+        if summary is None:
+            self.dir_label.setToolTip(directory)
+        else:
+            files, folders, size = summary
+            self.dir_label.setToolTip(f"{directory}\nФайлов: {files}, папок: {folders}, {self.format_bytes(size)}")
+
+    def do_watch_command(self, args):
+        """watch — состояние наблюдения за файловой системой"""
+        watcher = self.fs_watcher
+        if watcher is None:
+            self.print_text("ℹ️ Наблюдение выключено (watcher.enabled в конфигурации)\n", self.output_color)
+            return
+        backend = watcher.backend.name if watcher.backend is not None else "—"
+        lines = [f"👁️ НАБЛЮДЕНИЕ ЗА ФАЙЛАМИ (механизм: {backend}, пакетов: {watcher.batches}):"]
+        polled = watcher.polled
+        for path, recursive in sorted(watcher.paths.items()):
+            mode = "с подпапками" if recursive else "только папка"
+            via = ", опрос" if path in polled else ""
+            lines.append(f"  • {path} ({mode}{via})")
+        self.print_text("\n".join(lines) + "\n", self.output_color)
+
+    def archive_progress(self, started):
+        """Колбэк прогресса для архивации: строка в консоль не чаще раза в секунду"""
+        state = {'shown': started}
+
+        def progress(done, total, files):
+            now = time.monotonic()
+            if now - state['shown'] < 1.0:
+                return
+            state['shown'] = now
+            percent = 100 * done / total if total else 100
+            speed = done / max(now - started, 1e-6)
+            self.print_text(f"  ⏳ {percent:.0f}% — {self.format_bytes(done)} из {self.format_bytes(total)}, "
+                            f"файлов: {files}, {self.format_bytes(speed)}/с\n", self.output_color)
+        return progress
+
+    def do_zip_command(self, command, args):
+        """zip [-1..-9] <папка|файлы...> [-o архив.zip]; backup [папка] — копия в data/backups"""
+        if args and args[0].lower() == "stop":
+            self.archive_stop.set()
+            return
+        level, output, sources = 6, None, []
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if re.fullmatch(r'-[0-9]', arg):
+                level = int(arg[1])
+            elif arg == "-o" and args:
+                output = self.resolve_user_path(args.pop(0))
+            else:
+                sources.append(self.resolve_user_path(arg))
+        if command == "backup":
+            if not self.features.get('backup', False):
+                self.print_text("ℹ️ Резервное копирование выключено (features.backup в конфигурации)\n",
+                                self.output_color)
+                return
+            sources = sources or [self.target_dir]
+            output = DATA_DIR / "backups" / f"{sources[0].name}_{datetime.now():%Y%m%d_%H%M%S}.zip"
+            output.parent.mkdir(parents=True, exist_ok=True)
+        if not sources:
+            self.print_text("❌ Использование: zip [-1..-9] <папка|файлы...> [-o архив.zip] / zip stop\n",
+                            self.error_color)
+            return
+        missing = [str(source) for source in sources if not source.exists()]
+        if missing:
+            self.print_text(f"❌ Не найдено: {', '.join(missing)}\n", self.error_color)
+            return
+        if output is None:
+            name = sources[0].name if len(sources) == 1 else f"archive_{datetime.now():%Y%m%d_%H%M%S}"
+            output = self.target_dir / f"{name}.zip"
+        self.archive_stop = stop = threading.Event()
+
+        def archive():
+            started = time.monotonic()
+            items = ParallelZipWriter.collect(sources)
+            writer = ParallelZipWriter(output, level=level, progress=self.archive_progress(started),
+                                       stop_event=stop)
+            self.print_text(f"🗜️ Архивация {len(items)} объектов в {output} (потоков: {writer.workers})\n",
+                            self.output_color)
+            try:
+                count = writer.write(items)
+            except InterruptedError as e:
+                output.unlink(missing_ok=True)
+                self.print_text(f"⏹️ {str(e).capitalize()}\n", self.output_color)
+                return
+            elapsed = time.monotonic() - started
+            ratio = 100 * writer.compressed / writer.total if writer.total else 100
+            self.print_text(f"✅ Архив создан: {output}\n   Записей: {count}, {self.format_bytes(writer.total)} → "
+                            f"{self.format_bytes(output.stat().st_size)} ({ratio:.0f}%) за {elapsed:.1f} с\n",
+                            self.success_color)
+
+        self.run_in_background(archive)
+
+    def do_unzip_command(self, args):
+        """unzip <архив.zip> [папка]"""
+        if args and args[0].lower() == "stop":
+            self.archive_stop.set()
+            return
+        if not args:
+            self.print_text("❌ Использование: unzip <архив.zip> [папка] / unzip stop\n", self.error_color)
+            return
+        path = self.resolve_user_path(args[0])
+        if not path.is_file():
+            self.print_text(f"❌ Файл не найден: {path}\n", self.error_color)
+            return
+        destination = self.resolve_user_path(" ".join(args[1:])) if len(args) > 1 else self.target_dir / path.stem
+        self.archive_stop = stop = threading.Event()
+
+        def unpack():
+            started = time.monotonic()
+            self.print_text(f"📦 Распаковка {path.name} в {destination}\n", self.output_color)
+            try:
+                files, size = extract_archive(path, destination, progress=self.archive_progress(started),
+                                              stop_event=stop)
+            except InterruptedError as e:
+                self.print_text(f"⏹️ {str(e).capitalize()}\n", self.output_color)
+                return
+            except (zipfile.BadZipFile, ValueError) as e:
+                self.print_text(f"❌ Ошибка архива: {e}\n", self.error_color)
+                return
+            self.print_text(f"✅ Распаковано файлов: {files} ({self.format_bytes(size)}) "
+                            f"за {time.monotonic() - started:.1f} с\n", self.success_color)
+
+        self.run_in_background(unpack)
+
+    def do_view_command(self, args):
+        """view <файл> — просмотр большого файла без загрузки в консоль"""
+        if not args:
+            self.print_text("❌ Использование: view <файл>\n", self.error_color)
+            return
+        path = self.resolve_user_path(" ".join(args))
+        if not path.is_file():
+            self.print_text(f"❌ Файл не найден: {path}\n", self.error_color)
+            return
+        self.show_spill_viewer(str(path))
 
     def format_bytes(self, bytes):
         """Форматирование байтов в читаемый вид"""
@@ -1723,6 +8275,34 @@ class OptimizedConsoleWindow(QMainWindow):
     def closeEvent(self, event):
         """Закрытие приложения"""
         self.save_settings()
+        self.usage_stats.close_session()
+        self.monitor_sampler.stop()
+        if self.metric_history is not None:
+            self.metric_history.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        for stop in list(self.replay_stops):
+            stop.set()
+        self.search_stop.set()
+        self.index_stop.set()
+        self.archive_stop.set()
+        if self.fs_watcher is not None:
+            self.fs_watcher.stop()
+        if self.file_index is not None and not self.file_index.updating:
+            self.file_index.close()
+        if self.recorder is not None:
+            try:
+                self.recorder.close()
+            except OSError as e:
+                logger.error(f"Ошибка закрытия записи сессии: {e}")
+        self.worker_pool.shutdown(wait=False, cancel_futures=True)
+        for path in self.spill_files:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        logger.info("Приложение закрыто")
+        self.app_logging.shutdown()
         event.accept()
 
     def print_welcome(self):
@@ -1806,7 +8386,23 @@ def main():
     sys.exit(app.exec_())
 
 
+def run_headless(script_args):
+    """Выполнение сценария без окна: console_app.py --run файл.ocs [аргументы]"""
+    if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY') and platform.system() == "Linux":
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QApplication(sys.argv[:1])
+    window = OptimizedConsoleWindow()
+    window.headless = True
+    window.script_finished.connect(app.exit)
+    window.do_run_command(script_args)
+    code = app.exec_()
+    window.close()
+    sys.exit(code)
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--run":
+        run_headless(sys.argv[2:])
     try:
         main()
     except Exception as e: